@@ -0,0 +1,121 @@
+"""Script to resolve the region and provider of alerts that were saved with only a postcode.
+Runs as its own scheduled Lambda, so alert runs never wait on postcode geocoding"""
+import logging
+import requests
+import psycopg2.extras
+from alerts.postcode_lookup import (get_connection_to_db, enable_logging,
+                                    get_region_from_postcode)
+
+BATCH_SIZE = 500
+
+
+def load_regions(cursor: 'Cursor') -> dict:
+    """Loading the region name -> (region id, provider id) map"""
+    query = """SELECT region_name, region_id, provider_id
+                FROM regions"""
+
+    cursor.execute(query)
+    return {name: (region_id, provider_id)
+            for name, region_id, provider_id in cursor.fetchall()}
+
+
+def find_unresolved_alerts(cursor: 'Cursor', after_id: int,
+                           batch_size: int = BATCH_SIZE) -> list[tuple]:
+    """Finding the next batch of (alert_id, postcode) rows with no provider, skipping
+    postcodes that have already been rejected"""
+    query = """SELECT alert_id, postcode
+                FROM alerts
+                WHERE provider_id IS NULL
+                AND postcode IS NOT NULL
+                AND NOT region_lookup_failed
+                AND alert_id > %s
+                ORDER BY alert_id
+                LIMIT %s"""
+
+    cursor.execute(query, (after_id, batch_size))
+    return cursor.fetchall()
+
+
+def resolve_alerts(cursor: 'Cursor', alerts: list[tuple],
+                   regions: dict) -> tuple[list[tuple], list[int]]:
+    """Geocoding each alert's postcode, returning (alert_id, region_id, provider_id) rows
+    and the ids of alerts whose postcode was rejected or has no region. Postcodes that
+    couldn't be looked up are left for the next run"""
+    resolved = []
+    rejected = []
+    for alert_id, postcode in alerts:
+        try:
+            region_id, provider_id = regions[get_region_from_postcode(postcode, cursor)]
+        except (ValueError, KeyError) as e:
+            logging.warning("Could not resolve postcode for alert %s: %s", alert_id, e)
+            rejected.append(alert_id)
+            continue
+        except requests.RequestException as e:
+            logging.warning("Could not look up postcode for alert %s: %s", alert_id, e)
+            continue
+        resolved.append((alert_id, region_id, provider_id))
+
+    return resolved, rejected
+
+
+def update_alert_regions(cursor: 'Cursor', resolved: list[tuple]) -> None:
+    """Saving the resolved regions and providers in one statement"""
+    psycopg2.extras.execute_values(cursor, """
+        UPDATE alerts AS a
+        SET region_id = v.region_id, provider_id = v.provider_id
+        FROM (VALUES %s) AS v (alert_id, region_id, provider_id)
+        WHERE a.alert_id = v.alert_id""", resolved)
+
+
+def mark_region_lookup_failed(cursor: 'Cursor', alert_ids: list[int]) -> None:
+    """Flagging alerts whose postcode was rejected, so they aren't geocoded again"""
+    query = """UPDATE alerts
+                SET region_lookup_failed = TRUE
+                WHERE alert_id = ANY(%s)"""
+
+    cursor.execute(query, (alert_ids, ))
+
+
+def backfill_alert_regions(conn: 'Connection', batch_size: int = BATCH_SIZE) -> int:
+    """Resolving every alert with a postcode but no provider, committing each batch.
+    Returns how many alerts were resolved"""
+    total = 0
+    last_id = 0
+    with conn.cursor() as cursor:
+        alerts = find_unresolved_alerts(cursor, last_id, batch_size)
+        regions = load_regions(cursor) if alerts else {}
+
+        while alerts:
+            resolved, rejected = resolve_alerts(cursor, alerts, regions)
+            if resolved:
+                update_alert_regions(cursor, resolved)
+            if rejected:
+                mark_region_lookup_failed(cursor, rejected)
+            conn.commit()
+            total += len(resolved)
+            last_id = alerts[-1][0]
+            alerts = find_unresolved_alerts(cursor, last_id, batch_size)
+
+    logging.info("Resolved regions for %s alerts", total)
+    return total
+
+
+def run_backfill() -> int:
+    """Connecting to the database and resolving every unresolved alert"""
+    db_connection = get_connection_to_db()
+    try:
+        return backfill_alert_regions(db_connection)
+    finally:
+        db_connection.close()
+
+
+def lambda_handler(event, context):
+    """Lambda handler for the scheduled backfill of alert regions"""
+    enable_logging()
+    logging.info("Event: %s, Context: %s", event, context)
+    return {"resolved": run_backfill()}
+
+
+if __name__ == "__main__":
+    enable_logging()
+    run_backfill()
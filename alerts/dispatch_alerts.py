@@ -0,0 +1,145 @@
+"""Sends rendered outage alerts by email through SES and by SMS through SNS, concurrently
+and within each service's send rate"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from alerts.rate_limiter import RateLimiter
+
+SES_REGION = "eu-west-2"
+SNS_REGION = "eu-west-2"
+MAX_WORKERS = 10
+# Used if the account's SES quota can't be read
+DEFAULT_SEND_RATE = 1
+# SNS's default SMS limit per account, in messages per second
+SMS_SEND_RATE = 20
+# alerts.alert_channel -> the channels an alert is sent through
+ALERT_CHANNELS = {
+    "email": ("email", ),
+    "sms": ("sms", ),
+    "both": ("email", "sms")
+}
+
+
+@lru_cache(maxsize=None)
+def get_ses_client(max_workers: int = MAX_WORKERS):
+    """SES client shared by every send in this process, with a connection for each worker"""
+    return boto3.client(
+        "ses",
+        region_name=SES_REGION,
+        config=Config(max_pool_connections=max_workers,
+                      retries={"max_attempts": 5, "mode": "standard"})
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sns_client(max_workers: int = MAX_WORKERS):
+    """SNS client shared by every SMS in this process, with a connection for each worker"""
+    return boto3.client(
+        "sns",
+        region_name=SNS_REGION,
+        config=Config(max_pool_connections=max_workers,
+                      retries={"max_attempts": 5, "mode": "standard"})
+    )
+
+
+def get_max_send_rate(client) -> float:
+    """Read the maximum number of emails per second SES allows this account"""
+    try:
+        return client.get_send_quota()["MaxSendRate"] or DEFAULT_SEND_RATE
+    except (BotoCoreError, ClientError) as e:
+        logging.warning("Could not read SES send quota, using %s/s: %s",
+                        DEFAULT_SEND_RATE, e)
+        return DEFAULT_SEND_RATE
+
+
+def build_raw_message(sender_email: str, recipient_email: str, alert: str) -> str:
+    """Build the raw MIME message for one rendered alert"""
+    message = MIMEMultipart()
+    message["Subject"] = "Outage Alert"
+    message["From"] = sender_email
+    message["To"] = recipient_email
+    message.attach(MIMEText(alert, "plain"))
+    return message.as_string()
+
+
+def send_one(client, rate_limiter: RateLimiter, sender_email: str,
+             recipient_email: str, raw_message: str) -> str:
+    """Send one raw message once the rate limiter allows it, returning its message id"""
+    rate_limiter.wait()
+    response = client.send_raw_email(
+        Source=sender_email,
+        Destinations=[recipient_email],
+        RawMessage={"Data": raw_message}
+    )
+    return response["MessageId"]
+
+
+def send_sms(client, rate_limiter: RateLimiter, phone_number: str, alert: str) -> str:
+    """Publish one alert straight to a phone number once the rate limiter allows it,
+    returning its message id. Alerts are time-critical, so they're sent as transactional"""
+    rate_limiter.wait()
+    response = client.publish(
+        PhoneNumber=phone_number,
+        Message=alert,
+        MessageAttributes={"AWS.SNS.SMS.SMSType": {"DataType": "String",
+                                                   "StringValue": "Transactional"}}
+    )
+    return response["MessageId"]
+
+
+def get_channels(alert_channel: str) -> tuple:
+    """The channels to send an alert through for a user's alert_channel preference"""
+    return ALERT_CHANNELS.get(alert_channel, ALERT_CHANNELS["email"])
+
+
+def get_senders(channels: set, ses_client, sns_client, max_workers: int) -> dict:
+    """Build a send function for each channel in use, taking an address and a rendered
+    alert. Clients are only created, and the SES quota only read, for channels in use"""
+    senders = {}
+    if "email" in channels:
+        ses_client = ses_client or get_ses_client(max_workers)
+        email_limiter = RateLimiter(get_max_send_rate(ses_client))
+        sender_email = os.getenv("SENDER_EMAIL")
+        senders["email"] = lambda email, alert: send_one(
+            ses_client, email_limiter, sender_email, email,
+            build_raw_message(sender_email, email, alert))
+    if "sms" in channels:
+        sns_client = sns_client or get_sns_client(max_workers)
+        sms_limiter = RateLimiter(SMS_SEND_RATE)
+        senders["sms"] = lambda phone_number, alert: send_sms(
+            sns_client, sms_limiter, phone_number, alert)
+    return senders
+
+
+def dispatch_alerts(alerts: list[tuple], ses_client=None, sns_client=None,
+                    max_workers: int = MAX_WORKERS) -> dict:
+    """Send (alert_id, channel, email or phone number, rendered alert) messages concurrently
+    within each channel's send rate. SNS can only batch publishes to topics, so each SMS is
+    its own publish from the shared pool. Returns the message id for each sent
+    (alert_id, channel) and the error for each failed one"""
+    results = {"sent": {}, "failed": {}}
+    if not alerts:
+        return results
+
+    senders = get_senders({channel for _, channel, _, _ in alerts},
+                          ses_client, sns_client, max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {(alert_id, channel): executor.submit(senders[channel], address, alert)
+                   for alert_id, channel, address, alert in alerts}
+
+    for (alert_id, channel), future in futures.items():
+        try:
+            results["sent"][(alert_id, channel)] = future.result()
+        except (BotoCoreError, ClientError) as e:
+            logging.error("Failed to send alert %s by %s: %s", alert_id, channel, e)
+            results["failed"][(alert_id, channel)] = str(e)
+
+    logging.info("Sent %s alerts, %s failed", len(results["sent"]), len(results["failed"]))
+    return results
@@ -0,0 +1,53 @@
+"""Pooled HTTP client shared by the extractors"""
+import logging
+import random
+from typing import Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = 10
+POOL_SIZE = 10
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+logger = logging.getLogger(__name__)
+
+
+class JitteredRetry(Retry):
+    """Retry policy using full jitter on the exponential backoff"""
+
+    def get_backoff_time(self) -> float:
+        """Pick a random backoff between zero and the exponential backoff"""
+        return random.uniform(0, super().get_backoff_time())
+
+
+def create_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """Create a session with per-host connection pooling and bounded retries"""
+    retry = JitteredRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return session
+
+
+# Created at import time so warm Lambda invocations reuse open connections
+SESSION = create_session()
+
+
+def http_get(url: str, timeout: Union[float, tuple] = DEFAULT_TIMEOUT,
+             **kwargs) -> requests.Response:
+    """Perform a GET request through the shared session"""
+    logger.debug('GET %s (timeout %s)', url, timeout)
+    return SESSION.get(url, timeout=timeout, **kwargs)
@@ -1,9 +1,21 @@
 """Script that maps a postcode to a specific region, and finds the related provider in the db"""
 import os
+import re
+import csv
 import logging
-import requests
+from functools import lru_cache
 import psycopg2
 from dotenv import load_dotenv
+from alerts.http_client import http_get
+
+POSTCODES_IO_URL = "https://api.postcodes.io/postcodes"
+POSTCODES_IO_TIMEOUT = (3.05, 10)
+# postcodes.io statuses worth retrying later, rather than treating the postcode as invalid
+POSTCODES_IO_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Bundled postcode district/area -> electoral region index, checked before any lookup.
+# A blank region marks a district split between regions, which is looked up instead.
+POSTCODE_DISTRICTS_FILE = os.path.join(os.path.dirname(__file__), "postcode_districts.csv")
+POSTCODE_PATTERN = re.compile(r"[A-Z]{1,2}[0-9][A-Z0-9]?[0-9][A-Z]{2}")
 
 
 REGION_MAPPINGS = {
@@ -41,15 +53,67 @@ def get_connection_to_db():
                             port=os.getenv("DB_PORT"))
 
 
-def get_region_from_postcode(postcode: str) -> str:
-    """Finding associated region from a given postcode"""
-    url = f"https://api.postcodes.io/postcodes/{postcode}"
-    response = requests.get(url, timeout=10)
-    if response.status_code != 200:
-        raise ValueError("Invalid postcode or API failure")
+@lru_cache(maxsize=None)
+def load_postcode_districts(filename: str = POSTCODE_DISTRICTS_FILE) -> dict:
+    """Loading the bundled district -> electoral region index, once per process"""
+    with open(filename, newline="", encoding="utf-8") as districts_file:
+        return {row["district"]: row["electoral_region"] or None
+                for row in csv.DictReader(districts_file)}
 
-    data = response.json()
-    electoral_region = data['result']['european_electoral_region']
+
+def normalise_postcode(postcode: str) -> str:
+    """Upper case postcode without spaces, e.g. 'e1 7db' -> 'E17DB'"""
+    return re.sub(r"\s+", "", postcode).upper()
+
+
+def get_postcode_match_keys(postcode: str) -> set:
+    """The postcode, sector and district an outage can list a postcode under,
+    formatted as in outage_postcodes, e.g. 'e17db' -> {'E1 7DB', 'E1 7', 'E1'}"""
+    postcode = normalise_postcode(postcode or "")
+    if not POSTCODE_PATTERN.fullmatch(postcode):
+        return set()
+
+    outward, inward = postcode[:-3], postcode[-3:]
+    return {f"{outward} {inward}", f"{outward} {inward[0]}", outward}
+
+
+def find_electoral_region_offline(postcode: str) -> str | None:
+    """Finding a postcode's electoral region from the bundled index by its district,
+    then its area. Returns None when the index can't tell"""
+    postcode = normalise_postcode(postcode)
+    district = postcode[:-3] if len(postcode) > 4 else postcode
+    area = re.match(r"[A-Z]*", district).group()
+    districts = load_postcode_districts()
+
+    if district in districts:
+        return districts[district]
+    return districts.get(area)
+
+
+def find_memoised_region(cursor: 'Cursor', postcode: str) -> str | None:
+    """Finding a region already resolved for a full postcode"""
+    query = """SELECT region_name
+                FROM postcode_regions
+                WHERE postcode = %s"""
+
+    cursor.execute(query, (postcode, ))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def memoise_region(cursor: 'Cursor', postcode: str, region: str) -> None:
+    """Storing a looked up region so the postcode is never looked up again.
+    Committed with the caller's transaction"""
+    query = """INSERT INTO postcode_regions (postcode, region_name)
+                VALUES (%s, %s)
+                ON CONFLICT (postcode) DO UPDATE
+                SET region_name = EXCLUDED.region_name, resolved_at = NOW()"""
+
+    cursor.execute(query, (postcode, region))
+
+
+def map_electoral_region(electoral_region: str) -> str:
+    """Mapping an electoral region to the region name used in the database"""
     region = REGION_MAPPINGS.get(electoral_region)
 
     if not region:
@@ -59,6 +123,42 @@ def get_region_from_postcode(postcode: str) -> str:
     return region
 
 
+def lookup_region_from_postcode(postcode: str) -> str:
+    """Looking up a postcode's region on postcodes.io. Raises ValueError if postcodes.io
+    rejects the postcode, and requests.HTTPError if it is unavailable"""
+    url = f"{POSTCODES_IO_URL}/{postcode}"
+    response = http_get(url, timeout=POSTCODES_IO_TIMEOUT)
+    if response.status_code in POSTCODES_IO_RETRY_STATUSES:
+        response.raise_for_status()
+    if response.status_code != 200:
+        raise ValueError("Invalid postcode")
+
+    data = response.json()
+    return map_electoral_region(data['result']['european_electoral_region'])
+
+
+def get_region_from_postcode(postcode: str, cursor: 'Cursor' = None) -> str:
+    """Finding associated region from a given postcode. Uses the bundled district index,
+    then, given a cursor, postcodes resolved before, and only then postcodes.io"""
+    if not POSTCODE_PATTERN.fullmatch(normalise_postcode(postcode)):
+        raise ValueError("Invalid postcode")
+
+    electoral_region = find_electoral_region_offline(postcode)
+    if electoral_region:
+        return map_electoral_region(electoral_region)
+
+    if cursor is None:
+        return lookup_region_from_postcode(postcode)
+
+    postcode = normalise_postcode(postcode)
+    region = find_memoised_region(cursor, postcode)
+    if not region:
+        region = lookup_region_from_postcode(postcode)
+        memoise_region(cursor, postcode, region)
+
+    return region
+
+
 def find_provider_from_region(cursor: 'Cursor', region: str) -> int:
     """Finding a provider from a region name"""
     query = """SELECT provider_id
@@ -1,35 +1,39 @@
-"""Script to send email alerts to subscribed users about recent outages"""
+"""Script to send email and SMS alerts to subscribed users about recent outages"""
 
 
 import logging
-import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from datetime import datetime, timedelta
-import pytz
-from dotenv import load_dotenv
-import boto3
-import botocore
+import psycopg2.extras
 from alerts.postcode_lookup import (get_connection_to_db, enable_logging,
-                                    get_region_from_postcode, find_provider_from_region,
-                                    find_provider_from_region_id)
+                                    get_postcode_match_keys)
+from alerts.dispatch_alerts import dispatch_alerts, get_channels
 
+# alert_watermarks row holding the id of the last outage users were alerted about, also
+# naming the advisory lock held by the run in progress
+ALERT_WATERMARK = "outage_alerts"
+# Failed deliveries are retried by later runs until they've been tried this many times
+MAX_DELIVERY_ATTEMPTS = 3
 
-def find_subscribers_from_db(cursor: 'Cursor') -> list[tuple]:
-    """Finding all subscribers in the db"""
-    query = """SELECT  first_name, phone_number, email, last_alert_sent, region_id, postcode
-                FROM alert_users;"""
 
-    cursor.execute(query)
+def find_subscribers_from_db(cursor: 'Cursor', provider_ids: list[int]) -> list[tuple]:
+    """Finding the subscribers of the given providers, with the provider resolved when
+    they subscribed"""
+    query = """SELECT au.first_name, au.phone_number, au.email, au.last_alert_sent,
+                au.region_id, au.postcode, au.provider_id, rp.region_name, au.alert_id,
+                au.alert_channel
+                FROM alert_users au
+                LEFT JOIN region_provider rp ON rp.region_id = au.region_id
+                WHERE au.provider_id = ANY(%s);"""
+
+    cursor.execute(query, (provider_ids, ))
 
     users = cursor.fetchall()
 
     return users
 
 
-def create_subscriber_dict(cursor: 'Cursor') -> list[dict]:
-    """Creating a dict for each subscriber"""
-    users = find_subscribers_from_db(cursor)
+def create_subscriber_dict(cursor: 'Cursor', provider_ids: list[int]) -> list[dict]:
+    """Creating a dict for each subscriber of the given providers"""
+    users = find_subscribers_from_db(cursor, provider_ids)
     users_mapped = []
     for user in users:
         user_dict = {
@@ -38,7 +42,11 @@ def create_subscriber_dict(cursor: 'Cursor') -> list[dict]:
             "email": user[2],
             "last_alert": user[3],
             "region_id": user[4],
-            "postcode": user[5]
+            "postcode": user[5],
+            "provider_id": user[6],
+            "region_name": user[7],
+            "alert_id": user[8],
+            "alert_channel": user[9]
         }
 
         users_mapped.append(user_dict)
@@ -46,68 +54,125 @@ def create_subscriber_dict(cursor: 'Cursor') -> list[dict]:
     return users_mapped
 
 
-def find_provider_for_user(cursor: 'Cursor', user: dict) -> dict:
-    """Finding the relevant provider for each user"""
-    region = user.get("region_id")
-    postcode = user.get("postcode")
-
-    if region:
-        provider_id, region_name = find_provider_from_region_id(cursor, region)
-        user['provider_id'] = provider_id
-        user['region_name'] = region_name
-
-    elif postcode:
-        region = get_region_from_postcode(postcode)
-        provider_id = find_provider_from_region(cursor, region)
-        user['provider_id'] = provider_id
-        user['region_name'] = region
-
+def claim_watermark(cursor: 'Cursor', wait: bool = False) -> int | None:
+    """Taking the alert run lock for this session, returning the last outage id alerted on.
+    Returns None if another run holds it, unless wait is set. The lock is held across the
+    run's commits until its connection closes"""
+    if wait:
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (ALERT_WATERMARK, ))
     else:
-        raise ValueError
-
-    return user
-
-
-def get_current_time_range(minutes: int) -> tuple[str, str]:
-    """getting time range"""
-    now = datetime.now(pytz.utc)
-    past = now - timedelta(minutes=minutes)
-    return past.strftime("%Y-%d-%m %H:%M:%S"), now.strftime("%Y-%d-%m %H:%M:%S")
-
-
-def query_recent_outages(cursor: 'Cursor', provider_id: int,
-                         start_time: str, end_time: str) -> list[dict]:
-    """Finding recent outages"""
-    query = """SELECT outage_start, outage_end, planned
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (ALERT_WATERMARK, ))
+        if not cursor.fetchone()[0]:
+            return None
+
+    query = """SELECT last_outage_id
+                FROM alert_watermarks
+                WHERE name = %s"""
+
+    cursor.execute(query, (ALERT_WATERMARK, ))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def advance_watermark(cursor: 'Cursor', last_outage_id: int) -> None:
+    """Moving the watermark past the outages this run alerted on"""
+    query = """UPDATE alert_watermarks
+                SET last_outage_id = %s, updated_at = NOW()
+                WHERE name = %s"""
+
+    cursor.execute(query, (last_outage_id, ALERT_WATERMARK))
+
+
+def load_deliveries(cursor: 'Cursor', after_id: int) -> dict:
+    """Loading the deliveries recorded for outages added since the watermark, and the
+    failed deliveries still to be retried, as (alert_id, outage_id, channel) -> whether
+    it is due to be sent again"""
+    query = """SELECT alert_id, outage_id, channel,
+                status = 'failed' AND attempts < %s AS due
+                FROM alert_deliveries
+                WHERE outage_id > %s
+                OR (status = 'failed' AND attempts < %s)"""
+
+    cursor.execute(query, (MAX_DELIVERY_ATTEMPTS, after_id, MAX_DELIVERY_ATTEMPTS))
+    return {(alert_id, outage_id, channel): due
+            for alert_id, outage_id, channel, due in cursor.fetchall()}
+
+
+def load_new_outages(cursor: 'Cursor', after_id: int,
+                     retry_outage_ids: list[int] = ()) -> tuple[dict, int]:
+    """Loading every outage added since the watermark, and any older outages with
+    deliveries to retry, with the postcodes they affect in one query, grouped by provider
+    id. Also returns the newest outage id loaded"""
+    query = """SELECT o.outage_id, o.provider_id, o.outage_start, o.outage_end, o.planned,
+               ARRAY_REMOVE(ARRAY_AGG(op.postcode), NULL)
                FROM outages o
-               JOIN providers p ON p.provider_id = o.provider_id
-               WHERE o.provider_id = %s
-               AND outage_start BETWEEN %s AND %s
-               ORDER BY outage_start DESC"""
-
-    cursor.execute(query, (provider_id, start_time, end_time))
-    results = cursor.fetchall()
-    return [
-        {
-            "outage_start": row[0].strftime("%Y-%m-%d %H:%M:%S") if row[0] else "Unknown",
-            "outage_end": row[1].strftime("%Y-%m-%d %H:%M:%S") if row[1] else "Unknown",
-            "planned": row[2]
-        }
-        for row in results
-    ]
-
-
-def find_outage_info_for_user(cursor: 'Cursor', user: dict) -> dict:
-    """Finding outages for the user"""
-    provider_id = user.get("provider_id")
-
-    if provider_id:
-        start_time, end_time = get_current_time_range(1)
-        outages = query_recent_outages(
-            cursor, provider_id, start_time, end_time)
-        user["outages"] = outages
-    else:
-        user["outages"] = []
+               LEFT JOIN outage_postcodes op ON op.outage_id = o.outage_id
+               WHERE o.outage_id > %s
+               OR o.outage_id = ANY(%s)
+               GROUP BY o.outage_id
+               ORDER BY o.outage_start DESC"""
+
+    cursor.execute(query, (after_id, list(retry_outage_ids)))
+    outages_by_provider = {}
+    last_outage_id = after_id
+    for (outage_id, provider_id, outage_start, outage_end, planned,
+         postcodes) in cursor.fetchall():
+        last_outage_id = max(last_outage_id, outage_id)
+        outages_by_provider.setdefault(provider_id, []).append({
+            "outage_id": outage_id,
+            "outage_start": outage_start.strftime("%Y-%m-%d %H:%M:%S") if outage_start
+            else "Unknown",
+            "outage_end": outage_end.strftime("%Y-%m-%d %H:%M:%S") if outage_end
+            else "Unknown",
+            "planned": planned,
+            "postcodes": set(postcodes)
+        })
+
+    return outages_by_provider, last_outage_id
+
+
+def record_deliveries(cursor: 'Cursor', deliveries: list[tuple], results: dict) -> None:
+    """Recording whether each planned delivery was sent for every outage it covered, in
+    one statement. Retried deliveries count another attempt"""
+    rows = []
+    for alert_id, channel, _, _, outage_ids in deliveries:
+        sent = (alert_id, channel) in results["sent"]
+        error = results["failed"].get((alert_id, channel))
+        rows.extend((alert_id, outage_id, channel, "sent" if sent else "failed", error)
+                    for outage_id in outage_ids)
+    if not rows:
+        return
+
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO alert_deliveries (alert_id, outage_id, channel, status, error)
+        VALUES %s
+        ON CONFLICT (alert_id, outage_id, channel) DO UPDATE
+        SET status = EXCLUDED.status, error = EXCLUDED.error,
+        attempts = alert_deliveries.attempts + 1, updated_at = NOW()""", rows)
+
+
+def record_alerts_sent(cursor: 'Cursor', alert_ids: list[int]) -> None:
+    """Setting last_alert_sent for every alert sent this run in one statement"""
+    if not alert_ids:
+        return
+    query = """UPDATE alerts
+                SET last_alert_sent = NOW()
+                WHERE alert_id = ANY(%s)"""
+
+    cursor.execute(query, (alert_ids, ))
+
+
+def find_outage_info_for_user(user: dict, outages_by_provider: dict) -> dict:
+    """Finding outages for the user from the outages loaded for this run. Users with a
+    postcode only get outages listing their postcode, sector or district, or outages
+    the provider gave no postcodes for"""
+    outages = outages_by_provider.get(user.get("provider_id"), [])
+    match_keys = get_postcode_match_keys(user.get("postcode"))
+
+    if match_keys:
+        outages = [outage for outage in outages
+                   if not outage["postcodes"] or match_keys & outage["postcodes"]]
+    user["outages"] = outages
 
     return user
 
@@ -127,58 +192,93 @@ def alert_message_format(user: dict) -> str:
     return alert_message
 
 
-def send_alert(user: dict):
-    """Send an email using AWS SES."""
-    load_dotenv()
-    sender_email = os.getenv("SENDER_EMAIL")
-    client = boto3.client("ses", region_name="eu-west-2")
-    alert = alert_message_format(user)
-    message = MIMEMultipart()
-    message["Subject"] = "Outage Alert"
-    message["From"] = sender_email
-    message["To"] = user['email']
-
-    body = MIMEText(alert, "plain")
-    message.attach(body)
-
-    try:
-        client.send_raw_email(
-            Source=message["From"],
-            Destinations=[message["To"]],
-            RawMessage={"Data": message.as_string()}
-        )
-        logging.info("Email sent to %s successfully", user['email'])
-    except botocore.exceptions.ClientError as error:
-        logging.info("Failed to send email to %s: %s", user['email'], error)
-
-
-def send_alert_pipeline():
-    """Pipeline to combine all functions and send alert to users"""
+def is_delivery_due(alert_id: int, outage_id: int, channel: str, deliveries: dict,
+                    watermark: int) -> bool:
+    """Whether an outage should be sent to an alert through a channel: it was added since
+    the watermark and hasn't been sent already, or its failed delivery is due a retry"""
+    recorded = deliveries.get((alert_id, outage_id, channel))
+    if recorded is None:
+        return outage_id > watermark
+    return recorded
+
+
+def build_deliveries(user: dict, deliveries: dict, watermark: int) -> list[tuple]:
+    """Creating an (alert_id, channel, address, alert, outage_ids) delivery for each channel
+    the user chose, covering the user's outages due through that channel. Channels they
+    have no address for, or with nothing due, are skipped"""
+    addresses = {"email": user.get("email"), "sms": user.get("phone")}
+    planned = []
+    for channel in get_channels(user.get("alert_channel")):
+        if not addresses[channel]:
+            continue
+        outages = [outage for outage in user["outages"]
+                   if is_delivery_due(user["alert_id"], outage["outage_id"], channel,
+                                      deliveries, watermark)]
+        alert = alert_message_format({**user, "outages": outages})
+        if alert:
+            planned.append((user["alert_id"], channel, addresses[channel], alert,
+                            [outage["outage_id"] for outage in outages]))
+    return planned
+
+
+def send_outage_alerts(cursor: 'Cursor', outages_by_provider: dict, deliveries: dict,
+                       watermark: int) -> list[int]:
+    """Sending each subscriber of the providers with outages the outages due to them,
+    recording every delivery's outcome. Returns the ids of the alerts sent"""
+    planned = []
+    for user in create_subscriber_dict(cursor, list(outages_by_provider)):
+        find_outage_info_for_user(user, outages_by_provider)
+        planned.extend(build_deliveries(user, deliveries, watermark))
+
+    results = dispatch_alerts([delivery[:4] for delivery in planned])
+    record_deliveries(cursor, planned, results)
+    alerted = list({alert_id for alert_id, _ in results["sent"]})
+    record_alerts_sent(cursor, alerted)
+    return alerted
+
+
+def send_alert_pipeline(wait_for_lock: bool = False):
+    """Pipeline to combine all functions and send alert to users about the outages added
+    since the last run. Overlapping scheduled runs skip, while runs triggered by an outage
+    load wait for the current run so its new outages aren't left for the next schedule.
+    Deliveries are committed as soon as they're sent, before the watermark moves, so a
+    run retried after a crash doesn't re-alert users, and failed ones are retried"""
     db_connection = get_connection_to_db()
-    curr = db_connection.cursor()
-    users = create_subscriber_dict(curr)
-    for user in users:
-        try:
-            user_info = find_provider_for_user(curr, user)
-            user_info_full = find_outage_info_for_user(curr, user_info)
-
-            if alert_message_format(user_info_full):
-                logging.info("Sending")
-                send_alert(user_info_full)
-                logging.info("sent")
-            else:
-                logging.info("failed to send")
-        except ValueError as e:
-            logging.info(
-                "Failed to process user %s: %s", user.get('email', 'unknown'), e)
-    db_connection.close()
+    try:
+        curr = db_connection.cursor()
+
+        watermark = claim_watermark(curr, wait_for_lock)
+        if watermark is None:
+            logging.info("Another alert run is in progress")
+            return
+
+        deliveries = load_deliveries(curr, watermark)
+        retry_outage_ids = {outage_id for (_, outage_id, _), due in deliveries.items()
+                            if due and outage_id <= watermark}
+        outages_by_provider, last_outage_id = load_new_outages(curr, watermark,
+                                                               list(retry_outage_ids))
+        if not outages_by_provider:
+            logging.info("No new outages, no alerts to send")
+            db_connection.commit()
+            return
+
+        alerted = send_outage_alerts(curr, outages_by_provider, deliveries, watermark)
+        db_connection.commit()
+
+        advance_watermark(curr, last_outage_id)
+        db_connection.commit()
+        logging.info("Alerted %s users about outages up to %s",
+                     len(alerted), last_outage_id)
+    finally:
+        db_connection.close()
 
 
 def lambda_handler(event, context):
-    """Lambda handler to run pipeline in lambda"""
+    """Lambda handler to run pipeline in lambda. Invoked by the outage loader with the
+    number of new outages, and on a schedule to catch any it missed"""
     enable_logging()
     logging.info("Event: %s, Context: %s", event, context)
-    send_alert_pipeline()
+    send_alert_pipeline(wait_for_lock=(event or {}).get("source") == "outage_load")
     logging.info("Success!")
 
 
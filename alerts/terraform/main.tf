@@ -54,6 +54,22 @@ data "aws_iam_policy_document" "lambda-ses-policy" {
     ]
     resources = ["arn:aws:ses:eu-west-2:*:identity/*"]
   }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "ses:GetSendQuota"
+    ]
+    resources = ["*"]
+  }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "sns:Publish"
+    ]
+    resources = ["*"]
+  }
 }
 
 
@@ -92,4 +108,43 @@ resource "aws_lambda_function" "energy-alerts-lambda" {
     }
   }
   timeout = 60
-}
\ No newline at end of file
+}
+# Resolves alert regions on its own schedule, so alert runs never wait on postcodes.io
+resource "aws_lambda_function" "energy-alerts-backfill-lambda" {
+  function_name = "c16-energy-backfill-alert-regions-lambda"
+  image_uri = data.aws_ecr_image.send-alert-image.image_uri
+
+  role = aws_iam_role.energy-alerts-lambda-iam.arn
+  package_type = "Image"
+  image_config {
+    command = ["backfill_alert_regions.lambda_handler"]
+  }
+  environment {
+    variables = {
+                DB_NAME = var.DB_NAME,
+                DB_USER = var.DB_USER,
+                DB_HOST = var.DB_HOST,
+                DB_PORT = var.DB_PORT,
+                DB_PASSWORD = var.DB_PASSWORD
+    }
+  }
+  timeout = 300
+}
+
+resource "aws_cloudwatch_event_rule" "backfill-alert-regions-schedule" {
+  name                = "c16-energy-backfill-alert-regions-schedule"
+  schedule_expression = "rate(1 hour)"
+}
+
+resource "aws_cloudwatch_event_target" "backfill-alert-regions-target" {
+  rule = aws_cloudwatch_event_rule.backfill-alert-regions-schedule.name
+  arn  = aws_lambda_function.energy-alerts-backfill-lambda.arn
+}
+
+resource "aws_lambda_permission" "allow-backfill-schedule" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.energy-alerts-backfill-lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.backfill-alert-regions-schedule.arn
+}
@@ -0,0 +1,74 @@
+# pylint: skip-file
+from unittest.mock import patch, MagicMock
+import requests
+from alerts.backfill_alert_regions import (load_regions, find_unresolved_alerts,
+                                           resolve_alerts, backfill_alert_regions,
+                                           lambda_handler)
+
+
+def test_load_regions():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [("London", 13, 6), ("Wales", 17, 2)]
+    assert load_regions(cursor) == {"London": (13, 6), "Wales": (17, 2)}
+
+
+def test_find_unresolved_alerts_pages_by_id():
+    cursor = MagicMock()
+    find_unresolved_alerts(cursor, 40, 10)
+    assert cursor.execute.call_args[0][1] == (40, 10)
+
+
+@patch("alerts.backfill_alert_regions.get_region_from_postcode")
+def test_resolve_alerts_skips_failures(mock_lookup):
+    mock_lookup.side_effect = ["London", ValueError, requests.ConnectionError, "Narnia"]
+    alerts = [(1, "E1 7DB"), (2, "bad"), (3, "CH4 0AA"), (4, "ZZ1 1ZZ")]
+
+    resolved, rejected = resolve_alerts(MagicMock(), alerts, {"London": (13, 6)})
+
+    assert resolved == [(1, 13, 6)]
+    assert rejected == [2, 4]
+
+
+def test_find_unresolved_alerts_skips_rejected_postcodes():
+    cursor = MagicMock()
+    find_unresolved_alerts(cursor, 0)
+    assert "NOT region_lookup_failed" in cursor.execute.call_args[0][0]
+
+
+@patch("alerts.backfill_alert_regions.mark_region_lookup_failed")
+@patch("alerts.backfill_alert_regions.update_alert_regions")
+@patch("alerts.backfill_alert_regions.get_region_from_postcode",
+       side_effect=["London", ValueError, "London"])
+def test_backfill_alert_regions(_, mock_update, mock_mark_failed):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = [
+        [(1, "E1 7DB"), (2, "E1 6AN")],
+        [("London", 13, 6)],
+        [(5, "E2 8AA")],
+        []
+    ]
+
+    assert backfill_alert_regions(conn, batch_size=2) == 2
+    assert mock_update.call_count == 2
+    mock_mark_failed.assert_called_once_with(cursor, [2])
+    assert cursor.execute.call_args[0][1] == (5, 2)
+    assert conn.commit.call_count == 2
+
+
+def test_backfill_alert_regions_nothing_to_do():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+
+    assert backfill_alert_regions(conn) == 0
+    cursor.execute.assert_called_once()
+    conn.commit.assert_not_called()
+
+
+@patch("alerts.backfill_alert_regions.backfill_alert_regions", return_value=3)
+@patch("alerts.backfill_alert_regions.get_connection_to_db")
+def test_lambda_handler_runs_backfill(mock_connect, mock_backfill):
+    assert lambda_handler({}, None) == {"resolved": 3}
+    mock_backfill.assert_called_once_with(mock_connect.return_value)
+    mock_connect.return_value.close.assert_called_once()
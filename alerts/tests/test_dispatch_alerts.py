@@ -0,0 +1,131 @@
+# pylint: skip-file
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+from alerts.dispatch_alerts import (get_ses_client, get_sns_client,
+                                    get_max_send_rate, build_raw_message, send_sms,
+                                    get_channels, dispatch_alerts, DEFAULT_SEND_RATE)
+from alerts.rate_limiter import RateLimiter
+
+
+class FakeSNS:
+    """Stands in for the SNS client, recording each SMS instead of sending it"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.published = []
+
+    def publish(self, PhoneNumber, Message, MessageAttributes):
+        if PhoneNumber in self.failing:
+            raise ClientError({"Error": {"Code": "InvalidParameter", "Message": "bad number"}},
+                              "Publish")
+        self.published.append((PhoneNumber, Message, MessageAttributes))
+        return {"MessageId": f"sms-{PhoneNumber}"}
+
+
+def make_client(failing=()):
+    client = MagicMock()
+    client.get_send_quota.return_value = {"MaxSendRate": 1000}
+
+    def send_raw_email(Source, Destinations, RawMessage):
+        if Destinations[0] in failing:
+            raise ClientError({"Error": {"Code": "MessageRejected", "Message": "no"}},
+                              "SendRawEmail")
+        return {"MessageId": f"id-{Destinations[0]}"}
+
+    client.send_raw_email.side_effect = send_raw_email
+    return client
+
+
+@patch("alerts.dispatch_alerts.boto3.client")
+def test_get_ses_client_is_created_once(mock_client):
+    get_ses_client.cache_clear()
+    assert get_ses_client() is get_ses_client()
+    mock_client.assert_called_once()
+    get_ses_client.cache_clear()
+
+
+def test_get_max_send_rate_falls_back():
+    client = MagicMock()
+    client.get_send_quota.side_effect = ClientError(
+        {"Error": {"Code": "Throttling", "Message": "slow"}}, "GetSendQuota")
+    assert get_max_send_rate(client) == DEFAULT_SEND_RATE
+
+
+def test_build_raw_message():
+    raw = build_raw_message("from@a.com", "to@a.com", "Hi there")
+    assert "Subject: Outage Alert" in raw
+    assert "To: to@a.com" in raw
+    assert "Hi there" in raw
+
+
+@patch("alerts.dispatch_alerts.boto3.client")
+def test_get_sns_client_is_created_once(mock_client):
+    get_sns_client.cache_clear()
+    assert get_sns_client() is get_sns_client()
+    assert mock_client.call_args[0][0] == "sns"
+    get_sns_client.cache_clear()
+
+
+def test_send_sms_is_transactional():
+    client = FakeSNS()
+    assert send_sms(client, RateLimiter(1000), "+447700900123", "alert") == "sms-+447700900123"
+    phone_number, message, attributes = client.published[0]
+    assert (phone_number, message) == ("+447700900123", "alert")
+    assert attributes["AWS.SNS.SMS.SMSType"]["StringValue"] == "Transactional"
+
+
+def test_get_channels():
+    assert get_channels("both") == ("email", "sms")
+    assert get_channels("sms") == ("sms", )
+    assert get_channels(None) == ("email", )
+
+
+@patch("alerts.dispatch_alerts.build_raw_message", side_effect=lambda _, email, alert: alert)
+def test_dispatch_alerts_reports_each_alert(mock_build):
+    client = make_client(failing={"b@b.com"})
+    alerts = [(1, "email", "a@a.com", "alert a"), (2, "email", "b@b.com", "alert b"),
+              (3, "email", "c@c.com", "alert c")]
+
+    results = dispatch_alerts(alerts, ses_client=client, max_workers=3)
+
+    assert results["sent"] == {(1, "email"): "id-a@a.com", (3, "email"): "id-c@c.com"}
+    assert list(results["failed"]) == [(2, "email")]
+    assert mock_build.call_count == 3
+    client.get_send_quota.assert_called_once()
+
+
+def test_dispatch_alerts_by_sms_and_email():
+    ses_client = make_client()
+    sns_client = FakeSNS(failing={"+447700900002"})
+    alerts = [(1, "email", "a@a.com", "alert a"), (1, "sms", "+447700900001", "alert a"),
+              (2, "sms", "+447700900002", "alert b")]
+
+    results = dispatch_alerts(alerts, ses_client=ses_client, sns_client=sns_client,
+                              max_workers=3)
+
+    assert results["sent"] == {(1, "email"): "id-a@a.com", (1, "sms"): "sms-+447700900001"}
+    assert list(results["failed"]) == [(2, "sms")]
+    assert [sms[:2] for sms in sns_client.published] == [("+447700900001", "alert a")]
+
+
+@patch("alerts.dispatch_alerts.get_ses_client")
+def test_dispatch_alerts_sms_only_skips_ses(mock_ses):
+    sns_client = FakeSNS()
+    results = dispatch_alerts([(1, "sms", "+447700900001", "alert")], sns_client=sns_client)
+    assert list(results["sent"]) == [(1, "sms")]
+    mock_ses.assert_not_called()
+
+
+def test_dispatch_alerts_nothing_to_send():
+    client = make_client()
+    assert dispatch_alerts([], ses_client=client) == {"sent": {}, "failed": {}}
+    client.get_send_quota.assert_not_called()
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(2)
+    with patch("alerts.rate_limiter.time.sleep") as mock_sleep:
+        limiter.wait()
+        limiter.wait()
+    assert mock_sleep.call_count == 1
+    assert 0 < mock_sleep.call_args[0][0] <= 0.5
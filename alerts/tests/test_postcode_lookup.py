@@ -1,9 +1,13 @@
 # pylint: skip-file
 from alerts.postcode_lookup import (get_region_from_postcode,
                                     find_provider_from_region,
-                                    find_provider_from_region_id)
+                                    find_provider_from_region_id,
+                                    find_electoral_region_offline,
+                                    load_postcode_districts, get_postcode_match_keys,
+                                    lookup_region_from_postcode, REGION_MAPPINGS)
 import pytest
-from unittest.mock import MagicMock
+import requests
+from unittest.mock import MagicMock, patch
 
 
 def test_get_region_from_postcode():
@@ -57,3 +61,74 @@ def test_find_provider_from_region_id_invalid():
 
     with pytest.raises(ValueError):
         find_provider_from_region_id(mock_cursor, 1792394234)
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_get_region_from_postcode_uses_district_index(mock_get):
+    assert get_region_from_postcode("ch5 1aa") == "Wales"
+    assert get_region_from_postcode("CH1 1AA") == "North West England"
+    assert get_region_from_postcode("TD15 1AA") == "North East England"
+    mock_get.assert_not_called()
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_get_region_from_postcode_rejects_invalid_without_lookup(mock_get):
+    with pytest.raises(ValueError):
+        get_region_from_postcode("not a postcode")
+    mock_get.assert_not_called()
+
+
+def test_find_electoral_region_offline_split_district():
+    assert find_electoral_region_offline("CH4 0AA") is None
+    assert find_electoral_region_offline("BT1 1AA") == "Northern Ireland"
+
+
+def test_load_postcode_districts_regions_are_mapped():
+    regions = set(load_postcode_districts().values()) - {None, "Northern Ireland"}
+    assert regions <= set(REGION_MAPPINGS)
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_get_region_from_postcode_uses_memo_table(mock_get):
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.return_value = ("Wales",)
+
+    assert get_region_from_postcode("CH4 0AA", mock_cursor) == "Wales"
+    mock_cursor.execute.assert_called_once()
+    assert mock_cursor.execute.call_args[0][1] == ("CH40AA",)
+    mock_get.assert_not_called()
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_get_region_from_postcode_memoises_lookups(mock_get):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {
+        "result": {"european_electoral_region": "North West"}}
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.return_value = None
+
+    assert get_region_from_postcode("CH4 0AA", mock_cursor) == "North West England"
+    mock_get.assert_called_once()
+    assert mock_cursor.execute.call_args[0][1] == ("CH40AA", "North West England")
+    mock_cursor.connection.commit.assert_not_called()
+
+
+def test_get_postcode_match_keys():
+    assert get_postcode_match_keys("sw1a1aa") == {"SW1A 1AA", "SW1A 1", "SW1A"}
+    assert get_postcode_match_keys(None) == set()
+    assert get_postcode_match_keys("nonsense") == set()
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_lookup_region_from_postcode_rejected(mock_get):
+    mock_get.return_value.status_code = 404
+    with pytest.raises(ValueError):
+        lookup_region_from_postcode("ZZ11ZZ")
+
+
+@patch("alerts.postcode_lookup.http_get")
+def test_lookup_region_from_postcode_unavailable(mock_get):
+    mock_get.return_value.status_code = 503
+    mock_get.return_value.raise_for_status.side_effect = requests.HTTPError("503")
+    with pytest.raises(requests.RequestException):
+        lookup_region_from_postcode("CH40AA")
@@ -2,9 +2,10 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from alerts.send_alerts import (
-    find_subscribers_from_db, create_subscriber_dict, find_provider_for_user,
-    get_current_time_range, query_recent_outages, find_outage_info_for_user,
-    alert_message_format, send_alert
+    find_subscribers_from_db, create_subscriber_dict,
+    load_new_outages, claim_watermark, advance_watermark, record_alerts_sent,
+    find_outage_info_for_user, send_alert_pipeline, lambda_handler,
+    alert_message_format, build_deliveries, load_deliveries, record_deliveries
 )
 from datetime import datetime, timedelta
 
@@ -13,63 +14,183 @@ from datetime import datetime, timedelta
 def mock_cursor():
     mock = MagicMock()
     mock.fetchall.return_value = [
-        ("fake", "fakenumber", "fake@fake.com", None, 1, "fakefake")
+        ("fake", "fakenumber", "fake@fake.com", None, 1, "fakefake", 123, "fakeregion", 9,
+         "sms")
     ]
     return mock
 
 
 def test_find_subscribers_from_db(mock_cursor):
-    users = find_subscribers_from_db(mock_cursor)
+    users = find_subscribers_from_db(mock_cursor, [123])
+    assert mock_cursor.execute.call_args[0][1] == ([123], )
     assert isinstance(users, list)
     assert users[0][0] == "fake"
 
 
 def test_create_subscriber_dict(mock_cursor):
-    users = create_subscriber_dict(mock_cursor)
+    users = create_subscriber_dict(mock_cursor, [123])
     assert users[0]["name"] == "fake"
     assert users[0]["email"] == "fake@fake.com"
+    assert users[0]["provider_id"] == 123
+    assert users[0]["region_name"] == "fakeregion"
+    assert users[0]["alert_channel"] == "sms"
 
 
-@patch("alerts.send_alerts.find_provider_from_region_id")
-def test_find_provider_for_user_with_region(mock_provider_lookup, mock_cursor):
-    mock_provider_lookup.return_value = (123, "fakeregion")
-    user = {"region_id": 1, "postcode": "fakefake"}
-    user_with_provider = find_provider_for_user(mock_cursor, user)
-    assert user_with_provider["provider_id"] == 123
-    assert user_with_provider["region_name"] == "fakeregion"
+ALERT_USER = {"alert_id": 4, "name": "a", "region_name": "London", "email": "a@a.com",
+              "phone": "+447700900123",
+              "outages": [{"outage_id": 44, "outage_start": "10:00", "outage_end": "12:00"}]}
 
 
-@patch("alerts.send_alerts.get_region_from_postcode", return_value="fakeregion")
-@patch("alerts.send_alerts.find_provider_from_region", return_value=321)
-def test_find_provider_for_user_with_postcode(_, __, mock_cursor):
-    user = {"postcode": "fakefake"}
-    user_with_provider = find_provider_for_user(mock_cursor, user)
-    assert user_with_provider["provider_id"] == 321
-    assert user_with_provider["region_name"] == "fakeregion"
+@pytest.mark.parametrize("channel, expected", [
+    ("email", [(4, "email", "a@a.com")]),
+    ("sms", [(4, "sms", "+447700900123")]),
+    ("both", [(4, "email", "a@a.com"), (4, "sms", "+447700900123")]),
+    (None, [(4, "email", "a@a.com")])
+])
+def test_build_deliveries(channel, expected):
+    user = {**ALERT_USER, "alert_channel": channel}
+    planned = build_deliveries(user, {}, 41)
+    assert [delivery[:3] for delivery in planned] == expected
+    assert all("Hi a" in delivery[3] and delivery[4] == [44] for delivery in planned)
 
 
-def test_get_current_time_range():
-    past, now = get_current_time_range(5)
-    assert isinstance(past, str)
-    assert isinstance(now, str)
+def test_build_deliveries_skips_missing_phone():
+    user = {**ALERT_USER, "phone": None, "alert_channel": "both"}
+    assert [delivery[:3] for delivery in build_deliveries(user, {}, 41)] == [
+        (4, "email", "a@a.com")]
 
 
-def test_query_recent_outages(mock_cursor):
+def test_build_deliveries_skips_outages_already_sent_through_channel():
+    user = {**ALERT_USER, "alert_channel": "both"}
+    planned = build_deliveries(user, {(4, 44, "email"): False}, 41)
+    assert [delivery[:2] for delivery in planned] == [(4, "sms")]
+
+
+def test_build_deliveries_retries_failed_outages_before_watermark():
+    old = {"outage_id": 30, "outage_start": "09:00", "outage_end": "10:00"}
+    user = {**ALERT_USER, "alert_channel": "email",
+            "outages": ALERT_USER["outages"] + [old]}
+    planned = build_deliveries(user, {(4, 30, "email"): True}, 41)
+    assert planned[0][4] == [44, 30]
+    assert build_deliveries(user, {(4, 30, "email"): False}, 41)[0][4] == [44]
+
+
+def test_claim_watermark(mock_cursor):
+    mock_cursor.fetchone.side_effect = [(True,), (41,)]
+    assert claim_watermark(mock_cursor) == 41
+    assert "pg_try_advisory_lock" in mock_cursor.execute.call_args_list[0][0][0]
+    assert "FOR UPDATE" not in mock_cursor.execute.call_args[0][0]
+
+
+def test_claim_watermark_waiting(mock_cursor):
+    mock_cursor.fetchone.return_value = (41,)
+    assert claim_watermark(mock_cursor, wait=True) == 41
+    assert "pg_advisory_lock" in mock_cursor.execute.call_args_list[0][0][0]
+
+
+def test_claim_watermark_held_by_another_run(mock_cursor):
+    mock_cursor.fetchone.return_value = (False,)
+    assert claim_watermark(mock_cursor) is None
+    mock_cursor.execute.assert_called_once()
+
+
+def test_advance_watermark(mock_cursor):
+    advance_watermark(mock_cursor, 57)
+    assert mock_cursor.execute.call_args[0][1] == (57, "outage_alerts")
+
+
+def test_load_new_outages(mock_cursor):
     mock_cursor.fetchall.return_value = [
-        (datetime.utcnow(), datetime.utcnow() + timedelta(minutes=10), True)
+        (44, 1, datetime.utcnow(), datetime.utcnow() + timedelta(minutes=10), True,
+         ["E1 7"]),
+        (46, 2, datetime.utcnow(), None, False, []),
+        (45, 1, datetime.utcnow(), None, True, [])
     ]
-    outages = query_recent_outages(
-        mock_cursor, 1, "2025-01-01 00:00:00", "2025-01-01 01:00:00")
-    assert isinstance(outages, list)
-    assert "outage_start" in outages[0]
+    outages, last_outage_id = load_new_outages(mock_cursor, 41, [30])
+    assert mock_cursor.execute.call_count == 1
+    assert mock_cursor.execute.call_args[0][1] == (41, [30])
+    assert last_outage_id == 46
+    assert len(outages[1]) == 2
+    assert outages[2][0]["outage_end"] == "Unknown"
+    assert outages[1][0]["outage_id"] == 44
+    assert outages[1][0]["postcodes"] == {"E1 7"}
 
 
-def test_find_outage_info_for_user(mock_cursor):
+def test_load_new_outages_none(mock_cursor):
     mock_cursor.fetchall.return_value = []
-    user = {"provider_id": 1}
-    user_outage = find_outage_info_for_user(mock_cursor, user)
-    assert "outages" in user_outage
-    assert isinstance(user_outage["outages"], list)
+    assert load_new_outages(mock_cursor, 41) == ({}, 41)
+
+
+def test_load_deliveries(mock_cursor):
+    mock_cursor.fetchall.return_value = [(4, 44, "email", False), (4, 30, "sms", True)]
+    assert load_deliveries(mock_cursor, 41) == {(4, 44, "email"): False,
+                                                (4, 30, "sms"): True}
+    assert mock_cursor.execute.call_args[0][1] == (3, 41, 3)
+
+
+@patch("alerts.send_alerts.psycopg2.extras.execute_values")
+def test_record_deliveries(mock_execute_values, mock_cursor):
+    planned = [(4, "email", "a@a.com", "alert", [44, 45]),
+               (4, "sms", "+447700900123", "alert", [44])]
+    results = {"sent": {(4, "email"): "msg-1"}, "failed": {(4, "sms"): "throttled"}}
+    record_deliveries(mock_cursor, planned, results)
+    mock_execute_values.assert_called_once()
+    assert mock_execute_values.call_args[0][2] == [
+        (4, 44, "email", "sent", None), (4, 45, "email", "sent", None),
+        (4, 44, "sms", "failed", "throttled")]
+
+
+@patch("alerts.send_alerts.psycopg2.extras.execute_values")
+def test_record_deliveries_nothing_planned(mock_execute_values, mock_cursor):
+    record_deliveries(mock_cursor, [], {"sent": {}, "failed": {}})
+    mock_execute_values.assert_not_called()
+
+
+def test_record_alerts_sent_in_one_statement(mock_cursor):
+    record_alerts_sent(mock_cursor, [3, 5, 8])
+    mock_cursor.execute.assert_called_once()
+    assert mock_cursor.execute.call_args[0][1] == ([3, 5, 8], )
+
+
+def test_record_alerts_sent_nothing_sent(mock_cursor):
+    record_alerts_sent(mock_cursor, [])
+    mock_cursor.execute.assert_not_called()
+
+
+def test_find_outage_info_for_user():
+    outages = {1: [{"outage_start": "10:00", "outage_end": "12:00", "planned": True,
+                    "postcodes": set()}]}
+    user_outage = find_outage_info_for_user({"provider_id": 1}, outages)
+    assert user_outage["outages"] == outages[1]
+
+
+def test_find_outage_info_for_user_matches_postcodes():
+    near = {"outage_start": "10:00", "postcodes": {"E1 7DB", "E1 7DA"}}
+    sector = {"outage_start": "11:00", "postcodes": {"E1 7"}}
+    district = {"outage_start": "12:00", "postcodes": {"E1"}}
+    far = {"outage_start": "13:00", "postcodes": {"N1 9GU"}}
+    unlisted = {"outage_start": "14:00", "postcodes": set()}
+    outages = {1: [near, sector, district, far, unlisted]}
+
+    user_outage = find_outage_info_for_user({"provider_id": 1, "postcode": "e17db"}, outages)
+    assert user_outage["outages"] == [near, sector, district, unlisted]
+
+
+def test_find_outage_info_for_user_keeps_outages_started_before_last_alert():
+    outage = {"outage_start": "10:00", "postcodes": set()}
+    user = {"provider_id": 1, "last_alert": datetime(2025, 1, 1, 10)}
+    assert find_outage_info_for_user(user, {1: [outage]})["outages"] == [outage]
+
+
+def test_find_outage_info_for_user_without_postcode_gets_region():
+    outages = {1: [{"outage_start": "13:00", "postcodes": {"N1 9GU"}}]}
+    user_outage = find_outage_info_for_user({"provider_id": 1, "postcode": None}, outages)
+    assert user_outage["outages"] == outages[1]
+
+
+def test_find_outage_info_for_user_without_outages():
+    user_outage = find_outage_info_for_user({"provider_id": 2}, {})
+    assert user_outage["outages"] == []
 
 
 def test_alert_message_format_with_outage():
@@ -96,16 +217,71 @@ def test_alert_message_format_no_outages():
     assert message is None
 
 
-@patch("alerts.send_alerts.boto3.client")
-@patch("alerts.send_alerts.alert_message_format", return_value="Test Alert")
-def test_send_alert_success(mock_msg_format, mock_boto_client):
-    mock_client = MagicMock()
-    mock_boto_client.return_value = mock_client
-    user = {
-        "name": "Test",
-        "email": "test@example.com",
-        "region_name": "RegionX",
-        "outages": [{"outage_start": "10:00", "outage_end": "12:00", "planned": True}]
-    }
-    send_alert(user)
-    mock_client.send_raw_email.assert_called_once()
+OUTAGE = {"outage_id": 50, "outage_start": "10:00", "outage_end": "12:00", "planned": True,
+          "postcodes": set()}
+
+
+@pytest.fixture
+def pipeline_connection():
+    with patch("alerts.send_alerts.get_connection_to_db") as mock_connect:
+        yield mock_connect.return_value
+
+
+@patch("alerts.send_alerts.dispatch_alerts",
+       return_value={"sent": {(1, "email"): "msg-1"}, "failed": {(1, "sms"): "throttled"}})
+@patch("alerts.send_alerts.create_subscriber_dict")
+@patch("alerts.send_alerts.load_new_outages", return_value=({123: [OUTAGE]}, 50))
+@patch("alerts.send_alerts.load_deliveries",
+       return_value={(2, 50, "email"): False, (1, 30, "sms"): True})
+@patch("alerts.send_alerts.claim_watermark", return_value=41)
+def test_send_alert_pipeline(_, __, mock_load, mock_users, mock_send, pipeline_connection):
+    mock_users.return_value = [
+        {"name": "a", "email": "a@a.com", "phone": "+447700900123", "alert_id": 1,
+         "provider_id": 123, "region_name": "London", "last_alert": None, "postcode": None,
+         "alert_channel": "both"},
+        {"name": "b", "email": "b@b.com", "alert_id": 2, "provider_id": 123,
+         "region_name": "London", "last_alert": None, "postcode": None},
+        {"name": "c", "email": "c@c.com", "alert_id": 3, "provider_id": 7,
+         "region_name": "Wales", "last_alert": None, "postcode": None}
+    ]
+    events = []
+    pipeline_connection.commit.side_effect = lambda: events.append("commit")
+    with patch("alerts.send_alerts.record_deliveries",
+               side_effect=lambda *_: events.append("deliveries")) as mock_deliveries, \
+            patch("alerts.send_alerts.record_alerts_sent") as mock_record, \
+            patch("alerts.send_alerts.advance_watermark",
+                  side_effect=lambda *_: events.append("watermark")) as mock_advance:
+        send_alert_pipeline()
+
+    mock_load.assert_called_once_with(pipeline_connection.cursor.return_value, 41, [30])
+    assert mock_users.call_args[0][1] == [123]
+    alerts = mock_send.call_args[0][0]
+    assert [alert[:3] for alert in alerts] == [(1, "email", "a@a.com"),
+                                               (1, "sms", "+447700900123")]
+    assert "Hi a" in alerts[0][3]
+    assert [delivery[4] for delivery in mock_deliveries.call_args[0][1]] == [[50], [50]]
+    assert mock_record.call_args[0][1] == [1]
+    assert mock_advance.call_args[0][1] == 50
+    assert events == ["deliveries", "commit", "watermark", "commit"]
+    pipeline_connection.close.assert_called_once()
+
+
+@patch("alerts.send_alerts.load_new_outages")
+@patch("alerts.send_alerts.claim_watermark", return_value=None)
+def test_send_alert_pipeline_skips_while_another_run_is_going(_, mock_load,
+                                                             pipeline_connection):
+    send_alert_pipeline()
+    mock_load.assert_not_called()
+    pipeline_connection.close.assert_called_once()
+
+
+@patch("alerts.send_alerts.send_alert_pipeline")
+def test_lambda_handler_waits_when_triggered_by_load(mock_pipeline):
+    lambda_handler({"source": "outage_load", "new_outages": 1}, None)
+    mock_pipeline.assert_called_once_with(wait_for_lock=True)
+
+
+@patch("alerts.send_alerts.send_alert_pipeline")
+def test_lambda_handler_scheduled_run_skips_when_busy(mock_pipeline):
+    lambda_handler({}, None)
+    mock_pipeline.assert_called_once_with(wait_for_lock=False)
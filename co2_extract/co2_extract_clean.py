@@ -4,6 +4,10 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Dict
 import requests
 import pandas as pd
+from http_client import http_get
+
+NESO_URL = 'https://api.neso.energy/api/3/action/datastore_search_sql'
+NESO_TIMEOUT = (3.05, 15)
 
 
 def get_time_range(hours_back: int = 0.5) -> tuple[str, str]:
@@ -35,8 +39,8 @@ def fetch_data(sql: str) -> List[Dict]:
     """
     params = {'sql': sql}
     try:
-        response = requests.get('https://api.neso.energy/api/3/action/datastore_search_sql',
-                                params=parse.urlencode(params))
+        response = http_get(NESO_URL, timeout=NESO_TIMEOUT,
+                            params=parse.urlencode(params))
 
         response.raise_for_status()
         return response.json()["result"]["records"]
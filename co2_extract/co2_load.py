@@ -92,10 +92,28 @@ def insert_carbon_intensities(df: pd.DataFrame, conn: Connection, cur: Cursor):
     logging.info("All data inserted into carbon_intensities table.")
 
 
+def refresh_rollups(df: pd.DataFrame, conn: Connection, cur: Cursor):
+    """
+    Recomputes the rollups covering the measurement times that were just loaded.
+    """
+    if df.empty:
+        return
+
+    try:
+        cur.execute("SELECT refresh_rollups(%s, %s)",
+                    (df['time_of_measure'].min(), df['time_of_measure'].max()))
+        conn.commit()
+        logging.info("Rollups refreshed.")
+    except psycopg2.Error as e:
+        conn.rollback()
+        logging.error("Error refreshing rollups: %s", e)
+
+
 if __name__ == "__main__":
     CLEAN_FILE_PATH = "/tmp/clean_live_co2.csv"
     co2_df = load_csv(CLEAN_FILE_PATH)
     connection, cursor = connect_to_db()
     insert_carbon_intensities(co2_df, connection, cursor)
+    refresh_rollups(co2_df, connection, cursor)
     cursor.close()
     connection.close()
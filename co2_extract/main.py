@@ -1,6 +1,6 @@
 '''This script is a lamda function for running the CO2 data pipeline'''
 from co2_extract_clean import main as extract_main
-from co2_load import insert_carbon_intensities, connect_to_db, load_csv
+from co2_load import insert_carbon_intensities, connect_to_db, load_csv, refresh_rollups
 
 
 def lambda_handler(event=None, context=None):
@@ -10,6 +10,7 @@ def lambda_handler(event=None, context=None):
     df = load_csv(file_path)
     conn, cur = connect_to_db()
     insert_carbon_intensities(df, conn, cur)
+    refresh_rollups(df, conn, cur)
     cur.close()
     conn.close()
 
@@ -30,7 +30,7 @@ def test_build_sql_query_includes_dates():
     assert 'SELECT COUNT(*)' in query
 
 
-@patch('co2_extract_clean.requests.get')
+@patch('co2_extract_clean.http_get')
 def test_fetch_data_success(mock_get):
     mock_response = Mock()
     mock_response.status_code = 200
@@ -45,7 +45,7 @@ def test_fetch_data_success(mock_get):
     assert records[0]["_id"] == 1
 
 
-@patch('co2_extract_clean.requests.get')
+@patch('co2_extract_clean.http_get')
 def test_fetch_data_error(mock_get):
     mock_get.side_effect = RequestException("API error")
     records = fetch_data("SELECT * FROM dummy")
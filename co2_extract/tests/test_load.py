@@ -3,7 +3,7 @@
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock, mock_open
-from co2_load import connect_to_db, load_csv, insert_carbon_intensities
+from co2_load import connect_to_db, load_csv, insert_carbon_intensities, refresh_rollups
 
 
 @patch("co2_load.psycopg2.connect")
@@ -86,3 +86,23 @@ def test_insert_carbon_intensities_missing_region(caplog):
 
     assert "Region not found in database: Unknown Region" in caplog.text
     mock_conn.commit.assert_called_once()
+
+
+def test_refresh_rollups_covers_loaded_times():
+    df = pd.DataFrame({"time_of_measure": ["2024-01-01T13:00:00", "2024-01-01T12:00:00"]})
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+
+    refresh_rollups(df, mock_conn, mock_cursor)
+
+    mock_cursor.execute.assert_called_once_with(
+        "SELECT refresh_rollups(%s, %s)", ("2024-01-01T12:00:00", "2024-01-01T13:00:00"))
+    mock_conn.commit.assert_called_once()
+
+
+def test_refresh_rollups_skips_empty_load():
+    mock_cursor = MagicMock()
+
+    refresh_rollups(pd.DataFrame(), MagicMock(), mock_cursor)
+
+    mock_cursor.execute.assert_not_called()
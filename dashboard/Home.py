@@ -1,4 +1,5 @@
 """Homepage for Streamlit dashboard"""
+from datetime import timedelta
 import streamlit as st
 import altair as alt
 import pandas as pd
@@ -7,6 +8,19 @@ from psycopg2.extras import RealDictCursor
 import plotly.express as px
 import plotly.figure_factory as ff
 
+MIN_GRAPH_POINTS = 100
+# Rollup bucket widths, coarsest first
+ROLLUP_WIDTHS = {
+    '1 day': timedelta(days=1),
+    '1 hour': timedelta(hours=1),
+    '30 minutes': timedelta(minutes=30)
+}
+DURATION_LENGTHS = {
+    '24 hours': timedelta(hours=24),
+    '1 week': timedelta(weeks=1),
+    '1 month': timedelta(days=31)
+}
+
 
 @st.cache_data(ttl=360)
 def retrieve_generation_mix_data(_db_cursor) -> pd.DataFrame:
@@ -17,12 +31,17 @@ def retrieve_generation_mix_data(_db_cursor) -> pd.DataFrame:
             SELECT gd.fuel_type_id, gd.mw_generated, gd.updated_at
             FROM generations gd
             INNER JOIN(
-                SELECT fuel_type_id, MAX(updated_at) AS latest_time
+                SELECT fuel_type_id, MAX(generation_at) AS latest_time
                 FROM generations
+                WHERE generation_at >= NOW() - '1 day'::INTERVAL
                 GROUP BY fuel_type_id
-            ) latest ON gd.fuel_type_id = latest.fuel_type_id AND gd.updated_at = latest.latest_time
+            ) latest ON gd.fuel_type_id = latest.fuel_type_id
+                AND gd.generation_at = latest.latest_time
+            WHERE gd.generation_at >= NOW() - '1 day'::INTERVAL
         )
-        SELECT * FROM Latest_gen_data JOIN fuel_types USING(fuel_type_id) JOIN fuel_categories USING(fuel_category_id);
+        SELECT * FROM Latest_gen_data
+            JOIN fuel_types USING(fuel_type_id)
+            JOIN fuel_categories USING(fuel_category_id);
         """)
 
     generation_data = _db_cursor.fetchall()
@@ -32,7 +51,10 @@ def retrieve_generation_mix_data(_db_cursor) -> pd.DataFrame:
 def retrieve_price_data(_db_cursor):
     """Retrieve Pricing Data from DB"""
     _db_cursor.execute(
-        "SELECT * FROM prices WHERE updated_at >= NOW() - '1 day'::INTERVAL ORDER  BY price_at DESC LIMIT 100")
+        """SELECT * FROM prices
+            WHERE price_at >= NOW() - '1 day'::INTERVAL
+            ORDER BY price_at DESC
+            LIMIT 100""")
     return _db_cursor.fetchall()
 
 
@@ -40,7 +62,7 @@ def retrieve_price_data(_db_cursor):
 def retrieve_demand_data(_db_cursor):
     """Retrieve Demand Data from DB"""
     _db_cursor.execute(
-        "SELECT total_demand, demand_at FROM demands WHERE updated_at >= NOW() - '1 day'::INTERVAL")
+        "SELECT total_demand, demand_at FROM demands WHERE demand_at >= NOW() - '1 day'::INTERVAL")
     demand = _db_cursor.fetchall()
     return demand
 
@@ -51,20 +73,78 @@ def format_generation_data(generation_data: list[dict]):
     generation_mix['updated_at'] = pd.to_datetime(
         generation_mix['updated_at'], utc=True)
 
-    generation_mix.drop_duplicates(inplace=True)
     generation_mix['Energy_Gen'] = generation_mix["mw_generated"] / 1000
     generation_mix['Energy_Gen'] = generation_mix['Energy_Gen'].map(lambda x:
                                                                     f"{x:,.2f}GW")
     return generation_mix
 
 
+def get_rollup_width(duration: str) -> str | None:
+    """Pick the coarsest rollup that still gives enough points to plot, None for raw data"""
+    for width, bucket in ROLLUP_WIDTHS.items():
+        if DURATION_LENGTHS[duration] / bucket >= MIN_GRAPH_POINTS:
+            return width
+    return None
+
+
+def get_demand_query(duration: str) -> tuple[str, tuple | None]:
+    """Build the demand query for a duration, reading rollups where possible"""
+    width = get_rollup_width(duration)
+    if width is None:
+        return (f"SELECT total_demand, demand_at FROM demands "
+                f"WHERE demand_at >= NOW() - '{duration}'::INTERVAL", None)
+    return (f"""
+        SELECT total / NULLIF(reading_count, 0) AS total_demand, bucket_at AS demand_at
+        FROM demand_rollups
+        WHERE bucket_width = %s::INTERVAL
+        AND bucket_at >= NOW() - '{duration}'::INTERVAL
+        ORDER BY bucket_at
+        """, (width,))
+
+
+def get_price_query(duration: str) -> tuple[str, tuple | None]:
+    """Build the price query for a duration, reading rollups where possible"""
+    width = get_rollup_width(duration)
+    if width is None:
+        return f"SELECT * FROM prices WHERE price_at >= NOW() - '{duration}'::INTERVAL", None
+    return (f"""
+        SELECT total / NULLIF(reading_count, 0) AS price_per_mwh, bucket_at AS price_at
+        FROM price_rollups
+        WHERE bucket_width = %s::INTERVAL
+        AND bucket_at >= NOW() - '{duration}'::INTERVAL
+        ORDER BY bucket_at
+        """, (width,))
+
+
+def get_generation_query(duration: str) -> tuple[str, tuple | None]:
+    """Build the generation by fuel type query for a duration, reading rollups where possible"""
+    width = get_rollup_width(duration)
+    if width is None:
+        return (f"""
+        SELECT mw_generated, generation_at, fuel_type_name FROM generations
+        JOIN fuel_types USING(fuel_type_id)
+        WHERE generation_at >= NOW() - '{duration}'::INTERVAL
+        AND fuel_type NOT LIKE 'INT%'
+        AND mw_generated > 0
+        """, None)
+    return (f"""
+        SELECT total / NULLIF(reading_count, 0) AS mw_generated, bucket_at AS generation_at,
+               fuel_type_name
+        FROM generation_rollups
+        JOIN fuel_types USING(fuel_type_id)
+        WHERE bucket_width = %s::INTERVAL
+        AND bucket_at >= NOW() - '{duration}'::INTERVAL
+        AND fuel_type NOT LIKE 'INT%%'
+        AND total > 0
+        """, (width,))
+
+
 @st.cache_data(ttl=360)
 def generate_demand_graph(_db_cursor, demand_range):
     """Generate demand"""
     duration = get_duration(demand_range)
 
-    _db_cursor.execute(
-        f"SELECT total_demand, demand_at FROM demands WHERE updated_at >= NOW() - '{duration}'::INTERVAL")
+    _db_cursor.execute(*get_demand_query(duration))
     demands = _db_cursor.fetchall()
 
     demand_df = pd.DataFrame(demands)
@@ -86,8 +166,7 @@ def generate_price_graph(_db_cursor, price_range):
     """Generate price"""
     duration = get_duration(price_range)
 
-    _db_cursor.execute(
-        f"SELECT * FROM prices WHERE updated_at >= NOW() - '{duration}'::INTERVAL")
+    _db_cursor.execute(*get_price_query(duration))
     prices = _db_cursor.fetchall()
 
     price_df = pd.DataFrame(prices)
@@ -168,30 +247,23 @@ def generate_24h_energy_generation_graph(_db_cursor, generation_range):
     """Generate 24h generation mix"""
     duration = get_duration(generation_range)
 
-    _db_cursor.execute(
-        f"""
-        SELECT * FROM generations
-        JOIN fuel_types USING(fuel_type_id)
-        WHERE generation_at >= NOW() - '{duration}'::INTERVAL
-        AND fuel_type NOT LIKE 'INT%'
-        AND mw_generated > 0
-        """)
+    _db_cursor.execute(*get_generation_query(duration))
     energy_mix = _db_cursor.fetchall()
     energy_mix_df = pd.DataFrame(energy_mix)
 
-    energy_mix_df = format_generation_data(energy_mix_df)
-    energy_mix_df['updated_at'] = pd.to_datetime(
-        energy_mix_df['updated_at'], utc=True)
-    energy_mix_df['updated_at'] = energy_mix_df['updated_at'].dt.round('min')
+    energy_mix_df['mw_generated'] = pd.to_numeric(energy_mix_df['mw_generated'])
+    energy_mix_df['generation_at'] = pd.to_datetime(
+        energy_mix_df['generation_at'], utc=True)
+    energy_mix_df['generation_at'] = energy_mix_df['generation_at'].dt.round('min')
 
     fig = alt.Chart(energy_mix_df).mark_area().encode(
-        x=alt.X('updated_at', title="Time"),
+        x=alt.X('generation_at', title="Time"),
         y=alt.Y('mw_generated', title="MW Generated"),
         color=alt.Color('fuel_type_name', legend=alt.Legend(
             orient='bottom', direction='horizontal', title='Fuel Types  ')),
         tooltip=[alt.Tooltip('mw_generated', title="Power Generated"), alt.Tooltip(
             'fuel_type_name', title="Fuel Type"),
-            alt.Tooltip('updated_at', title="Time", timeUnit='hoursminutes')]
+            alt.Tooltip('generation_at', title="Time", timeUnit='hoursminutes')]
 
     ).properties(
         height=500
@@ -217,9 +289,9 @@ def get_duration(generation_range):
 def format_demand_data(demand_data):
     """Format demand data"""
     demand_df = pd.DataFrame(demand_data)
-    demand_df.drop_duplicates(inplace=True)
     demand_df['demand_at'] = pd.to_datetime(
         demand_df['demand_at'], utc=True)
+    demand_df['total_demand'] = pd.to_numeric(demand_df['total_demand'])
     demand_df['Energy Demand'] = demand_df["total_demand"] / 1000
     demand_df['Energy Demand'] = demand_df['Energy Demand'].map(lambda x:
                                                                 f"{x:,.2f}")
@@ -229,12 +301,10 @@ def format_demand_data(demand_data):
 def format_price_data(price_data):
     """Format price"""
     price_df = pd.DataFrame(price_data)
-    price_df.drop(columns=['price_id', 'updated_at'], inplace=True)
+    price_df.drop(columns=['price_id', 'updated_at'], inplace=True, errors='ignore')
     price_df['price_at'] = pd.to_datetime(
         price_df['price_at'], utc=True)
 
-    price_df.drop_duplicates(inplace=True)
-
     price_df['price_per_mwh'] = pd.to_numeric(
         price_df['price_per_mwh'])
     price_df['Price per MWH'] = price_df['price_per_mwh'].map(lambda x:
@@ -8,6 +8,9 @@ from utils.api import submit_form
 from validate_email_address import validate_email
 import phonenumbers
 
+# Alert channel options shown on the form -> alerts.alert_channel
+ALERT_CHANNELS = {"Email": "email", "Text message": "sms", "Both": "both"}
+
 
 def get_connection_to_db() -> connection:
     """Gets a psycopg2 connection to the energy database"""
@@ -53,6 +56,12 @@ def validate_phone_number(phone: str) -> bool:
     return phonenumbers.is_valid_number(phone_number)
 
 
+def format_phone_number(phone: str) -> str:
+    """Function to format a given phone number as E.164, which SNS needs to text it"""
+    phone_number = phonenumbers.parse(phone, "GB")
+    return phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
+
+
 def newsletter_form():
     """Display Newsletter subscription form"""
 
@@ -98,6 +107,7 @@ def alert_form(regions: list[str]):
         email = st.text_input("Email")
         region = st.selectbox("Region", regions, key="r2")
         postcode = st.text_input("Postcode", key="pc2")
+        channel = st.radio("Send alerts by", list(ALERT_CHANNELS), horizontal=True)
         submitted = st.form_submit_button("Submit")
 
         valid_email = True
@@ -109,15 +119,18 @@ def alert_form(regions: list[str]):
             valid_number = validate_phone_number(phone)
 
         if submitted:
-            if valid_email and valid_number:
+            if ALERT_CHANNELS[channel] != "email" and not phone:
+                st.error("A phone number is needed for text message alerts")
+            elif valid_email and valid_number:
                 result = submit_form({
                     "type": "alert",
                     "first_name": first_name,
                     "last_name": last_name,
-                    "phone": phone,
+                    "phone": format_phone_number(phone) if phone else phone,
                     "email": email,
                     "region": region,
-                    "postcode": postcode
+                    "postcode": postcode,
+                    "alert_channel": ALERT_CHANNELS[channel]
                 })
                 if result:
                     st.success("Alert subscription saved!")
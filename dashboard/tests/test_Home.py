@@ -2,7 +2,7 @@
 import pytest
 import pandas as pd
 
-from Home import latest_demand_metric, latest_price_metric, latest_generation_metric, latest_imports_metric, get_duration, format_demand_data, format_price_data
+from Home import latest_demand_metric, latest_price_metric, latest_generation_metric, latest_imports_metric, get_duration, format_demand_data, format_price_data, get_rollup_width, get_demand_query, get_generation_query
 
 
 def test_get_duration():
@@ -12,6 +12,28 @@ def test_get_duration():
     assert get_duration("other") == "24 hours"
 
 
+def test_get_rollup_width():
+    assert get_rollup_width("24 hours") is None
+    assert get_rollup_width("1 week") == "1 hour"
+    assert get_rollup_width("1 month") == "1 hour"
+
+
+def test_get_demand_query_reads_rollups_for_long_ranges():
+    query, params = get_demand_query("1 week")
+    assert "FROM demand_rollups" in query
+    assert params == ("1 hour",)
+
+    query, params = get_demand_query("24 hours")
+    assert "FROM demands" in query
+    assert params is None
+
+
+def test_get_generation_query_reads_rollups_for_long_ranges():
+    query, params = get_generation_query("1 month")
+    assert "FROM generation_rollups" in query
+    assert params == ("1 hour",)
+
+
 def test_format_demand_data():
     data = [
         {"demand_at": "2025-04-01T00:00:00Z", "total_demand": 5000},
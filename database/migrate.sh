@@ -0,0 +1,20 @@
+source .env
+
+PSQL="psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -v ON_ERROR_STOP=1 -q"
+export PGPASSWORD=$DB_PASSWORD
+
+echo "Running migrations..."
+$PSQL -c "CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP DEFAULT NOW());"
+
+for migration in migrations/*.sql; do
+    name=$(basename $migration)
+    if [ "$($PSQL -tAc "SELECT 1 FROM schema_migrations WHERE name = '$name'")" = "1" ]; then
+        echo "Skipping $name, already applied"
+        continue
+    fi
+    echo "Applying $name"
+    $PSQL -f $migration || exit 1
+    $PSQL -c "INSERT INTO schema_migrations (name) VALUES ('$name');"
+done
+
+echo "Migrations complete."
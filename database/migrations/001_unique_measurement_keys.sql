@@ -0,0 +1,26 @@
+-- Adds natural keys to prices, demands and generations so loads can upsert.
+-- Duplicate rows created by retried or overlapping loads are removed first, keeping the earliest.
+
+BEGIN;
+
+DELETE FROM prices p
+USING prices duplicate
+WHERE p.price_at = duplicate.price_at
+AND p.price_id > duplicate.price_id;
+
+DELETE FROM demands d
+USING demands duplicate
+WHERE d.demand_at = duplicate.demand_at
+AND d.demand_id > duplicate.demand_id;
+
+DELETE FROM generations g
+USING generations duplicate
+WHERE g.generation_at = duplicate.generation_at
+AND g.fuel_type_id = duplicate.fuel_type_id
+AND g.generation_id > duplicate.generation_id;
+
+ALTER TABLE prices ADD CONSTRAINT uq_price_at UNIQUE (price_at);
+ALTER TABLE demands ADD CONSTRAINT uq_demand_at UNIQUE (demand_at);
+ALTER TABLE generations ADD CONSTRAINT uq_generation_at_fuel_type UNIQUE (generation_at, fuel_type_id);
+
+COMMIT;
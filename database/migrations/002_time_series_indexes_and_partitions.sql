@@ -0,0 +1,179 @@
+-- Partitions the measurement tables by month on their measurement time and indexes the
+-- time and foreign key columns used by the dashboard, newsletter and alerts.
+-- Rows without a measurement time can't be placed in a partition and are dropped.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent_table TEXT, partition_column TEXT,
+                                                     from_month DATE, to_month DATE)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := format('%s_%s', parent_table, to_char(month_start, 'YYYY_MM'));
+
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Rows for this month may already have landed in the default partition
+            EXECUTE format('CREATE TEMP TABLE pending_rows (LIKE %I)', parent_table);
+            EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *)
+                            INSERT INTO pending_rows SELECT * FROM moved',
+                           parent_table || '_default', partition_column, month_start,
+                           partition_column, month_end);
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent_table, month_start, month_end);
+            EXECUTE format('INSERT INTO %I OVERRIDING SYSTEM VALUE SELECT * FROM pending_rows',
+                           parent_table);
+            DROP TABLE pending_rows;
+            created := created + 1;
+        END IF;
+
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+
+ALTER TABLE prices RENAME TO prices_unpartitioned;
+ALTER INDEX prices_pkey RENAME TO prices_unpartitioned_pkey;
+ALTER INDEX uq_price_at RENAME TO uq_price_at_unpartitioned;
+ALTER SEQUENCE prices_price_id_seq RENAME TO prices_unpartitioned_price_id_seq;
+
+CREATE TABLE prices(
+    price_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    price_per_mwh DECIMAL(5,2),
+    price_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (price_id, price_at),
+    CONSTRAINT uq_price_at UNIQUE (price_at)
+) PARTITION BY RANGE (price_at);
+
+CREATE TABLE prices_default PARTITION OF prices DEFAULT;
+SELECT create_monthly_partitions('prices', 'price_at',
+    COALESCE((SELECT MIN(price_at) FROM prices_unpartitioned), NOW())::DATE,
+    (NOW() + INTERVAL '3 months')::DATE);
+
+INSERT INTO prices OVERRIDING SYSTEM VALUE
+SELECT price_id, price_per_mwh, price_at, updated_at
+FROM prices_unpartitioned
+WHERE price_at IS NOT NULL;
+
+SELECT setval(pg_get_serial_sequence('prices', 'price_id'), COALESCE(MAX(price_id), 0) + 1, false)
+FROM prices;
+DROP TABLE prices_unpartitioned;
+
+
+ALTER TABLE demands RENAME TO demands_unpartitioned;
+ALTER INDEX demands_pkey RENAME TO demands_unpartitioned_pkey;
+ALTER INDEX uq_demand_at RENAME TO uq_demand_at_unpartitioned;
+ALTER SEQUENCE demands_demand_id_seq RENAME TO demands_unpartitioned_demand_id_seq;
+
+CREATE TABLE demands(
+    demand_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    demand_at TIMESTAMP NOT NULL,
+    total_demand BIGINT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (demand_id, demand_at),
+    CONSTRAINT uq_demand_at UNIQUE (demand_at)
+) PARTITION BY RANGE (demand_at);
+
+CREATE TABLE demands_default PARTITION OF demands DEFAULT;
+SELECT create_monthly_partitions('demands', 'demand_at',
+    COALESCE((SELECT MIN(demand_at) FROM demands_unpartitioned), NOW())::DATE,
+    (NOW() + INTERVAL '3 months')::DATE);
+
+INSERT INTO demands OVERRIDING SYSTEM VALUE
+SELECT demand_id, demand_at, total_demand, updated_at
+FROM demands_unpartitioned
+WHERE demand_at IS NOT NULL;
+
+SELECT setval(pg_get_serial_sequence('demands', 'demand_id'), COALESCE(MAX(demand_id), 0) + 1, false)
+FROM demands;
+DROP TABLE demands_unpartitioned;
+
+
+ALTER TABLE generations RENAME TO generations_unpartitioned;
+ALTER INDEX generations_pkey RENAME TO generations_unpartitioned_pkey;
+ALTER INDEX uq_generation_at_fuel_type RENAME TO uq_generation_at_fuel_type_unpartitioned;
+ALTER SEQUENCE generations_generation_id_seq RENAME TO generations_unpartitioned_generation_id_seq;
+
+CREATE TABLE generations(
+    generation_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    mw_generated SMALLINT,
+    fuel_type_id SMALLINT,
+    generation_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (generation_id, generation_at),
+    CONSTRAINT uq_generation_at_fuel_type UNIQUE (generation_at, fuel_type_id),
+    CONSTRAINT fk_fuel_type_id FOREIGN KEY (fuel_type_id) REFERENCES fuel_types (fuel_type_id)
+) PARTITION BY RANGE (generation_at);
+
+CREATE TABLE generations_default PARTITION OF generations DEFAULT;
+SELECT create_monthly_partitions('generations', 'generation_at',
+    COALESCE((SELECT MIN(generation_at) FROM generations_unpartitioned), NOW())::DATE,
+    (NOW() + INTERVAL '3 months')::DATE);
+
+INSERT INTO generations OVERRIDING SYSTEM VALUE
+SELECT generation_id, mw_generated, fuel_type_id, generation_at, updated_at
+FROM generations_unpartitioned
+WHERE generation_at IS NOT NULL;
+
+SELECT setval(pg_get_serial_sequence('generations', 'generation_id'),
+              COALESCE(MAX(generation_id), 0) + 1, false)
+FROM generations;
+DROP TABLE generations_unpartitioned;
+
+
+ALTER TABLE carbon_intensities RENAME TO carbon_intensities_unpartitioned;
+ALTER INDEX carbon_intensities_pkey RENAME TO carbon_intensities_unpartitioned_pkey;
+ALTER SEQUENCE carbon_intensities_carbon_intensity_id_seq
+    RENAME TO carbon_intensities_unpartitioned_carbon_intensity_id_seq;
+
+CREATE TABLE carbon_intensities(
+    carbon_intensity_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    index VARCHAR(10),
+    forecast_measure SMALLINT,
+    measure_at TIMESTAMP NOT NULL,
+    region_id SMALLINT,
+    PRIMARY KEY (carbon_intensity_id, measure_at),
+    CONSTRAINT fk_region_id_carbons FOREIGN KEY (region_id) REFERENCES regions (region_id)
+) PARTITION BY RANGE (measure_at);
+
+CREATE TABLE carbon_intensities_default PARTITION OF carbon_intensities DEFAULT;
+SELECT create_monthly_partitions('carbon_intensities', 'measure_at',
+    COALESCE((SELECT MIN(measure_at) FROM carbon_intensities_unpartitioned), NOW())::DATE,
+    (NOW() + INTERVAL '3 months')::DATE);
+
+INSERT INTO carbon_intensities OVERRIDING SYSTEM VALUE
+SELECT carbon_intensity_id, index, forecast_measure, measure_at, region_id
+FROM carbon_intensities_unpartitioned
+WHERE measure_at IS NOT NULL;
+
+SELECT setval(pg_get_serial_sequence('carbon_intensities', 'carbon_intensity_id'),
+              COALESCE(MAX(carbon_intensity_id), 0) + 1, false)
+FROM carbon_intensities;
+DROP TABLE carbon_intensities_unpartitioned;
+
+
+-- Measurement tables are appended in time order, so BRIN stays small and prunes well
+CREATE INDEX ix_generations_generation_at ON generations USING BRIN (generation_at);
+CREATE INDEX ix_generations_fuel_type_generation_at ON generations (fuel_type_id, generation_at);
+CREATE INDEX ix_carbon_intensities_measure_at ON carbon_intensities USING BRIN (measure_at);
+CREATE INDEX ix_carbon_intensities_region_measure_at ON carbon_intensities (region_id, measure_at);
+
+CREATE INDEX ix_outages_outage_start ON outages (outage_start);
+CREATE INDEX ix_outages_provider_outage_start ON outages (provider_id, outage_start);
+
+CREATE INDEX ix_regions_provider_id ON regions (provider_id);
+CREATE INDEX ix_fuel_types_fuel_category_id ON fuel_types (fuel_category_id);
+CREATE INDEX ix_subscriptions_user_id ON subscriptions (user_id);
+CREATE INDEX ix_subscriptions_region_id ON subscriptions (region_id);
+CREATE INDEX ix_alerts_user_id ON alerts (user_id);
+CREATE INDEX ix_alerts_region_id ON alerts (region_id);
+
+COMMIT;
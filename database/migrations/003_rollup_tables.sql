@@ -0,0 +1,132 @@
+-- Adds 30 minute, hourly and daily rollups of generation, demand, price and carbon intensity
+-- so long dashboard ranges and the newsletter don't have to aggregate raw readings.
+-- Averages are total / reading_count, so rollups can be combined exactly.
+
+BEGIN;
+
+CREATE TABLE generation_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    fuel_type_id SMALLINT NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum SMALLINT,
+    maximum SMALLINT,
+    PRIMARY KEY (bucket_width, bucket_at, fuel_type_id),
+    CONSTRAINT fk_fuel_type_id_rollups FOREIGN KEY (fuel_type_id) REFERENCES fuel_types (fuel_type_id)
+);
+
+CREATE TABLE demand_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum BIGINT,
+    minimum_at TIMESTAMP,
+    maximum BIGINT,
+    maximum_at TIMESTAMP,
+    PRIMARY KEY (bucket_width, bucket_at)
+);
+
+CREATE TABLE price_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum DECIMAL(5,2),
+    minimum_at TIMESTAMP,
+    maximum DECIMAL(5,2),
+    maximum_at TIMESTAMP,
+    PRIMARY KEY (bucket_width, bucket_at)
+);
+
+CREATE TABLE carbon_intensity_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    region_id SMALLINT NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum SMALLINT,
+    maximum SMALLINT,
+    PRIMARY KEY (bucket_width, bucket_at, region_id),
+    CONSTRAINT fk_region_id_rollups FOREIGN KEY (region_id) REFERENCES regions (region_id)
+);
+
+-- Recomputes every bucket overlapping [from_time, to_time] from the raw readings
+CREATE OR REPLACE FUNCTION refresh_rollups(from_time TIMESTAMP, to_time TIMESTAMP)
+RETURNS VOID AS $$
+DECLARE
+    width INTERVAL;
+    bucket_from TIMESTAMP;
+    bucket_to TIMESTAMP;
+BEGIN
+    FOREACH width IN ARRAY ARRAY[INTERVAL '30 minutes', INTERVAL '1 hour', INTERVAL '1 day'] LOOP
+        bucket_from := date_bin(width, from_time, TIMESTAMP '2000-01-01');
+        bucket_to := date_bin(width, to_time, TIMESTAMP '2000-01-01') + width;
+
+        INSERT INTO generation_rollups (bucket_width, bucket_at, fuel_type_id,
+                                        reading_count, total, minimum, maximum)
+        SELECT width, date_bin(width, generation_at, TIMESTAMP '2000-01-01'), fuel_type_id,
+               COUNT(mw_generated), SUM(mw_generated), MIN(mw_generated), MAX(mw_generated)
+        FROM generations
+        WHERE generation_at >= bucket_from AND generation_at < bucket_to
+        AND fuel_type_id IS NOT NULL
+        GROUP BY 2, 3
+        ON CONFLICT (bucket_width, bucket_at, fuel_type_id) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, maximum = EXCLUDED.maximum;
+
+        INSERT INTO demand_rollups (bucket_width, bucket_at, reading_count, total,
+                                    minimum, minimum_at, maximum, maximum_at)
+        SELECT width, date_bin(width, demand_at, TIMESTAMP '2000-01-01'),
+               COUNT(total_demand), SUM(total_demand),
+               MIN(total_demand), (ARRAY_AGG(demand_at ORDER BY total_demand ASC NULLS LAST))[1],
+               MAX(total_demand), (ARRAY_AGG(demand_at ORDER BY total_demand DESC NULLS LAST))[1]
+        FROM demands
+        WHERE demand_at >= bucket_from AND demand_at < bucket_to
+        GROUP BY 2
+        ON CONFLICT (bucket_width, bucket_at) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, minimum_at = EXCLUDED.minimum_at,
+            maximum = EXCLUDED.maximum, maximum_at = EXCLUDED.maximum_at;
+
+        INSERT INTO price_rollups (bucket_width, bucket_at, reading_count, total,
+                                   minimum, minimum_at, maximum, maximum_at)
+        SELECT width, date_bin(width, price_at, TIMESTAMP '2000-01-01'),
+               COUNT(price_per_mwh), SUM(price_per_mwh),
+               MIN(price_per_mwh), (ARRAY_AGG(price_at ORDER BY price_per_mwh ASC NULLS LAST))[1],
+               MAX(price_per_mwh), (ARRAY_AGG(price_at ORDER BY price_per_mwh DESC NULLS LAST))[1]
+        FROM prices
+        WHERE price_at >= bucket_from AND price_at < bucket_to
+        GROUP BY 2
+        ON CONFLICT (bucket_width, bucket_at) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, minimum_at = EXCLUDED.minimum_at,
+            maximum = EXCLUDED.maximum, maximum_at = EXCLUDED.maximum_at;
+
+        INSERT INTO carbon_intensity_rollups (bucket_width, bucket_at, region_id,
+                                              reading_count, total, minimum, maximum)
+        SELECT width, date_bin(width, measure_at, TIMESTAMP '2000-01-01'), region_id,
+               COUNT(forecast_measure), SUM(forecast_measure),
+               MIN(forecast_measure), MAX(forecast_measure)
+        FROM carbon_intensities
+        WHERE measure_at >= bucket_from AND measure_at < bucket_to
+        AND region_id IS NOT NULL
+        GROUP BY 2, 3
+        ON CONFLICT (bucket_width, bucket_at, region_id) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, maximum = EXCLUDED.maximum;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Build rollups for everything already loaded
+SELECT refresh_rollups(
+    LEAST((SELECT MIN(generation_at) FROM generations), (SELECT MIN(demand_at) FROM demands),
+          (SELECT MIN(price_at) FROM prices), (SELECT MIN(measure_at) FROM carbon_intensities)),
+    GREATEST((SELECT MAX(generation_at) FROM generations), (SELECT MAX(demand_at) FROM demands),
+             (SELECT MAX(price_at) FROM prices), (SELECT MAX(measure_at) FROM carbon_intensities)))
+WHERE EXISTS (SELECT 1 FROM generations) OR EXISTS (SELECT 1 FROM demands)
+OR EXISTS (SELECT 1 FROM prices) OR EXISTS (SELECT 1 FROM carbon_intensities);
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- Adds a ledger of newsletter deliveries so an interrupted monthly send can resume
+-- without double-sending, and several workers can share the send.
+
+BEGIN;
+
+CREATE TABLE newsletter_deliveries(
+    delivery_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    report_month DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    message_id VARCHAR(100),
+    error TEXT,
+    claimed_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    PRIMARY KEY (delivery_id),
+    CONSTRAINT uq_report_month_user UNIQUE (report_month, user_id),
+    CONSTRAINT fk_user_id_deliveries FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE INDEX ix_newsletter_deliveries_month_status ON newsletter_deliveries (report_month, status);
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- Adds last_alert_sent to the alert_users view, which send_alerts reads for every subscriber.
+-- New view columns have to go on the end for CREATE OR REPLACE VIEW.
+
+BEGIN;
+
+CREATE OR REPLACE VIEW alert_users
+AS SELECT
+    first_name,
+    phone_number,
+    email,
+    alert_id,
+    a.user_id,
+    region_id,
+    postcode,
+    last_alert_sent
+FROM users u
+JOIN alerts a ON a.user_id = u.user_id;
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- Remembers the region of full postcodes that the bundled district index can't resolve,
+-- so each one is only looked up on postcodes.io once.
+
+BEGIN;
+
+CREATE TABLE postcode_regions(
+    postcode VARCHAR(8) NOT NULL,
+    region_name VARCHAR(100) NOT NULL,
+    resolved_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (postcode)
+);
+
+COMMIT;
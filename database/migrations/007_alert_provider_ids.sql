@@ -0,0 +1,35 @@
+-- Stores the provider on each alert, resolved when the user subscribes, so alert runs
+-- never have to geocode postcodes. Rows that only have a postcode are resolved by
+-- alerts/backfill_alert_regions.py. Postcodes get room for the space, e.g. 'SW1A 1AA'.
+
+BEGIN;
+
+DROP VIEW alert_users;
+
+ALTER TABLE alerts ALTER COLUMN postcode TYPE VARCHAR(8);
+ALTER TABLE alerts ADD COLUMN provider_id SMALLINT;
+ALTER TABLE alerts ADD CONSTRAINT fk_provider_id_alerts
+    FOREIGN KEY (provider_id) REFERENCES providers (provider_id);
+
+UPDATE alerts AS a
+SET provider_id = r.provider_id
+FROM regions AS r
+WHERE r.region_id = a.region_id;
+
+CREATE INDEX ix_alerts_unresolved ON alerts (alert_id) WHERE provider_id IS NULL;
+
+CREATE VIEW alert_users
+AS SELECT
+    first_name,
+    phone_number,
+    email,
+    alert_id,
+    a.user_id,
+    region_id,
+    postcode,
+    last_alert_sent,
+    provider_id
+FROM users u
+JOIN alerts a ON a.user_id = u.user_id;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Adds the postcodes, sectors and districts each outage affects, so alerts can be sent
+-- to the subscribers near a fault instead of everyone with the same provider.
+-- Postcodes are stored upper case with a single space, e.g. 'E1 7DB', 'E1 7' or 'E1'.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS outage_postcodes(
+    outage_id BIGINT NOT NULL,
+    postcode VARCHAR(8) NOT NULL,
+    PRIMARY KEY (outage_id, postcode),
+    CONSTRAINT fk_outage_id_postcodes FOREIGN KEY (outage_id) REFERENCES outages (outage_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_outage_postcodes_postcode ON outage_postcodes (postcode);
+
+COMMIT;
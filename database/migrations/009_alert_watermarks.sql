@@ -0,0 +1,20 @@
+-- Lets send_alerts pick up outages added since its last successful run instead of a
+-- fixed time window. created_at is compared with alerts.last_alert_sent so retried
+-- runs don't alert anyone twice about the same outage.
+
+BEGIN;
+
+ALTER TABLE outages ADD COLUMN created_at TIMESTAMP DEFAULT NOW();
+
+CREATE TABLE alert_watermarks(
+    name VARCHAR(30) NOT NULL,
+    last_outage_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (name)
+);
+
+-- Start from the outages already loaded, so the first run doesn't alert on old ones
+INSERT INTO alert_watermarks (name, last_outage_id)
+SELECT 'outage_alerts', COALESCE(MAX(outage_id), 0) FROM outages;
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Lets each alert subscriber choose to be alerted by email, SMS or both.
+-- Existing alerts keep getting emails.
+
+BEGIN;
+
+ALTER TABLE alerts ADD COLUMN alert_channel VARCHAR(5) NOT NULL DEFAULT 'email',
+    ADD CONSTRAINT ck_alert_channel CHECK (alert_channel IN ('email', 'sms', 'both'));
+
+CREATE OR REPLACE VIEW alert_users
+AS SELECT
+    first_name,
+    phone_number,
+    email,
+    alert_id,
+    a.user_id,
+    region_id,
+    postcode,
+    last_alert_sent,
+    provider_id,
+    alert_channel
+FROM users u
+JOIN alerts a ON a.user_id = u.user_id;
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- Lets the outage loader insert a batch at a time with ON CONFLICT (reference_id)
+-- instead of checking whether each outage exists first.
+-- Keeps the first copy of any outage loaded twice, moving its postcodes across.
+
+BEGIN;
+
+CREATE TEMP TABLE duplicate_outages ON COMMIT DROP AS
+SELECT outage_id, MIN(outage_id) OVER (PARTITION BY reference_id) AS kept_outage_id
+FROM outages
+WHERE reference_id IS NOT NULL;
+
+DELETE FROM duplicate_outages WHERE outage_id = kept_outage_id;
+
+INSERT INTO outage_postcodes (outage_id, postcode)
+SELECT d.kept_outage_id, op.postcode
+FROM outage_postcodes op
+JOIN duplicate_outages d ON d.outage_id = op.outage_id
+ON CONFLICT (outage_id, postcode) DO NOTHING;
+
+DELETE FROM outage_postcodes WHERE outage_id IN (SELECT outage_id FROM duplicate_outages);
+DELETE FROM outages WHERE outage_id IN (SELECT outage_id FROM duplicate_outages);
+
+ALTER TABLE outages ADD CONSTRAINT uq_outage_reference_id UNIQUE (reference_id);
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Lets the outage loader update outages whose estimated restoration time, planned flag
+-- or postcodes change after they were first loaded. content_hash is the hash of the
+-- cleaned record, so unchanged outages are skipped without comparing every field.
+
+BEGIN;
+
+ALTER TABLE outages ADD COLUMN content_hash CHAR(32),
+    ADD COLUMN updated_at TIMESTAMP DEFAULT NOW();
+
+COMMIT;
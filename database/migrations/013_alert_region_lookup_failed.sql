@@ -0,0 +1,9 @@
+-- Marks alerts whose postcode postcodes.io rejected, so backfill_alert_regions stops
+-- geocoding them on every alert run. Lookups that fail on a network or server error
+-- aren't marked and are retried on the next run.
+
+BEGIN;
+
+ALTER TABLE alerts ADD COLUMN region_lookup_failed BOOL NOT NULL DEFAULT FALSE;
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Records each outage sent to each alert per channel. send_alerts commits these as soon
+-- as its alerts are dispatched, before advancing the watermark, so a run retried after a
+-- crash skips deliveries already made, and failed ones are retried by later runs.
+
+BEGIN;
+
+CREATE TABLE alert_deliveries(
+    alert_id BIGINT NOT NULL,
+    outage_id BIGINT NOT NULL,
+    channel VARCHAR(5) NOT NULL,
+    status VARCHAR(6) NOT NULL,
+    attempts SMALLINT NOT NULL DEFAULT 1,
+    error TEXT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (alert_id, outage_id, channel),
+    CONSTRAINT fk_alert_id_deliveries FOREIGN KEY (alert_id) REFERENCES alerts (alert_id) ON DELETE CASCADE,
+    CONSTRAINT fk_outage_id_deliveries FOREIGN KEY (outage_id) REFERENCES outages (outage_id) ON DELETE CASCADE,
+    CONSTRAINT ck_delivery_channel CHECK (channel IN ('email', 'sms')),
+    CONSTRAINT ck_delivery_status CHECK (status IN ('sent', 'failed'))
+);
+
+CREATE INDEX ix_alert_deliveries_failed ON alert_deliveries (outage_id) WHERE status = 'failed';
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Records how far through the clean CSV the power outage load has got, with a hash of the
+-- bytes loaded, so the ETL task keeps its place without a persistent volume and starts
+-- the CSV again when it has been recreated.
+
+BEGIN;
+
+CREATE TABLE etl_load_state(
+    name VARCHAR(100) NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (name)
+);
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Keeps the ETag, Last-Modified and payload hash of each outage feed the extract last
+-- processed, so conditional requests keep working across ETL tasks without a persistent
+-- volume.
+
+BEGIN;
+
+CREATE TABLE outage_feed_state(
+    source VARCHAR(30) NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash CHAR(64) NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (source)
+);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- Moves the extract's index of the outage records it has already saved from a SQLite
+-- file on the ETL task's throwaway disk into the database, so each run only appends the
+-- records that are new or changed since the last one.
+
+BEGIN;
+
+CREATE TABLE outage_seen_records(
+    provider VARCHAR(30) NOT NULL,
+    record_id VARCHAR(100) NOT NULL,
+    content_hash CHAR(32) NOT NULL,
+    seen_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (provider, record_id)
+);
+
+CREATE INDEX ix_outage_seen_records_provider_seen_at ON outage_seen_records (provider, seen_at);
+
+COMMIT;
@@ -0,0 +1,30 @@
+"""Script to create the upcoming monthly partitions for the measurement tables by hand.
+Runs the energy-generation pipeline's own partition code, which lists the partitioned
+tables, so run it from a checkout of the whole repository"""
+import os
+import sys
+import logging
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "energy-generation"))
+# pylint: disable=wrong-import-position
+from load import get_connection, create_partitions
+
+
+def enable_logging() -> None:
+    """Enables logging at INFO level"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+
+if __name__ == "__main__":
+    enable_logging()
+    connection = get_connection()
+    try:
+        create_partitions(date.today(), connection)
+    finally:
+        connection.close()
+        logging.info("Main: DB connection closed.")
@@ -1,3 +1,15 @@
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS newsletter_deliveries;
+DROP TABLE IF EXISTS postcode_regions;
+DROP TABLE IF EXISTS alert_deliveries;
+DROP TABLE IF EXISTS alert_watermarks;
+DROP TABLE IF EXISTS etl_load_state;
+DROP TABLE IF EXISTS outage_feed_state;
+DROP TABLE IF EXISTS outage_seen_records;
+DROP TABLE IF EXISTS generation_rollups;
+DROP TABLE IF EXISTS demand_rollups;
+DROP TABLE IF EXISTS price_rollups;
+DROP TABLE IF EXISTS carbon_intensity_rollups;
 DROP TABLE IF EXISTS prices;
 DROP TABLE IF EXISTS alerts;
 DROP TABLE IF EXISTS subscriptions;
@@ -33,30 +45,42 @@ CREATE TABLE outages(
     provider_id SMALLINT,
     planned BOOL,
     reference_id VARCHAR(30),
+    created_at TIMESTAMP DEFAULT NOW(),
+    content_hash CHAR(32),
+    updated_at TIMESTAMP DEFAULT NOW(),
     PRIMARY KEY (outage_id),
+    CONSTRAINT uq_outage_reference_id UNIQUE (reference_id),
     CONSTRAINT fk_provider_id_outage FOREIGN KEY (provider_id) REFERENCES providers (provider_id)
 );
 
+CREATE TABLE outage_postcodes(
+    outage_id BIGINT NOT NULL,
+    postcode VARCHAR(8) NOT NULL,
+    PRIMARY KEY (outage_id, postcode),
+    CONSTRAINT fk_outage_id_postcodes FOREIGN KEY (outage_id) REFERENCES outages (outage_id)
+);
+
 
 CREATE TABLE prices(
     price_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
     price_per_mwh DECIMAL(5,2),
-    price_at TIMESTAMP,
+    price_at TIMESTAMP NOT NULL,
     updated_at TIMESTAMP DEFAULT NOW(),
-    PRIMARY KEY (price_id)
-);
+    PRIMARY KEY (price_id, price_at),
+    CONSTRAINT uq_price_at UNIQUE (price_at)
+) PARTITION BY RANGE (price_at);
 
 
 CREATE TABLE carbon_intensities(
     carbon_intensity_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
     index VARCHAR(10),
     forecast_measure SMALLINT,
-    measure_at TIMESTAMP,
+    measure_at TIMESTAMP NOT NULL,
     region_id SMALLINT,
-    PRIMARY KEY (carbon_intensity_id),
+    PRIMARY KEY (carbon_intensity_id, measure_at),
     CONSTRAINT fk_region_id_carbons FOREIGN KEY (region_id) REFERENCES regions (region_id) 
 
-);
+) PARTITION BY RANGE (measure_at);
 
 CREATE TABLE fuel_categories(
     fuel_category_id SMALLINT NOT NULL GENERATED ALWAYS AS IDENTITY,
@@ -77,11 +101,12 @@ CREATE TABLE generations(
     generation_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
     mw_generated SMALLINT,
     fuel_type_id SMALLINT,
-    generation_at TIMESTAMP,
+    generation_at TIMESTAMP NOT NULL,
     updated_at TIMESTAMP DEFAULT NOW(),
-    PRIMARY KEY (generation_id),
+    PRIMARY KEY (generation_id, generation_at),
+    CONSTRAINT uq_generation_at_fuel_type UNIQUE (generation_at, fuel_type_id),
     CONSTRAINT fk_fuel_type_id FOREIGN KEY (fuel_type_id) REFERENCES fuel_types (fuel_type_id)
-);
+) PARTITION BY RANGE (generation_at);
 
 CREATE TABLE users(
     user_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
@@ -106,21 +131,284 @@ CREATE TABLE alerts(
     user_id SMALLINT,
     last_alert_sent TIMESTAMP,
     region_id SMALLINT,
-    postcode VARCHAR(7),
+    postcode VARCHAR(8),
+    provider_id SMALLINT,
+    alert_channel VARCHAR(5) NOT NULL DEFAULT 'email',
+    region_lookup_failed BOOL NOT NULL DEFAULT FALSE,
     PRIMARY KEY (alert_id),
     CONSTRAINT fk_user_id FOREIGN KEY (user_id) REFERENCES users (user_id),
-    CONSTRAINT fk_region_id_alerts FOREIGN KEY (region_id) REFERENCES regions (region_id)
+    CONSTRAINT fk_region_id_alerts FOREIGN KEY (region_id) REFERENCES regions (region_id),
+    CONSTRAINT fk_provider_id_alerts FOREIGN KEY (provider_id) REFERENCES providers (provider_id),
+    CONSTRAINT ck_alert_channel CHECK (alert_channel IN ('email', 'sms', 'both'))
 
 );
 
 CREATE TABLE demands(
     demand_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
-    demand_at TIMESTAMP,
+    demand_at TIMESTAMP NOT NULL,
     total_demand BIGINT,
     updated_at TIMESTAMP DEFAULT NOW(),
-    PRIMARY KEY (demand_id)
+    PRIMARY KEY (demand_id, demand_at),
+    CONSTRAINT uq_demand_at UNIQUE (demand_at)
+) PARTITION BY RANGE (demand_at);
+
+-- Measurement tables are partitioned by month, anything outside the monthly
+-- partitions lands in the default partition until the energy-generation pipeline
+-- (or partition_maintenance.py) creates that month's partition
+CREATE TABLE prices_default PARTITION OF prices DEFAULT;
+CREATE TABLE demands_default PARTITION OF demands DEFAULT;
+CREATE TABLE generations_default PARTITION OF generations DEFAULT;
+CREATE TABLE carbon_intensities_default PARTITION OF carbon_intensities DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent_table TEXT, partition_column TEXT,
+                                                     from_month DATE, to_month DATE)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= to_month LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := format('%s_%s', parent_table, to_char(month_start, 'YYYY_MM'));
+
+        IF to_regclass(partition_name) IS NULL THEN
+            -- Rows for this month may already have landed in the default partition
+            EXECUTE format('CREATE TEMP TABLE pending_rows (LIKE %I)', parent_table);
+            EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *)
+                            INSERT INTO pending_rows SELECT * FROM moved',
+                           parent_table || '_default', partition_column, month_start,
+                           partition_column, month_end);
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, parent_table, month_start, month_end);
+            EXECUTE format('INSERT INTO %I OVERRIDING SYSTEM VALUE SELECT * FROM pending_rows',
+                           parent_table);
+            DROP TABLE pending_rows;
+            created := created + 1;
+        END IF;
+
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_monthly_partitions('prices', 'price_at', NOW()::DATE, (NOW() + INTERVAL '3 months')::DATE);
+SELECT create_monthly_partitions('demands', 'demand_at', NOW()::DATE, (NOW() + INTERVAL '3 months')::DATE);
+SELECT create_monthly_partitions('generations', 'generation_at', NOW()::DATE, (NOW() + INTERVAL '3 months')::DATE);
+SELECT create_monthly_partitions('carbon_intensities', 'measure_at', NOW()::DATE, (NOW() + INTERVAL '3 months')::DATE);
+
+CREATE INDEX ix_generations_generation_at ON generations USING BRIN (generation_at);
+CREATE INDEX ix_generations_fuel_type_generation_at ON generations (fuel_type_id, generation_at);
+CREATE INDEX ix_carbon_intensities_measure_at ON carbon_intensities USING BRIN (measure_at);
+CREATE INDEX ix_carbon_intensities_region_measure_at ON carbon_intensities (region_id, measure_at);
+
+CREATE INDEX ix_outages_outage_start ON outages (outage_start);
+CREATE INDEX ix_outages_provider_outage_start ON outages (provider_id, outage_start);
+CREATE INDEX ix_outage_postcodes_postcode ON outage_postcodes (postcode);
+
+CREATE INDEX ix_regions_provider_id ON regions (provider_id);
+CREATE INDEX ix_fuel_types_fuel_category_id ON fuel_types (fuel_category_id);
+CREATE INDEX ix_subscriptions_user_id ON subscriptions (user_id);
+CREATE INDEX ix_subscriptions_region_id ON subscriptions (region_id);
+CREATE INDEX ix_alerts_user_id ON alerts (user_id);
+CREATE INDEX ix_alerts_region_id ON alerts (region_id);
+CREATE INDEX ix_alerts_unresolved ON alerts (alert_id) WHERE provider_id IS NULL;
+
+CREATE TABLE generation_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    fuel_type_id SMALLINT NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum SMALLINT,
+    maximum SMALLINT,
+    PRIMARY KEY (bucket_width, bucket_at, fuel_type_id),
+    CONSTRAINT fk_fuel_type_id_rollups FOREIGN KEY (fuel_type_id) REFERENCES fuel_types (fuel_type_id)
+);
+
+CREATE TABLE demand_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum BIGINT,
+    minimum_at TIMESTAMP,
+    maximum BIGINT,
+    maximum_at TIMESTAMP,
+    PRIMARY KEY (bucket_width, bucket_at)
+);
+
+CREATE TABLE price_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum DECIMAL(5,2),
+    minimum_at TIMESTAMP,
+    maximum DECIMAL(5,2),
+    maximum_at TIMESTAMP,
+    PRIMARY KEY (bucket_width, bucket_at)
+);
+
+CREATE TABLE carbon_intensity_rollups(
+    bucket_width INTERVAL NOT NULL,
+    bucket_at TIMESTAMP NOT NULL,
+    region_id SMALLINT NOT NULL,
+    reading_count INT,
+    total NUMERIC,
+    minimum SMALLINT,
+    maximum SMALLINT,
+    PRIMARY KEY (bucket_width, bucket_at, region_id),
+    CONSTRAINT fk_region_id_rollups FOREIGN KEY (region_id) REFERENCES regions (region_id)
+);
+
+-- Recomputes every bucket overlapping [from_time, to_time] from the raw readings
+CREATE OR REPLACE FUNCTION refresh_rollups(from_time TIMESTAMP, to_time TIMESTAMP)
+RETURNS VOID AS $$
+DECLARE
+    width INTERVAL;
+    bucket_from TIMESTAMP;
+    bucket_to TIMESTAMP;
+BEGIN
+    FOREACH width IN ARRAY ARRAY[INTERVAL '30 minutes', INTERVAL '1 hour', INTERVAL '1 day'] LOOP
+        bucket_from := date_bin(width, from_time, TIMESTAMP '2000-01-01');
+        bucket_to := date_bin(width, to_time, TIMESTAMP '2000-01-01') + width;
+
+        INSERT INTO generation_rollups (bucket_width, bucket_at, fuel_type_id,
+                                        reading_count, total, minimum, maximum)
+        SELECT width, date_bin(width, generation_at, TIMESTAMP '2000-01-01'), fuel_type_id,
+               COUNT(mw_generated), SUM(mw_generated), MIN(mw_generated), MAX(mw_generated)
+        FROM generations
+        WHERE generation_at >= bucket_from AND generation_at < bucket_to
+        AND fuel_type_id IS NOT NULL
+        GROUP BY 2, 3
+        ON CONFLICT (bucket_width, bucket_at, fuel_type_id) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, maximum = EXCLUDED.maximum;
+
+        INSERT INTO demand_rollups (bucket_width, bucket_at, reading_count, total,
+                                    minimum, minimum_at, maximum, maximum_at)
+        SELECT width, date_bin(width, demand_at, TIMESTAMP '2000-01-01'),
+               COUNT(total_demand), SUM(total_demand),
+               MIN(total_demand), (ARRAY_AGG(demand_at ORDER BY total_demand ASC NULLS LAST))[1],
+               MAX(total_demand), (ARRAY_AGG(demand_at ORDER BY total_demand DESC NULLS LAST))[1]
+        FROM demands
+        WHERE demand_at >= bucket_from AND demand_at < bucket_to
+        GROUP BY 2
+        ON CONFLICT (bucket_width, bucket_at) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, minimum_at = EXCLUDED.minimum_at,
+            maximum = EXCLUDED.maximum, maximum_at = EXCLUDED.maximum_at;
+
+        INSERT INTO price_rollups (bucket_width, bucket_at, reading_count, total,
+                                   minimum, minimum_at, maximum, maximum_at)
+        SELECT width, date_bin(width, price_at, TIMESTAMP '2000-01-01'),
+               COUNT(price_per_mwh), SUM(price_per_mwh),
+               MIN(price_per_mwh), (ARRAY_AGG(price_at ORDER BY price_per_mwh ASC NULLS LAST))[1],
+               MAX(price_per_mwh), (ARRAY_AGG(price_at ORDER BY price_per_mwh DESC NULLS LAST))[1]
+        FROM prices
+        WHERE price_at >= bucket_from AND price_at < bucket_to
+        GROUP BY 2
+        ON CONFLICT (bucket_width, bucket_at) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, minimum_at = EXCLUDED.minimum_at,
+            maximum = EXCLUDED.maximum, maximum_at = EXCLUDED.maximum_at;
+
+        INSERT INTO carbon_intensity_rollups (bucket_width, bucket_at, region_id,
+                                              reading_count, total, minimum, maximum)
+        SELECT width, date_bin(width, measure_at, TIMESTAMP '2000-01-01'), region_id,
+               COUNT(forecast_measure), SUM(forecast_measure),
+               MIN(forecast_measure), MAX(forecast_measure)
+        FROM carbon_intensities
+        WHERE measure_at >= bucket_from AND measure_at < bucket_to
+        AND region_id IS NOT NULL
+        GROUP BY 2, 3
+        ON CONFLICT (bucket_width, bucket_at, region_id) DO UPDATE
+        SET reading_count = EXCLUDED.reading_count, total = EXCLUDED.total,
+            minimum = EXCLUDED.minimum, maximum = EXCLUDED.maximum;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE newsletter_deliveries(
+    delivery_id BIGINT NOT NULL GENERATED ALWAYS AS IDENTITY,
+    report_month DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    message_id VARCHAR(100),
+    error TEXT,
+    claimed_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    PRIMARY KEY (delivery_id),
+    CONSTRAINT uq_report_month_user UNIQUE (report_month, user_id),
+    CONSTRAINT fk_user_id_deliveries FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE INDEX ix_newsletter_deliveries_month_status ON newsletter_deliveries (report_month, status);
+
+CREATE TABLE postcode_regions(
+    postcode VARCHAR(8) NOT NULL,
+    region_name VARCHAR(100) NOT NULL,
+    resolved_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (postcode)
+);
+
+CREATE TABLE alert_watermarks(
+    name VARCHAR(30) NOT NULL,
+    last_outage_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (name)
+);
+
+INSERT INTO alert_watermarks (name) VALUES ('outage_alerts');
+
+CREATE TABLE alert_deliveries(
+    alert_id BIGINT NOT NULL,
+    outage_id BIGINT NOT NULL,
+    channel VARCHAR(5) NOT NULL,
+    status VARCHAR(6) NOT NULL,
+    attempts SMALLINT NOT NULL DEFAULT 1,
+    error TEXT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (alert_id, outage_id, channel),
+    CONSTRAINT fk_alert_id_deliveries FOREIGN KEY (alert_id) REFERENCES alerts (alert_id) ON DELETE CASCADE,
+    CONSTRAINT fk_outage_id_deliveries FOREIGN KEY (outage_id) REFERENCES outages (outage_id) ON DELETE CASCADE,
+    CONSTRAINT ck_delivery_channel CHECK (channel IN ('email', 'sms')),
+    CONSTRAINT ck_delivery_status CHECK (status IN ('sent', 'failed'))
 );
 
+CREATE INDEX ix_alert_deliveries_failed ON alert_deliveries (outage_id) WHERE status = 'failed';
+
+CREATE TABLE etl_load_state(
+    name VARCHAR(100) NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (name)
+);
+
+CREATE TABLE outage_feed_state(
+    source VARCHAR(30) NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash CHAR(64) NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (source)
+);
+
+CREATE TABLE outage_seen_records(
+    provider VARCHAR(30) NOT NULL,
+    record_id VARCHAR(100) NOT NULL,
+    content_hash CHAR(32) NOT NULL,
+    seen_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (provider, record_id)
+);
+
+CREATE INDEX ix_outage_seen_records_provider_seen_at ON outage_seen_records (provider, seen_at);
+
 ALTER SEQUENCE providers_provider_id_seq RESTART WITH 1;
 ALTER SEQUENCE regions_region_id_seq RESTART WITH 1;
 ALTER SEQUENCE outages_outage_id_seq RESTART WITH 1;
@@ -132,4 +420,30 @@ ALTER SEQUENCE users_user_id_seq RESTART WITH 1;
 ALTER SEQUENCE subscriptions_subscription_id_seq RESTART WITH 1;
 ALTER SEQUENCE alerts_alert_id_seq RESTART WITH 1;
 ALTER SEQUENCE demands_demand_id_seq RESTART WITH 1;
-ALTER SEQUENCE fuel_categories_fuel_category_id_seq RESTART WITH 1;
\ No newline at end of file
+ALTER SEQUENCE fuel_categories_fuel_category_id_seq RESTART WITH 1;
+
+-- Fresh databases already match every migration, so record them as applied
+CREATE TABLE schema_migrations(
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (name)
+);
+
+INSERT INTO schema_migrations (name) VALUES
+('001_unique_measurement_keys.sql'),
+('002_time_series_indexes_and_partitions.sql'),
+('003_rollup_tables.sql'),
+('004_newsletter_deliveries.sql'),
+('005_alert_users_last_alert_sent.sql'),
+('006_postcode_regions.sql'),
+('007_alert_provider_ids.sql'),
+('008_outage_postcodes.sql'),
+('009_alert_watermarks.sql'),
+('010_alert_channels.sql'),
+('011_unique_outage_reference_ids.sql'),
+('012_outage_updates.sql'),
+('013_alert_region_lookup_failed.sql'),
+('014_alert_deliveries.sql'),
+('015_etl_load_state.sql'),
+('016_outage_feed_state.sql'),
+('017_outage_seen_records.sql');
@@ -12,6 +12,9 @@ AS SELECT
     alert_id,
     a.user_id,
     region_id,
-    postcode
+    postcode,
+    last_alert_sent,
+    provider_id,
+    alert_channel
 FROM users u
 JOIN alerts a ON a.user_id = u.user_id;
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Backfill historical generation, demand, pricing and solar data for a date range"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from requests import RequestException
+from psycopg2 import Error as psycopg2Error
+from psycopg2.extensions import connection
+from extract import (get_generation_data_between, get_demand_data_between,
+                     get_pricing_data_between, get_solar_estimate_data_between)
+from transform import (transform_energy_generation, transform_energy_demand,
+                       transform_market_price, transform_solar_generation)
+from load import (get_connection, load_energy_generation_data, load_energy_demand_data,
+                  load_market_price_data, load_energy_solar_data, refresh_rollups)
+from pipeline import enable_logger
+from rate_limiter import RateLimiter
+
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 4
+
+logger = logging.getLogger(__name__)
+
+
+def time_slices(start: datetime, end: datetime,
+                chunk_size: timedelta) -> list[tuple[datetime, datetime]]:
+    """Split a date range into consecutive chunks no longer than chunk_size"""
+    slices = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk_size, end)
+        slices.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return slices
+
+
+def load_generation_chunk(data: dict, db_conn: connection) -> int:
+    """Transform and load every generation period in a chunk"""
+    generation_df = transform_energy_generation(
+        pd.DataFrame(data['data']), keep_latest=False)
+    load_energy_generation_data(generation_df.to_dict('records'), db_conn)
+    return len(generation_df)
+
+
+def load_demand_chunk(data: dict, db_conn: connection) -> int:
+    """Transform and load every demand period in a chunk"""
+    demand_df = transform_energy_demand(
+        pd.DataFrame(data['data']), keep_latest=False)
+    load_energy_demand_data(demand_df.to_dict('records'), db_conn)
+    return len(demand_df)
+
+
+def load_pricing_chunk(data: dict, db_conn: connection) -> int:
+    """Transform and load every market price period in a chunk"""
+    pricing_df = transform_market_price(
+        pd.DataFrame(data['data']), keep_latest=False)
+    load_market_price_data(pricing_df.to_dict('records'), db_conn)
+    return len(pricing_df)
+
+
+def load_solar_estimate_chunk(data: dict, db_conn: connection) -> int:
+    """Transform and load every solar estimate in a chunk"""
+    solar_df = transform_solar_generation(
+        pd.DataFrame(data['data'], columns=data['meta']))
+    load_energy_solar_data(solar_df.to_dict('records'), db_conn)
+    return len(solar_df)
+
+
+# Source name -> (range extractor, chunk loader, chunk size)
+BACKFILL_SOURCES = {
+    'generation': (get_generation_data_between, load_generation_chunk, timedelta(days=1)),
+    'demand': (get_demand_data_between, load_demand_chunk, timedelta(days=7)),
+    'pricing': (get_pricing_data_between, load_pricing_chunk, timedelta(days=7)),
+    'solar_estimate': (get_solar_estimate_data_between, load_solar_estimate_chunk,
+                       timedelta(days=7))
+}
+
+
+def fetch_chunk(extractor: callable, rate_limiter: RateLimiter,
+                start: datetime, end: datetime) -> dict:
+    """Fetch a single chunk once the rate limiter allows it"""
+    rate_limiter.wait()
+    return extractor(start, end)
+
+
+def backfill_source(name: str, date_range: tuple[datetime, datetime], db_conn: connection,
+                    executor: ThreadPoolExecutor, rate_limiter: RateLimiter) -> dict:
+    """Fetch one source's chunks concurrently, loading each as soon as it arrives.
+    Rows are only counted once their chunk has loaded, and a chunk whose fetch or load
+    fails is listed in the summary's failures"""
+    extractor, chunk_loader, chunk_size = BACKFILL_SOURCES[name]
+    futures = {executor.submit(fetch_chunk, extractor, rate_limiter, *chunk): chunk
+               for chunk in time_slices(*date_range, chunk_size)}
+
+    summary = {'chunks': len(futures), 'rows': 0, 'failed': []}
+    for future in as_completed(futures):
+        chunk = futures[future]
+        try:
+            data = future.result()
+            if not data or not data.get('data'):
+                logger.warning('No %s data between %s and %s', name, *chunk)
+                continue
+            summary['rows'] += chunk_loader(data, db_conn)
+        except (RequestException, ValueError, TypeError, KeyError,
+                psycopg2Error) as backfill_error:
+            logger.error('Failed %s chunk %s - %s: %s',
+                         name, *chunk, backfill_error)
+            summary['failed'].append(chunk)
+
+    logger.info('Backfilled %s %s rows from %s chunks',
+                summary['rows'], name, summary['chunks'])
+    return summary
+
+
+def run_backfill(start: datetime, end: datetime, sources: list[str] = None) -> dict:
+    """Backfill the given sources (default all) between two times"""
+    sources = sources or list(BACKFILL_SOURCES)
+    rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+    db_conn = get_connection()
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            summaries = {name: backfill_source(name, (start, end), db_conn, executor,
+                                               rate_limiter)
+                         for name in sources}
+        refresh_rollups(start, end, db_conn)
+        return summaries
+    finally:
+        db_conn.close()
+
+
+def parse_date(date: str) -> datetime:
+    """Parse an ISO date from the command line as UTC"""
+    parsed = datetime.fromisoformat(date)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('start', type=parse_date,
+                        help='Start of the range, e.g. 2025-01-01')
+    parser.add_argument('end', type=parse_date,
+                        help='End of the range, e.g. 2025-02-01')
+    parser.add_argument('--sources', nargs='+', choices=list(BACKFILL_SOURCES),
+                        help='Sources to backfill, defaults to all')
+    args = parser.parse_args()
+
+    enable_logger()
+    logger.info('Backfill finished: %s', run_backfill(
+        args.start, args.end, args.sources))
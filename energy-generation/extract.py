@@ -1,29 +1,29 @@
 """Extract energy generation data from online source"""
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
 import csv
 import os
 import logging
-import requests
-
-TODAY = datetime.now()
-YESTERDAY = TODAY - timedelta(hours=24)
+from http_client import http_get
 
 BASE_URL = "https://data.elexon.co.uk/bmrs/api/v1"
 FUEL_GEN_URL = f"{BASE_URL}/datasets/FUELINST"
 SYS_DEMAND_URL = f"{BASE_URL}/demand/outturn/summary?resolution=minute&format=json"
+DEMAND_HISTORY_URL = f"{BASE_URL}/datasets/INDO"
 INTERCONNECT_URL = f"{BASE_URL}/generation/outturn/interconnectors"
-MARKET_PRICE_URL = f"{BASE_URL}/balancing/pricing/market-index"\
-    f"?from={YESTERDAY.isoformat()}&to={TODAY.isoformat()}&dataProviders=APXMIDP"
+MARKET_INDEX_URL = f"{BASE_URL}/balancing/pricing/market-index"
 SOLAR_DETAILS = "https://api.solar.sheffield.ac.uk/pvlive/api/v4/gsp/0"
+ELEXON_TIMEOUT = (3.05, 10)
+SOLAR_TIMEOUT = (3.05, 15)
+ELEXON_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
 logger = logging.getLogger(__name__)
 
 
-def perform_http_get(url: str) -> list[dict]:
+def perform_http_get(url: str, timeout: float | tuple = ELEXON_TIMEOUT) -> list[dict]:
     """Perform HTTP get request and retrieve JSON"""
     logger.info('Performing HTTP request to %s', url)
-    data = requests.get(
-        url, timeout=10)
+    data = http_get(url, timeout=timeout)
     if data.status_code != 200:
         logger.error('No data recieved!')
         return None
@@ -33,7 +33,7 @@ def perform_http_get(url: str) -> list[dict]:
 def get_solar_estimate_data() -> list[dict]:
     """Retrieve market index data from Elexon Insights"""
     logger.info("Getting solar_estimate data...")
-    return perform_http_get(SOLAR_DETAILS)
+    return perform_http_get(SOLAR_DETAILS, timeout=SOLAR_TIMEOUT)
 
 
 def get_generation_data() -> list[dict]:
@@ -51,7 +51,41 @@ def get_demand_data() -> list[dict]:
 def get_pricing_data() -> list[dict]:
     """Retrieve market index data from Elexon Insights"""
     logger.info("Getting Pricing data...")
-    return perform_http_get(MARKET_PRICE_URL)
+    # Window is worked out per call so warm Lambdas don't reuse a stale date
+    today = datetime.now(timezone.utc)
+    return get_pricing_data_between(today - timedelta(hours=24), today)
+
+
+def format_elexon_date(date: datetime) -> str:
+    """Format a datetime the way the Elexon API expects"""
+    return date.astimezone(timezone.utc).strftime(ELEXON_DATE_FORMAT)
+
+
+def get_generation_data_between(start: datetime, end: datetime) -> dict:
+    """Retrieve generation data published between two times from Elexon Insights"""
+    params = {'publishDateTimeFrom': format_elexon_date(start),
+              'publishDateTimeTo': format_elexon_date(end)}
+    return perform_http_get(f"{FUEL_GEN_URL}?{urlencode(params)}")
+
+
+def get_demand_data_between(start: datetime, end: datetime) -> dict:
+    """Retrieve initial demand outturn published between two times from Elexon Insights"""
+    params = {'publishDateTimeFrom': format_elexon_date(start),
+              'publishDateTimeTo': format_elexon_date(end)}
+    return perform_http_get(f"{DEMAND_HISTORY_URL}?{urlencode(params)}")
+
+
+def get_pricing_data_between(start: datetime, end: datetime) -> dict:
+    """Retrieve market index data between two times from Elexon Insights"""
+    params = {'from': format_elexon_date(start), 'to': format_elexon_date(end),
+              'dataProviders': 'APXMIDP'}
+    return perform_http_get(f"{MARKET_INDEX_URL}?{urlencode(params)}")
+
+
+def get_solar_estimate_data_between(start: datetime, end: datetime) -> dict:
+    """Retrieve solar estimates between two times from PV_Live"""
+    params = {'start': format_elexon_date(start), 'end': format_elexon_date(end)}
+    return perform_http_get(f"{SOLAR_DETAILS}?{urlencode(params)}", timeout=SOLAR_TIMEOUT)
 
 
 def get_interconnect_data() -> list[dict]:
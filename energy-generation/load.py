@@ -2,6 +2,7 @@
 import os
 import logging
 import csv
+from datetime import date, datetime
 import psycopg2
 import psycopg2.extras
 from psycopg2.extensions import connection, cursor
@@ -13,6 +14,19 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 DB_PORT = os.getenv('DB_PORT')
+PAGE_SIZE = 1000
+# Cached per process so warm invocations skip the fuel_types lookup
+FUEL_TYPE_IDS = {}
+PARTITION_MONTHS_AHEAD = 3
+# Partitioned table -> column it is partitioned on
+PARTITIONED_TABLES = {
+    'prices': 'price_at',
+    'demands': 'demand_at',
+    'generations': 'generation_at',
+    'carbon_intensities': 'measure_at'
+}
+# Months this process has already created partitions for
+PARTITIONED_MONTHS = set()
 logger = logging.getLogger(__name__)
 
 
@@ -31,99 +45,186 @@ def get_cursor(db_conn: connection) -> cursor:
     return db_cursor
 
 
-def load_energy_generation_data(data: list[dict]) -> None:
-    """Load energy generation data into the database"""
+def get_fuel_type_ids(db_cursor: cursor, refresh: bool = False) -> dict:
+    """Return the fuel_type -> fuel_type_id map, only querying the database when needed"""
+    if refresh or not FUEL_TYPE_IDS:
+        db_cursor.execute("SELECT fuel_type, fuel_type_id FROM fuel_types")
+        FUEL_TYPE_IDS.clear()
+        FUEL_TYPE_IDS.update({row[0]: row[1] for row in db_cursor.fetchall()})
+    return FUEL_TYPE_IDS
 
-    logger.info("Loading energy data into database")
-    db_conn = get_connection()
-    db_cursor = get_cursor(db_conn)
 
-    rows = [(row.get('generation'), row.get('fuelType'),
-             row.get('publishTime')) for row in data]
+def resolve_fuel_type_ids(db_cursor: cursor, rows: list[tuple]) -> list[tuple]:
+    """Replace the fuel type in each (generation, fuel_type, time) row with its id"""
+    fuel_type_ids = get_fuel_type_ids(db_cursor)
+    if any(fuel_type not in fuel_type_ids for _, fuel_type, _ in rows):
+        fuel_type_ids = get_fuel_type_ids(db_cursor, refresh=True)
+
+    resolved_rows = []
+    for generation, fuel_type, generation_at in rows:
+        if fuel_type not in fuel_type_ids:
+            logger.warning('Unknown fuel type %s, skipping row', fuel_type)
+            continue
+        resolved_rows.append(
+            (generation, fuel_type_ids[fuel_type], generation_at))
+    return resolved_rows
+
+
+def deduplicate(rows: list[tuple], key: callable) -> list[tuple]:
+    """Keep the last row for each conflict key so a batch never upserts a row twice"""
+    return list({key(row): row for row in rows}.values())
+
+
+def insert_generations(rows: list[tuple], db_conn: connection) -> None:
+    """Bulk insert (generation, fuel_type, time) rows into generations"""
+    db_cursor = get_cursor(db_conn)
     statement = """
     INSERT INTO generations (mw_generated, fuel_type_id, generation_at)
-    VALUES (%s, (SELECT fuel_type_id FROM fuel_types WHERE fuel_type = %s), %s)"""
+    VALUES %s
+    ON CONFLICT (generation_at, fuel_type_id)
+    DO UPDATE SET mw_generated = EXCLUDED.mw_generated, updated_at = NOW()"""
     try:
-        db_cursor.executemany(statement, (rows))
+        resolved_rows = deduplicate(resolve_fuel_type_ids(db_cursor, rows),
+                                    key=lambda row: (row[2], row[1]))
+        psycopg2.extras.execute_values(
+            db_cursor, statement, resolved_rows, page_size=PAGE_SIZE)
         db_conn.commit()
     except (psycopg2.Error) as db_error:
+        db_conn.rollback()
         logger.error('Error Loading generation data')
         logger.error('Load failed - %s', db_error)
-        logger.error('Value %s', data)
+        logger.error('Value %s', rows)
+        raise
     finally:
         db_cursor.close()
-        db_conn.close()
 
 
-def load_market_price_data(data: list[dict]) -> None:
+def load_energy_generation_data(data: list[dict], db_conn: connection) -> None:
+    """Load energy generation data into the database"""
+
+    logger.info("Loading energy data into database")
+    rows = [(row.get('generation'), row.get('fuelType'),
+             row.get('publishTime')) for row in data]
+    insert_generations(rows, db_conn)
+
+
+def load_market_price_data(data: list[dict], db_conn: connection) -> None:
     """Load market data into database"""
 
     logger.info("Loading market data into database")
-    db_conn = get_connection()
     db_cursor = get_cursor(db_conn)
 
-    row = (data[0].get('startTime'), data[0].get(
-        'price'))
+    rows = deduplicate([(row.get('startTime'), row.get('price')) for row in data],
+                       key=lambda row: row[0])
     statement = """
     INSERT INTO prices (price_at, price_per_mwh)
-    VALUES (%s, %s)"""
+    VALUES %s
+    ON CONFLICT (price_at)
+    DO UPDATE SET price_per_mwh = EXCLUDED.price_per_mwh, updated_at = NOW()"""
     try:
-        db_cursor.execute(statement, row)
+        psycopg2.extras.execute_values(
+            db_cursor, statement, rows, page_size=PAGE_SIZE)
         db_conn.commit()
     except (psycopg2.Error) as db_error:
+        db_conn.rollback()
         logger.error('Error Loading price data')
         logger.error('Load failed - %s', db_error)
         logger.error('Value %s', data)
+        raise
     finally:
         db_cursor.close()
-        db_conn.close()
 
 
-def load_energy_demand_data(data: list[dict]) -> None:
+def load_energy_demand_data(data: list[dict], db_conn: connection) -> None:
     """Load demand data into database"""
     logger.info("Loading demand data into database")
-    db_conn = get_connection()
     db_cursor = get_cursor(db_conn)
 
-    row = (data[0].get('startTime'), data[0].get(
-        'demand'))
+    rows = deduplicate([(row.get('startTime'), row.get('demand')) for row in data],
+                       key=lambda row: row[0])
     statement = """
     INSERT INTO demands (demand_at, total_demand)
-    VALUES (%s, %s)"""
+    VALUES %s
+    ON CONFLICT (demand_at)
+    DO UPDATE SET total_demand = EXCLUDED.total_demand, updated_at = NOW()"""
     try:
-        db_cursor.execute(statement, row)
+        psycopg2.extras.execute_values(
+            db_cursor, statement, rows, page_size=PAGE_SIZE)
         db_conn.commit()
     except (psycopg2.Error) as db_error:
+        db_conn.rollback()
         logger.error('Error Loading demand data')
         logger.error('Load failed - %s', db_error)
         logger.error('Value %s', data)
+        raise
     finally:
         db_cursor.close()
-        db_conn.close()
 
 
-def load_energy_solar_data(data: list[dict]) -> None:
+def load_energy_solar_data(data: list[dict], db_conn: connection) -> None:
     """Load embedded solar generation data into the database"""
 
     logger.info("Loading embedded solar generation data into database")
-    db_conn = get_connection()
+    rows = [(row.get('generation_mw'), row.get('fuelType'),
+             row.get('publishTime')) for row in data]
+    insert_generations(rows, db_conn)
+
+
+def refresh_rollups(start: datetime, end: datetime, db_conn: connection) -> None:
+    """Recompute the generation, demand, price and carbon rollups between two times"""
+    logger.info("Refreshing rollups from %s to %s", start, end)
     db_cursor = get_cursor(db_conn)
+    try:
+        db_cursor.execute("SELECT refresh_rollups(%s, %s)", (start, end))
+        db_conn.commit()
+    except (psycopg2.Error) as db_error:
+        db_conn.rollback()
+        logger.error('Error refreshing rollups - %s', db_error)
+    finally:
+        db_cursor.close()
 
-    row = [(row.get('generation_mw'), row.get('fuelType'),
-            row.get('publishTime')) for row in data]
-    statement = """
-    INSERT INTO generations (mw_generated, fuel_type_id, generation_at)
-    VALUES (%s, (SELECT fuel_type_id FROM fuel_types WHERE fuel_type = %s), %s)"""
+
+def add_months(month: date, months: int) -> date:
+    """Return the first day of the month a number of months after the given one"""
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def create_partitions(today: date, db_conn: connection,
+                      months_ahead: int = PARTITION_MONTHS_AHEAD) -> dict:
+    """Create any missing monthly partitions from this month to months_ahead for every
+    measurement table, returning how many were created per table, or {} on error"""
+    from_month = today.replace(day=1)
+    to_month = add_months(from_month, months_ahead)
+    created = {}
+    db_cursor = get_cursor(db_conn)
     try:
-        db_cursor.executemany(statement, (row))
+        for table, column in PARTITIONED_TABLES.items():
+            db_cursor.execute("SELECT create_monthly_partitions(%s, %s, %s, %s)",
+                              (table, column, from_month, to_month))
+            created[table] = db_cursor.fetchone()[0]
+            logger.info('Created %s new partitions for %s', created[table], table)
         db_conn.commit()
     except (psycopg2.Error) as db_error:
-        logger.error('Error Loading generation data')
-        logger.error('Load failed - %s', db_error)
-        logger.error('Value %s', data)
+        db_conn.rollback()
+        logger.error('Error creating partitions - %s', db_error)
+        created = {}
     finally:
         db_cursor.close()
-        db_conn.close()
+
+    return created
+
+
+def ensure_monthly_partitions(today: date, db_conn: connection) -> None:
+    """Create any missing monthly partitions from this month to PARTITION_MONTHS_AHEAD
+    for every measurement table, so new readings never land in the default partition.
+    Only checked once a month per process"""
+    from_month = today.replace(day=1)
+    if from_month in PARTITIONED_MONTHS:
+        return
+
+    if create_partitions(today, db_conn):
+        PARTITIONED_MONTHS.add(from_month)
 
 
 def load_csv(filename: str) -> list:
@@ -137,22 +238,20 @@ def load_csv(filename: str) -> list:
 
 if __name__ == '__main__':
     db_connection = get_connection()
-    db_cur = get_cursor(db_connection)
 
     energy_generation_data = load_csv('data/energy_generation_cleaned.csv')
-    load_energy_generation_data(energy_generation_data)
+    load_energy_generation_data(energy_generation_data, db_connection)
 
     market_price_data = load_csv('data/market_price_cleaned.csv')
     print(market_price_data)
-    load_market_price_data(market_price_data)
+    load_market_price_data(market_price_data, db_connection)
 
     demand_data = load_csv('data/energy_demand_cleaned.csv')
     print(demand_data)
-    load_energy_demand_data(demand_data)
+    load_energy_demand_data(demand_data, db_connection)
 
     solar_data = load_csv('data/solar_estimate_cleaned.csv')
     print(solar_data)
-    load_energy_solar_data(solar_data)
+    load_energy_solar_data(solar_data, db_connection)
 
-    db_cur.close()
     db_connection.close()
@@ -1,13 +1,29 @@
 """Pipeline file to perform ETL for pricing, generation and demand data"""
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from requests import RequestException
 from extract import get_pricing_data, get_generation_data, get_demand_data, get_solar_estimate_data
 from transform import transform_market_price, transform_energy_generation, transform_energy_demand, transform_solar_generation
-from load import load_market_price_data, load_energy_generation_data, load_energy_demand_data, load_energy_solar_data
+from load import (get_connection, load_market_price_data, load_energy_generation_data,
+                  load_energy_demand_data, load_energy_solar_data, refresh_rollups,
+                  ensure_monthly_partitions)
 import pandas as pd
 from psycopg2 import Error as psycopg2Error
+from psycopg2.extensions import connection
 
 logger = logging.getLogger(__name__)
 
+# Every source's latest readings fall within this window, so only these rollups change
+ROLLUP_REFRESH_WINDOW = timedelta(days=2)
+
+EXTRACTORS = {
+    'pricing': get_pricing_data,
+    'demand': get_demand_data,
+    'generation': get_generation_data,
+    'solar_estimate': get_solar_estimate_data
+}
+
 
 def enable_logger() -> None:
     """Enable basic logger"""
@@ -19,49 +35,107 @@ def enable_logger() -> None:
     )
 
 
+def extract_all_data(extractors: dict = None) -> dict:
+    """Run every extractor concurrently, returning None for any source that failed"""
+    extractors = extractors or EXTRACTORS
+    with ThreadPoolExecutor(max_workers=len(extractors)) as executor:
+        futures = {name: executor.submit(extractor)
+                   for name, extractor in extractors.items()}
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except RequestException as request_error:
+            logger.error('Failed to extract %s data - %s',
+                         name, request_error)
+            results[name] = None
+    return results
+
+
+def process_pricing_data(pricing_data: dict, db_conn: connection) -> None:
+    """Transform and load pricing data"""
+    pricing_data_df = pd.DataFrame(pricing_data.get('data'))
+    cleaned_pricing_data = transform_market_price(pricing_data_df)
+    load_market_price_data(cleaned_pricing_data.to_dict('records'), db_conn)
+
+
+def process_demand_data(demand_data: list[dict], db_conn: connection) -> None:
+    """Transform and load demand data"""
+    demand_data_df = pd.DataFrame(demand_data)
+    cleaned_demand_data_df = transform_energy_demand(demand_data_df)
+    load_energy_demand_data(
+        cleaned_demand_data_df.to_dict('records'), db_conn)
+
+
+def process_generation_data(generation_data: dict, db_conn: connection) -> None:
+    """Transform and load generation data"""
+    generation_data_df = pd.DataFrame(generation_data.get('data'))
+    cleaned_generation_data_df = transform_energy_generation(
+        generation_data_df)
+    load_energy_generation_data(
+        cleaned_generation_data_df.to_dict('records'), db_conn)
+
+
+def process_solar_estimate_data(solar_estimate_data: dict, db_conn: connection) -> None:
+    """Transform and load solar estimate data"""
+    solar_estimate_data_df = pd.DataFrame(
+        solar_estimate_data['data'], columns=solar_estimate_data['meta'])
+    cleaned_solar_estimate_data_df = transform_solar_generation(
+        solar_estimate_data_df)
+    load_energy_solar_data(
+        cleaned_solar_estimate_data_df.to_dict('records'), db_conn)
+
+
+PROCESSORS = {
+    'pricing': process_pricing_data,
+    'demand': process_demand_data,
+    'generation': process_generation_data,
+    'solar_estimate': process_solar_estimate_data
+}
+
+
 def handler(event: dict, context: dict):
     """Main method - Perform ETL pipeline"""
     enable_logger()
 
     logger.info("Event: %s", event)
     logger.info("Context: %s", context)
+
+    logger.info("Getting data")
+    extracted_data = extract_all_data()
+
+    try:
+        db_conn = get_connection()
+    except psycopg2Error as connection_error:
+        return {'status': 500, 'reason': connection_error}
+
+    failures = {}
     try:
-        logger.info("Getting data")
-        pricing_data = get_pricing_data().get('data')
-        demand_data = get_demand_data()
-        generation_data = get_generation_data().get('data')
-        solar_estimate_data = get_solar_estimate_data()
-
-        logger.info("Creating dataframes")
-        pricing_data_df = pd.DataFrame(pricing_data)
-        demand_data_df = pd.DataFrame(demand_data)
-        generation_data_df = pd.DataFrame(generation_data)
-        solar_estimate_data_df = pd.DataFrame(
-            solar_estimate_data['data'], columns=solar_estimate_data['meta'])
-
-        logger.info("Cleaning data")
-        cleaned_pricing_data = transform_market_price(pricing_data_df)
-        cleaned_demand_data_df = transform_energy_demand(demand_data_df)
-        cleaned_generation_data_df = transform_energy_generation(
-            generation_data_df)
-        cleaned_solar_estimate_data_df = transform_solar_generation(
-            solar_estimate_data_df)
-
-        logger.info("Converting...")
-        db_pricing = cleaned_pricing_data.to_dict('records')
-        db_demand = cleaned_demand_data_df.to_dict('records')
-        db_generation = cleaned_generation_data_df.to_dict('records')
-        db_solar_estimate = cleaned_solar_estimate_data_df.to_dict('records')
-
-        logger.info("Uploading data")
-        load_market_price_data(db_pricing)
-        load_energy_demand_data(db_demand)
-        load_energy_generation_data(db_generation)
-        load_energy_solar_data(db_solar_estimate)
-        logger.info("ETL Complete")
-    except (ValueError, TypeError, psycopg2Error) as pipeline_error:
-        return {'status': 500, 'reason': pipeline_error}
+        ensure_monthly_partitions(datetime.now(timezone.utc).date(), db_conn)
+        for name, processor in PROCESSORS.items():
+            data = extracted_data.get(name)
+            if data is None:
+                failures[name] = 'No data received'
+                continue
+            try:
+                logger.info("Transforming and uploading %s data", name)
+                processor(data, db_conn)
+            except (ValueError, TypeError, KeyError, AttributeError,
+                    psycopg2Error) as pipeline_error:
+                logger.error('Failed to process %s data - %s',
+                             name, pipeline_error)
+                failures[name] = pipeline_error
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        refresh_rollups(now - ROLLUP_REFRESH_WINDOW, now, db_conn)
+    finally:
+        db_conn.close()
+
+    if failures:
+        return {'status': 500, 'reason': failures}
 
+    logger.info("ETL Complete")
     return {'status': 200}
 
 
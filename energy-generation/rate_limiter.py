@@ -0,0 +1,21 @@
+"""Thread-safe rate limiter shared by the senders and extractors"""
+import threading
+import time
+
+
+class RateLimiter:
+    """Space out calls across threads so at most `rate` start each second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the caller is allowed to make its next call"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,75 @@
+# pylint: skip-file
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+from requests.exceptions import Timeout
+import psycopg2
+
+import backfill
+from backfill import time_slices, backfill_source, run_backfill
+from rate_limiter import RateLimiter
+
+
+def test_time_slices():
+    start = datetime(2025, 1, 1)
+    end = datetime(2025, 1, 3, 12)
+    assert time_slices(start, end, timedelta(days=1)) == [
+        (datetime(2025, 1, 1), datetime(2025, 1, 2)),
+        (datetime(2025, 1, 2), datetime(2025, 1, 3)),
+        (datetime(2025, 1, 3), datetime(2025, 1, 3, 12))
+    ]
+
+
+def test_time_slices_empty_range():
+    assert time_slices(datetime(2025, 1, 1), datetime(2025, 1, 1),
+                       timedelta(days=1)) == []
+
+
+def test_backfill_source_loads_each_chunk_and_isolates_failures():
+    def extractor(start, end):
+        if start == datetime(2025, 1, 2):
+            raise Timeout
+        return {'data': [{'start': start}]}
+
+    loader = MagicMock(return_value=5)
+    db_conn = MagicMock()
+    sources = {'generation': (extractor, loader, timedelta(days=1))}
+
+    with patch.dict('backfill.BACKFILL_SOURCES', sources, clear=True):
+        with backfill.ThreadPoolExecutor(max_workers=2) as executor:
+            summary = backfill_source('generation', (datetime(2025, 1, 1), datetime(2025, 1, 4)),
+                                      db_conn, executor, RateLimiter(1000))
+
+    assert summary['chunks'] == 3
+    assert summary['rows'] == 10
+    assert summary['failed'] == [(datetime(2025, 1, 2), datetime(2025, 1, 3))]
+    assert loader.call_count == 2
+
+
+def test_backfill_source_counts_failed_loads_as_failures():
+    loader = MagicMock(side_effect=[psycopg2.Error('deadlock'), 5])
+    sources = {'pricing': (lambda start, end: {'data': [{'start': start}]}, loader,
+                           timedelta(days=1))}
+
+    with patch.dict('backfill.BACKFILL_SOURCES', sources, clear=True):
+        with backfill.ThreadPoolExecutor(max_workers=1) as executor:
+            summary = backfill_source('pricing', (datetime(2025, 1, 1), datetime(2025, 1, 3)),
+                                      MagicMock(), executor, RateLimiter(1000))
+
+    assert summary['rows'] == 5
+    assert len(summary['failed']) == 1
+
+
+@patch('backfill.refresh_rollups')
+@patch('backfill.get_connection')
+@patch('backfill.backfill_source', return_value={'chunks': 1, 'rows': 1, 'failed': []})
+def test_run_backfill_shares_one_connection(mock_backfill_source, mock_get_connection,
+                                            mock_refresh_rollups):
+    result = run_backfill(datetime(2025, 1, 1), datetime(2025, 1, 2),
+                          ['generation', 'pricing'])
+
+    assert set(result) == {'generation', 'pricing'}
+    mock_get_connection.assert_called_once()
+    mock_get_connection.return_value.close.assert_called_once()
+    mock_refresh_rollups.assert_called_once_with(
+        datetime(2025, 1, 1), datetime(2025, 1, 2), mock_get_connection.return_value)
@@ -4,7 +4,7 @@ from unittest.mock import patch, MagicMock
 from requests.exceptions import Timeout
 
 
-from extract import perform_http_get, get_demand_data, get_generation_data, get_interconnect_data, get_pricing_data
+from extract import ELEXON_TIMEOUT, perform_http_get, get_demand_data, get_generation_data, get_interconnect_data, get_pricing_data
 
 
 TEST_URL = "https://data.elexon.co.uk/bmrs/api/v1/datasets/FUELINST"
@@ -44,7 +44,7 @@ def test_retrieve_generation_data():
     assert generation_data is not None
 
 
-@patch('extract.requests.get')
+@patch('extract.http_get')
 def test_perform_http_get_success(mock_get):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -54,11 +54,11 @@ def test_perform_http_get_success(mock_get):
     url = "https://example.com/data"
     result = perform_http_get(url)
 
-    mock_get.assert_called_once_with(url, timeout=10)
+    mock_get.assert_called_once_with(url, timeout=ELEXON_TIMEOUT)
     assert result == [{'data': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]}]
 
 
-@patch('extract.requests.get')
+@patch('extract.http_get')
 def test_perform_http_get_failure(mock_get):
     mock_response = MagicMock()
     mock_response.status_code = 500
@@ -67,11 +67,11 @@ def test_perform_http_get_failure(mock_get):
     url = "https://example.com/data"
     result = perform_http_get(url)
 
-    mock_get.assert_called_once_with(url, timeout=10)
+    mock_get.assert_called_once_with(url, timeout=ELEXON_TIMEOUT)
     assert result is None
 
 
-@patch('extract.requests.get')
+@patch('extract.http_get')
 def test_perform_http_get_timeout(mock_get):
     mock_get.side_effect = Timeout
 
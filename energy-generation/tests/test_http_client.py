@@ -0,0 +1,30 @@
+# pylint: skip-file
+import pytest
+from unittest.mock import patch
+
+from http_client import (JitteredRetry, create_session, http_get,
+                         MAX_RETRIES, RETRY_STATUSES)
+
+
+def test_create_session_pools_and_retries():
+    session = create_session(pool_size=4)
+    adapter = session.get_adapter('https://data.elexon.co.uk')
+
+    assert adapter._pool_maxsize == 4
+    assert isinstance(adapter.max_retries, JitteredRetry)
+    assert adapter.max_retries.total == MAX_RETRIES
+    assert set(adapter.max_retries.status_forcelist) == set(RETRY_STATUSES)
+    assert 'gzip' in session.headers['Accept-Encoding']
+
+
+def test_jittered_retry_backoff_is_bounded():
+    retry = JitteredRetry(total=5, backoff_factor=1).increment(
+        method='GET', url='/').increment(method='GET', url='/')
+    for _ in range(20):
+        assert 0 <= retry.get_backoff_time() <= 2
+
+
+@patch('http_client.SESSION')
+def test_http_get_uses_shared_session(mock_session):
+    http_get('https://example.com', timeout=3)
+    mock_session.get.assert_called_once_with('https://example.com', timeout=3)
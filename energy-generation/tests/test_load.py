@@ -1,16 +1,76 @@
 # pylint: skip-file
 import pytest
 from unittest.mock import patch, MagicMock
-from requests.exceptions import Timeout
-from load import load_energy_solar_data, load_energy_generation_data, load_energy_demand_data, load_market_price_data
+import psycopg2
+import load
+from load import (load_energy_solar_data, load_energy_generation_data, load_energy_demand_data,
+                  load_market_price_data, get_fuel_type_ids, resolve_fuel_type_ids,
+                  deduplicate, refresh_rollups, ensure_monthly_partitions, add_months,
+                  create_partitions)
+from datetime import date
 
 
-@patch('load.get_connection')
+@pytest.fixture(autouse=True)
+def clear_fuel_type_cache():
+    load.FUEL_TYPE_IDS.clear()
+    load.PARTITIONED_MONTHS.clear()
+    yield
+    load.FUEL_TYPE_IDS.clear()
+    load.PARTITIONED_MONTHS.clear()
+
+
+def test_get_fuel_type_ids_is_cached():
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [('WIND', 1), ('SOLAR', 2)]
+
+    assert get_fuel_type_ids(mock_cursor) == {'WIND': 1, 'SOLAR': 2}
+    assert get_fuel_type_ids(mock_cursor) == {'WIND': 1, 'SOLAR': 2}
+    mock_cursor.execute.assert_called_once()
+
+
+def test_resolve_fuel_type_ids_refreshes_and_skips_unknown():
+    load.FUEL_TYPE_IDS.update({'WIND': 1})
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [('WIND', 1), ('SOLAR', 2)]
+
+    rows = [(300.0, 'WIND', 't1'), (100.0, 'SOLAR', 't1'), (5.0, 'FAKE', 't1')]
+
+    assert resolve_fuel_type_ids(mock_cursor, rows) == [
+        (300.0, 1, 't1'), (100.0, 2, 't1')]
+    mock_cursor.execute.assert_called_once()
+
+
+def test_deduplicate_keeps_last_row_per_key():
+    rows = [('t1', 10), ('t2', 20), ('t1', 15)]
+
+    assert deduplicate(rows, key=lambda row: row[0]) == [('t1', 15), ('t2', 20)]
+
+
+@patch('load.psycopg2.extras.execute_values')
+@patch('load.get_cursor')
+def test_load_energy_demand_data_upserts_deduplicated_rows(mock_get_cursor,
+                                                           mock_execute_values):
+    mock_conn = MagicMock()
+    mock_get_cursor.return_value = MagicMock()
+
+    data = [
+        {'startTime': '2024-01-01T05:00:00Z', 'demand': 30000},
+        {'startTime': '2024-01-01T05:00:00Z', 'demand': 31000}
+    ]
+
+    load_energy_demand_data(data, mock_conn)
+
+    args, _ = mock_execute_values.call_args
+    assert "ON CONFLICT (demand_at)" in args[1]
+    assert list(args[2]) == [('2024-01-01T05:00:00Z', 31000)]
+
+
+@patch('load.psycopg2.extras.execute_values')
 @patch('load.get_cursor')
-def test_load_energy_generation_data(mock_get_cursor, mock_get_connection):
+def test_load_energy_generation_data(mock_get_cursor, mock_execute_values):
+    load.FUEL_TYPE_IDS.update({'WIND': 7})
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_connection.return_value = mock_conn
     mock_get_cursor.return_value = mock_cursor
 
     data = [
@@ -20,78 +80,92 @@ def test_load_energy_generation_data(mock_get_cursor, mock_get_connection):
             'publishTime': '2024-01-01T04:00:00Z'}
     ]
 
-    load_energy_generation_data(data)
+    load_energy_generation_data(data, mock_conn)
 
     expected_rows = [
-        (300.0, 'WIND', '2024-01-01T03:00:00Z'),
-        (450.5, 'WIND', '2024-01-01T04:00:00Z')
+        (300.0, 7, '2024-01-01T03:00:00Z'),
+        (450.5, 7, '2024-01-01T04:00:00Z')
     ]
-    mock_cursor.executemany.assert_called_once()
-    args, _ = mock_cursor.executemany.call_args
-    assert args[0].strip().startswith("INSERT INTO generations")
-    assert list(args[1]) == expected_rows
+    mock_execute_values.assert_called_once()
+    args, _ = mock_execute_values.call_args
+    assert args[1].strip().startswith("INSERT INTO generations")
+    assert "ON CONFLICT (generation_at, fuel_type_id)" in args[1]
+    assert list(args[2]) == expected_rows
 
     mock_conn.commit.assert_called_once()
     mock_cursor.close.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()
 
 
-@patch('load.get_connection')
+@patch('load.psycopg2.extras.execute_values')
 @patch('load.get_cursor')
-def test_load_market_price_data(mock_get_cursor, mock_get_connection):
+def test_load_market_price_data(mock_get_cursor, mock_execute_values):
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_connection.return_value = mock_conn
     mock_get_cursor.return_value = mock_cursor
 
     data = [
         {'startTime': '2024-01-01T05:00:00Z', 'price': 75.25}
     ]
 
-    load_market_price_data(data)
+    load_market_price_data(data, mock_conn)
 
-    expected_row = ('2024-01-01T05:00:00Z', 75.25)
-    mock_cursor.execute.assert_called_once()
-    args, _ = mock_cursor.execute.call_args
-    assert args[0].strip().startswith("INSERT INTO prices")
-    assert args[1] == expected_row
+    expected_rows = [('2024-01-01T05:00:00Z', 75.25)]
+    mock_execute_values.assert_called_once()
+    args, _ = mock_execute_values.call_args
+    assert args[1].strip().startswith("INSERT INTO prices")
+    assert args[2] == expected_rows
 
     mock_conn.commit.assert_called_once()
     mock_cursor.close.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()
 
 
-@patch('load.get_connection')
+@patch('load.psycopg2.extras.execute_values')
 @patch('load.get_cursor')
-def test_load_energy_demand_data(mock_get_cursor, mock_get_connection):
+def test_load_energy_demand_data(mock_get_cursor, mock_execute_values):
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_connection.return_value = mock_conn
     mock_get_cursor.return_value = mock_cursor
 
     data = [
         {'startTime': '2024-01-01T06:00:00Z', 'demand': 10250.0}
     ]
 
-    load_energy_demand_data(data)
+    load_energy_demand_data(data, mock_conn)
 
-    expected_row = ('2024-01-01T06:00:00Z', 10250.0)
-    mock_cursor.execute.assert_called_once()
-    args, _ = mock_cursor.execute.call_args
-    assert args[0].strip().startswith("INSERT INTO demands")
-    assert args[1] == expected_row
+    expected_rows = [('2024-01-01T06:00:00Z', 10250.0)]
+    mock_execute_values.assert_called_once()
+    args, _ = mock_execute_values.call_args
+    assert args[1].strip().startswith("INSERT INTO demands")
+    assert args[2] == expected_rows
 
     mock_conn.commit.assert_called_once()
     mock_cursor.close.assert_called_once()
-    mock_conn.close.assert_called_once()
+    mock_conn.close.assert_not_called()
 
 
-@patch('load.get_connection')
+@patch('load.psycopg2.extras.execute_values')
 @patch('load.get_cursor')
-def test_load_energy_solar_data(mock_get_cursor, mock_get_connection):
+def test_load_energy_demand_data_rolls_back_on_error(mock_get_cursor, mock_execute_values):
+    mock_conn = MagicMock()
+    mock_get_cursor.return_value = MagicMock()
+    mock_execute_values.side_effect = psycopg2.Error
+
+    with pytest.raises(psycopg2.Error):
+        load_energy_demand_data(
+            [{'startTime': '2024-01-01T06:00:00Z', 'demand': 10250.0}], mock_conn)
+
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+
+
+@patch('load.psycopg2.extras.execute_values')
+@patch('load.get_cursor')
+def test_load_energy_solar_data(mock_get_cursor, mock_execute_values):
+    load.FUEL_TYPE_IDS.update({'SOLAR': 3})
     mock_conn = MagicMock()
     mock_cursor = MagicMock()
-    mock_get_connection.return_value = mock_conn
     mock_get_cursor.return_value = mock_cursor
 
     data = [
@@ -101,17 +175,91 @@ def test_load_energy_solar_data(mock_get_cursor, mock_get_connection):
             'publishTime': '2024-01-01T01:00:00Z'}
     ]
 
-    load_energy_solar_data(data)
+    load_energy_solar_data(data, mock_conn)
 
     expected_values = [
-        (100.5, 'SOLAR', '2024-01-01T00:00:00Z'),
-        (150.0, 'SOLAR', '2024-01-01T01:00:00Z')
+        (100.5, 3, '2024-01-01T00:00:00Z'),
+        (150.0, 3, '2024-01-01T01:00:00Z')
     ]
-    mock_cursor.executemany.assert_called_once()
-    args, _ = mock_cursor.executemany.call_args
-    assert args[0].strip().startswith("INSERT INTO generations")
-    assert list(args[1]) == expected_values
+    mock_execute_values.assert_called_once()
+    args, _ = mock_execute_values.call_args
+    assert args[1].strip().startswith("INSERT INTO generations")
+    assert list(args[2]) == expected_values
+
+    mock_conn.commit.assert_called_once()
+    mock_cursor.close.assert_called_once()
+    mock_conn.close.assert_not_called()
 
+
+@patch('load.get_cursor')
+def test_refresh_rollups(mock_get_cursor):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_cursor.return_value = mock_cursor
+
+    refresh_rollups('2024-01-01T00:00:00', '2024-01-02T00:00:00', mock_conn)
+
+    mock_cursor.execute.assert_called_once_with(
+        "SELECT refresh_rollups(%s, %s)", ('2024-01-01T00:00:00', '2024-01-02T00:00:00'))
+    mock_conn.commit.assert_called_once()
+    mock_cursor.close.assert_called_once()
+
+
+def test_add_months_rolls_over_years():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+
+
+@patch('load.get_cursor')
+def test_create_partitions(mock_get_cursor):
+    mock_conn = MagicMock()
+    mock_cursor = mock_get_cursor.return_value
+    mock_cursor.fetchone.return_value = (1, )
+
+    created = create_partitions(date(2025, 4, 15), mock_conn, months_ahead=2)
+
+    assert created == {table: 1 for table in load.PARTITIONED_TABLES}
+    mock_cursor.execute.assert_any_call("SELECT create_monthly_partitions(%s, %s, %s, %s)",
+                                        ('generations', 'generation_at',
+                                         date(2025, 4, 1), date(2025, 6, 1)))
     mock_conn.commit.assert_called_once()
     mock_cursor.close.assert_called_once()
-    mock_conn.close.assert_called_once()
+
+
+@patch('load.get_cursor')
+def test_create_partitions_rolls_back_on_error(mock_get_cursor):
+    mock_conn = MagicMock()
+    mock_get_cursor.return_value.execute.side_effect = psycopg2.Error
+
+    assert create_partitions(date(2025, 4, 15), mock_conn) == {}
+    mock_conn.rollback.assert_called_once()
+    mock_conn.commit.assert_not_called()
+
+
+@patch('load.get_cursor')
+def test_ensure_monthly_partitions_once_a_month(mock_get_cursor):
+    mock_conn = MagicMock()
+    mock_cursor = mock_get_cursor.return_value
+    mock_cursor.fetchone.return_value = (1, )
+
+    ensure_monthly_partitions(date(2025, 11, 20), mock_conn)
+    ensure_monthly_partitions(date(2025, 11, 21), mock_conn)
+
+    assert mock_cursor.execute.call_count == len(load.PARTITIONED_TABLES)
+    assert mock_cursor.execute.call_args.args[1] == (
+        'carbon_intensities', 'measure_at', date(2025, 11, 1), date(2026, 2, 1))
+    mock_conn.commit.assert_called_once()
+
+    ensure_monthly_partitions(date(2025, 12, 1), mock_conn)
+    assert mock_cursor.execute.call_count == 2 * len(load.PARTITIONED_TABLES)
+
+
+@patch('load.get_cursor')
+def test_ensure_monthly_partitions_retries_after_error(mock_get_cursor):
+    mock_conn = MagicMock()
+    mock_get_cursor.return_value.execute.side_effect = [psycopg2.Error, None, None, None, None]
+    mock_get_cursor.return_value.fetchone.return_value = (0, )
+
+    ensure_monthly_partitions(date(2025, 11, 20), mock_conn)
+    mock_conn.rollback.assert_called_once()
+    ensure_monthly_partitions(date(2025, 11, 20), mock_conn)
+    mock_conn.commit.assert_called_once()
@@ -0,0 +1,94 @@
+# pylint: skip-file
+import pytest
+from unittest.mock import patch, MagicMock
+from requests.exceptions import Timeout
+import psycopg2
+
+from pipeline import extract_all_data, handler, ROLLUP_REFRESH_WINDOW
+
+
+def test_extract_all_data():
+    extractors = {
+        'pricing': lambda: {'data': [1]},
+        'demand': lambda: [2]
+    }
+    assert extract_all_data(extractors) == {
+        'pricing': {'data': [1]}, 'demand': [2]}
+
+
+def test_extract_all_data_isolates_failures():
+    def failing_extractor():
+        raise Timeout
+
+    extractors = {
+        'pricing': failing_extractor,
+        'demand': lambda: [2]
+    }
+    assert extract_all_data(extractors) == {'pricing': None, 'demand': [2]}
+
+
+@patch('pipeline.ensure_monthly_partitions')
+@patch('pipeline.refresh_rollups')
+@patch('pipeline.get_connection')
+@patch('pipeline.extract_all_data')
+def test_handler_success(mock_extract, mock_get_connection, mock_refresh_rollups,
+                         mock_ensure_partitions):
+    mock_extract.return_value = {'pricing': 1, 'demand': 2,
+                                 'generation': 3, 'solar_estimate': 4}
+    processors = {name: MagicMock() for name in mock_extract.return_value}
+
+    with patch.dict('pipeline.PROCESSORS', processors):
+        assert handler(None, None) == {'status': 200}
+
+    for name, processor in processors.items():
+        processor.assert_called_once_with(
+            mock_extract.return_value[name], mock_get_connection.return_value)
+    mock_get_connection.assert_called_once()
+    mock_get_connection.return_value.close.assert_called_once()
+    start, end, db_conn = mock_refresh_rollups.call_args.args
+    assert end - start == ROLLUP_REFRESH_WINDOW
+    assert db_conn is mock_get_connection.return_value
+    assert mock_ensure_partitions.call_args.args[1] is mock_get_connection.return_value
+
+
+@patch('pipeline.refresh_rollups')
+@patch('pipeline.get_connection')
+@patch('pipeline.extract_all_data')
+def test_handler_isolates_source_failures(mock_extract, mock_get_connection,
+                                          mock_refresh_rollups):
+    mock_extract.return_value = {'pricing': None, 'demand': 2,
+                                 'generation': 3, 'solar_estimate': 4}
+    processors = {name: MagicMock() for name in mock_extract.return_value}
+    processors['generation'].side_effect = KeyError('data')
+
+    with patch.dict('pipeline.PROCESSORS', processors):
+        result = handler(None, None)
+
+    assert result['status'] == 500
+    assert set(result['reason']) == {'pricing', 'generation'}
+    processors['pricing'].assert_not_called()
+    db_conn = mock_get_connection.return_value
+    processors['demand'].assert_called_once_with(2, db_conn)
+    processors['solar_estimate'].assert_called_once_with(4, db_conn)
+    db_conn.close.assert_called_once()
+
+
+@patch('load.psycopg2.extras.execute_values', side_effect=psycopg2.Error('deadlock'))
+@patch('load.get_cursor')
+@patch('pipeline.refresh_rollups')
+@patch('pipeline.get_connection')
+@patch('pipeline.extract_all_data')
+def test_handler_reports_failed_database_load(mock_extract, mock_get_connection,
+                                              mock_refresh_rollups, mock_get_cursor,
+                                              mock_execute_values):
+    mock_extract.return_value = {'pricing': None, 'demand': None, 'generation': None,
+                                 'solar_estimate': None}
+    mock_extract.return_value['demand'] = [{'startTime': '2024-01-01T06:00:00Z',
+                                            'demand': 10250.0}]
+
+    with patch('pipeline.transform_energy_demand', side_effect=lambda df: df):
+        result = handler(None, None)
+
+    assert result['status'] == 500
+    assert isinstance(result['reason']['demand'], psycopg2.Error)
+    mock_get_connection.return_value.rollback.assert_called_once()
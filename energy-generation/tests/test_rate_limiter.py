@@ -0,0 +1,23 @@
+# pylint: skip-file
+from unittest.mock import patch
+
+from rate_limiter import RateLimiter
+
+
+@patch('rate_limiter.time.sleep')
+@patch('rate_limiter.time.monotonic', return_value=100.0)
+def test_rate_limiter_spaces_calls(mock_monotonic, mock_sleep):
+    limiter = RateLimiter(rate=2)
+    limiter.wait()
+    limiter.wait()
+    limiter.wait()
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 1.0]
+
+
+@patch('rate_limiter.time.sleep')
+def test_rate_limiter_no_wait_after_idle(mock_sleep):
+    with patch('rate_limiter.time.monotonic', side_effect=[100.0, 100.0, 105.0]):
+        limiter = RateLimiter(rate=2)
+        limiter.wait()
+        limiter.wait()
+    mock_sleep.assert_not_called()
@@ -150,3 +150,35 @@ def test_transform_solar_generation():
     assert list(result_df['generation_mw']) == [100.5, 200.7]
     assert list(result_df['publishTime']) == [
         '2024-01-01T00:00:00Z', '2024-01-01T01:00:00Z']
+
+
+def test_transform_market_price_keeps_all_periods():
+    data = {
+        "startTime": ["2025-04-13T22:30:00Z", "2025-04-13T22:00:00Z"],
+        "dataProvider": ["APXMIDP", "APXMIDP"],
+        "settlementDate": ["2025-04-13", "2025-04-13"],
+        "settlementPeriod": [46, 45],
+        "price": [86.86, 84.63],
+        "volume": [1631.8, 1492.3]
+    }
+    transformed_data = transform_market_price(
+        pd.DataFrame(data), keep_latest=False)
+
+    assert len(transformed_data) == 2
+    assert list(transformed_data['price']) == [86.86, 84.63]
+
+
+def test_transform_energy_demand_history():
+    data = {
+        "dataset": ["INDO", "INDO"],
+        "publishTime": ["2025-04-11T23:00:00Z", "2025-04-11T23:30:00Z"],
+        "startTime": ["2025-04-11T22:30:00Z", "2025-04-11T23:00:00Z"],
+        "settlementDate": ["2025-04-11", "2025-04-11"],
+        "settlementPeriod": [46, 47],
+        "demand": [23760, 23663]
+    }
+    transformed_data = transform_energy_demand(
+        pd.DataFrame(data), keep_latest=False)
+
+    assert list(transformed_data.columns) == ['startTime', 'demand']
+    assert list(transformed_data['demand']) == [23760, 23663]
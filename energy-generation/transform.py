@@ -15,23 +15,27 @@ def filter_by_largest(filter_column_name: str, df: pd.DataFrame) -> pd.DataFrame
     return df
 
 
-def transform_energy_generation(df: pd.DataFrame) -> pd.DataFrame:
+def transform_energy_generation(df: pd.DataFrame, keep_latest: bool = True) -> pd.DataFrame:
     """Read and transform energy generation"""
     logger.info("Working on energy generation dataframe")
     df.drop(
         columns=['settlementDate', 'settlementPeriod', 'dataset', 'startTime'], inplace=True)
     df['publishTime'] = pd.to_datetime(df['publishTime'], utc=True)
-    df = filter_by_largest('publishTime', df)
+    if keep_latest:
+        df = filter_by_largest('publishTime', df)
     return df
 
 
-def transform_energy_demand(df: pd.DataFrame) -> pd.DataFrame:
+def transform_energy_demand(df: pd.DataFrame, keep_latest: bool = True) -> pd.DataFrame:
     """Read and transform energy demand"""
     logger.info("Working on energy demand dataframe")
-    df.drop(columns=['recordType'], inplace=True)
+    # Live summary rows carry a recordType, historic INDO rows carry dataset metadata
+    df.drop(columns=['recordType', 'dataset', 'publishTime', 'settlementDate',
+                     'settlementPeriod'], inplace=True, errors='ignore')
     df['startTime'] = pd.to_datetime(
         df['startTime'], utc=True, format='ISO8601')
-    df = filter_by_largest('startTime', df)
+    if keep_latest:
+        df = filter_by_largest('startTime', df)
     return df
 
 
@@ -47,7 +51,7 @@ def transform_interconnect_data(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def transform_market_price(df: pd.DataFrame) -> pd.DataFrame:
+def transform_market_price(df: pd.DataFrame, keep_latest: bool = True) -> pd.DataFrame:
     """Read and transform latest market data"""
     # Data provider will always be APXMIDP
     logger.info("Working on energy market pricing dataframe")
@@ -55,7 +59,8 @@ def transform_market_price(df: pd.DataFrame) -> pd.DataFrame:
             'settlementPeriod'], inplace=True)
     df['startTime'] = pd.to_datetime(
         df['startTime'], utc=True, format='ISO8601')
-    df = filter_by_largest('startTime', df)
+    if keep_latest:
+        df = filter_by_largest('startTime', df)
     return df
 
 
@@ -0,0 +1,96 @@
+"""Ledger recording which subscribers have been sent each month's newsletter"""
+import logging
+from datetime import date
+import psycopg2.extras
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 3
+# Longer than the Lambda timeout, so only claims from dead invocations are taken over
+CLAIM_TIMEOUT = '15 minutes'
+
+
+def get_report_month(today: date) -> date:
+    """Returns the first day of the month a report sent today belongs to"""
+    return today.replace(day=1)
+
+
+def enqueue_deliveries(conn: 'Connection', report_month: date) -> int:
+    """Adds a pending delivery for every subscribed user not already in the month's ledger"""
+    query = """INSERT INTO newsletter_deliveries (report_month, user_id)
+                SELECT DISTINCT %s::DATE, u.user_id
+                FROM users AS u
+                JOIN subscriptions AS s ON s.user_id = u.user_id
+                ON CONFLICT (report_month, user_id) DO NOTHING"""
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, (report_month,))
+        added = cursor.rowcount
+    conn.commit()
+
+    logging.info("Queued %s new deliveries for %s", added, report_month)
+    return added
+
+
+def claim_batch(conn: 'Connection', report_month: date,
+                batch_size: int = BATCH_SIZE) -> list[tuple]:
+    """Claims up to batch_size unsent deliveries, returning (delivery_id, name, email) rows.
+    SKIP LOCKED lets concurrent workers claim separate batches."""
+    query = """UPDATE newsletter_deliveries AS d
+                SET status = 'sending', claimed_at = NOW(), attempts = d.attempts + 1
+                FROM users AS u
+                WHERE u.user_id = d.user_id
+                AND d.delivery_id IN (
+                    SELECT delivery_id
+                    FROM newsletter_deliveries
+                    WHERE report_month = %s
+                    AND ((status IN ('pending', 'failed') AND attempts < %s)
+                        OR (status = 'sending' AND claimed_at < NOW() - %s::INTERVAL))
+                    ORDER BY delivery_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING d.delivery_id, u.first_name, u.email"""
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, (report_month, MAX_ATTEMPTS, CLAIM_TIMEOUT, batch_size))
+        batch = cursor.fetchall()
+    conn.commit()
+
+    return batch
+
+
+def record_results(conn: 'Connection', batch: list[tuple], results: dict) -> None:
+    """Marks each claimed delivery as sent or failed from the bulk sender's results"""
+    sent = []
+    failed = []
+    for delivery_id, _, email in batch:
+        if email in results["sent"]:
+            sent.append((delivery_id, results["sent"][email]))
+        else:
+            failed.append((delivery_id, results["failed"].get(email, "Not sent")))
+
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(cursor, """
+            UPDATE newsletter_deliveries AS d
+            SET status = 'sent', message_id = v.message_id, sent_at = NOW(), error = NULL
+            FROM (VALUES %s) AS v (delivery_id, message_id)
+            WHERE d.delivery_id = v.delivery_id""", sent)
+        psycopg2.extras.execute_values(cursor, """
+            UPDATE newsletter_deliveries AS d
+            SET status = 'failed', error = v.error
+            FROM (VALUES %s) AS v (delivery_id, error)
+            WHERE d.delivery_id = v.delivery_id""", failed)
+    conn.commit()
+
+
+def count_outstanding(conn: 'Connection', report_month: date) -> int:
+    """Counts deliveries for the month that are still to be sent or retried"""
+    query = """SELECT COUNT(*)
+                FROM newsletter_deliveries
+                WHERE report_month = %s
+                AND (status IN ('pending', 'sending')
+                    OR (status = 'failed' AND attempts < %s))"""
+
+    with conn.cursor() as cursor:
+        cursor.execute(query, (report_month, MAX_ATTEMPTS))
+        return cursor.fetchone()[0]
@@ -1,58 +1,112 @@
 """Script to get users and send them the monthly report"""
+import json
 import logging
+from datetime import date
 from dotenv import load_dotenv
+import boto3
 import botocore
-from send_email import send_email_with_attachment
+from send_email import (create_ses_client, get_max_send_rate, build_attachment,
+                        deliver_batch)
+from rate_limiter import RateLimiter
+from delivery_ledger import (get_report_month, enqueue_deliveries, claim_batch,
+                             record_results, count_outstanding, BATCH_SIZE)
 from newsletter_pdf import create_report_data, create_pdf_report
 from newsletter.newsletter import get_connection_to_db, enable_logging
 
+# Stop claiming batches once less than this is left of the Lambda's time
+MIN_REMAINING_MS = 20000
 
-def get_subscribed_users(cursor: 'Cursor') -> list[tuple]:
-    """Retrieving all subscriber names and emails from database"""
-    query = """SELECT u.first_name, u.email
-                FROM users AS u
-                JOIN subscriptions AS s ON s.user_id = u.user_id;"""
 
-    cursor.execute(query)
-    result = cursor.fetchall()
+def has_time_left(context) -> bool:
+    """Checking whether the invocation has time for another batch"""
+    get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+    return get_remaining_time is None or get_remaining_time() > MIN_REMAINING_MS
 
-    cursor.close()
 
-    return result
+def dispatch_deliveries(conn: 'Connection', report_month: date, file_name: str,
+                        context=None, client=None, batch_size: int = BATCH_SIZE,
+                        workers: int = 1) -> dict:
+    """Claiming and sending batches of the month's deliveries until none are left
+    or the invocation runs low on time, recording every outcome in the ledger.
+    Each of the running workers sends at its share of the account's SES rate"""
+    client = client or create_ses_client()
+    rate_limiter = RateLimiter(get_max_send_rate(client) / workers)
+    attachment = build_attachment(file_name)
+    summary = {"sent": 0, "failed": {}, "finished": False}
 
+    while has_time_left(context):
+        batch = claim_batch(conn, report_month, batch_size)
+        if not batch:
+            summary["finished"] = True
+            break
 
-def send_emails_to_users(users: list[tuple], file_name: str):
-    """extracting name and email from database results"""
-    for user in users:
-        name, email = user
-        send_email_with_attachment(file_name, email, name)
+        results = deliver_batch([(name, email) for _, name, email in batch],
+                                client, rate_limiter, attachment)
+        record_results(conn, batch, results)
+        summary["sent"] += len(results["sent"])
+        summary["failed"].update(results["failed"])
+
+    summary["outstanding"] = count_outstanding(conn, report_month)
+    return summary
+
+
+def invoke_worker(context, report_month: date, workers: int, report_data: dict) -> None:
+    """Starting another invocation of this Lambda to carry on sending the month's deliveries,
+    passing on the worker count and the report data so it isn't gathered again"""
+    boto3.client("lambda").invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"report_month": report_month.isoformat(), "worker": True,
+                            "workers": workers, "report_data": report_data})
+    )
 
 
 def lambda_handler(event, context):
-    """Combining all functions into a single lambda handler to be run on AWS"""
+    """Combining all functions into a single lambda handler to be run on AWS.
+    The first invocation queues every subscriber in the delivery ledger and can start
+    extra workers with {"workers": n}, sharing the SES send rate between them. The report
+    data is gathered once and passed to every worker. Any invocation that runs out of time
+    hands the rest of the ledger to a new worker, so reruns never double-send."""
+    event = event or {}
     try:
         load_dotenv()
         enable_logging()
         logging.info('Event: %s, Context %s', event, context)
+        report_month = (date.fromisoformat(event["report_month"]) if "report_month" in event
+                        else get_report_month(date.today()))
         pdf_filename = "/tmp/monthly_report.pdf"
         logging.info("Getting connection")
         db_connection = get_connection_to_db()
         logging.info("Connected to database")
-        curr = db_connection.cursor()
-        logging.info("Finding subscribed users")
-        subscribed_users = get_subscribed_users(curr)
-        logging.info("Found users")
+        workers = max(event.get("workers", 1), 1)
+
+        if not event.get("worker"):
+            logging.info("Queueing deliveries for subscribed users")
+            enqueue_deliveries(db_connection, report_month)
+
         logging.info("Creating newsletter")
-        report_data = create_report_data()
+        report_data = event.get("report_data") or create_report_data()
+        if not event.get("worker"):
+            for _ in range(workers - 1):
+                invoke_worker(context, report_month, workers, report_data)
         create_pdf_report(report_data, pdf_filename, "newsletter.html")
         logging.info("Report created")
         logging.info("Sending emails to subscribers")
-        send_emails_to_users(subscribed_users, pdf_filename)
+        summary = dispatch_deliveries(db_connection, report_month, pdf_filename, context,
+                                      workers=workers)
         logging.info("Emails sent")
         db_connection.close()
+
+        if not summary["finished"] and hasattr(context, "function_name"):
+            logging.info("Out of time with %s deliveries left, starting a new worker",
+                         summary["outstanding"])
+            invoke_worker(context, report_month, workers, report_data)
+
         return {
             "statusCode": 200,
-            "body": "Emails sent successfully."
+            "body": (f"Sent {summary['sent']} emails, {len(summary['failed'])} failed, "
+                     f"{summary['outstanding']} outstanding."),
+            "failed": summary["failed"]
         }
     except botocore.exceptions.ClientError as e:
         logging.error("Error in monthly_email_report Lambda: %s", e)
@@ -1,10 +1,20 @@
 """Script that retrieves all the necessary data for the newsletter from the database"""
 import os
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import psycopg2
 from dotenv import load_dotenv
 
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MIN_REPORT_BUCKETS = 100
+# Rollup bucket widths, coarsest first
+ROLLUP_WIDTHS = {
+    '1 day': timedelta(days=1),
+    '1 hour': timedelta(hours=1),
+    '30 minutes': timedelta(minutes=30)
+}
+
 
 def enable_logging() -> None:
     """Enables logging at INFO level"""
@@ -34,243 +44,186 @@ def get_dates() -> datetime:
 
 def format_dates(date: datetime) -> str:
     """Formatting any date to desired string"""
-    date_formatted = date.strftime("%Y-%m-%d %H:%M:%S")
+    date_formatted = date.strftime(DATE_FORMAT)
 
     return date_formatted
 
 
-def get_average_price_over_past_month(cursor: 'Cursor', today: str, last_month: str):
-    """Retrieving average price of energy over the past month from database"""
-    query = """SELECT AVG(price_per_mwh) AS price_average
-                FROM prices
-                WHERE updated_at BETWEEN %s AND %s
-            """
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return round(result, 2)
-
-
-def get_highest_price_over_past_month(cursor: 'Cursor', today: str, last_month: str):
-    """Retrieving highest price of energy over the past month and corresponding date
-    from database"""
-    query = """SELECT price_per_mwh, price_at
-                FROM prices
-                WHERE updated_at BETWEEN %s AND %s
-                ORDER BY price_per_mwh DESC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()
-    highest_price, date_of_highest_price = result
-
-    return round(float(highest_price), 2), format_dates(date_of_highest_price)
-
-
-def get_lowest_price_over_past_month(cursor: 'Cursor', today: str, last_month: str) -> str:
-    """Retrieving lowest price of energy over the past month with corresponding date
-    from database"""
-
-    query = """SELECT price_per_mwh, price_at
-                FROM prices
-                WHERE updated_at BETWEEN %s AND %s
-                ORDER BY price_per_mwh ASC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()
-    lowest_price, date_of_lowest_price = result
-
-    return str(lowest_price), format_dates(date_of_lowest_price)
-
-
-def get_total_demand_over_past_month(cursor: 'Cursor', today: str, last_month: str) -> int:
-    """Retrieving total demand for energy over the past month from database"""
-    query = """SELECT SUM(total_demand)
-                FROM demands
-                WHERE updated_at BETWEEN %s AND %s"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_average_demand_per_day_over_past_month(cursor: 'Cursor',
-                                               today: str, last_month: str) -> float:
-    """Retrieving average demand per day for energy over the past month from database"""
-    query = """SELECT AVG(total_demand)
-                FROM demands
-                WHERE updated_at BETWEEN %s AND %s"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return round(result, 2)
-
-
-def get_highest_demand(cursor: 'Cursor', today: str, last_month: str):
-    """Retrieving highest demand recorded for energy in a day over the past 
-    month from database"""
-    query = """SELECT total_demand, demand_at
-                FROM demands
-                WHERE updated_at BETWEEN %s AND %s
-                ORDER BY total_demand DESC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()
-
-    highest_demand, highest_demand_date = result
-
-    return highest_demand, format_dates(highest_demand_date)
-
-
-def get_lowest_demand(cursor: 'Cursor', today: str, last_month: str):
-    """Retrieving highest demand for energy in a day over the past month 
-    from database"""
-    query = """SELECT total_demand, demand_at
-                FROM demands
-                WHERE updated_at BETWEEN %s AND %s
-                ORDER BY total_demand ASC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()
-
-    lowest_demand, lowest_demand_date = result
-
-    return lowest_demand, format_dates(lowest_demand_date)
-
-
-def get_average_demand_historical(cursor: 'Cursor'):
-    """Retrieving average demand for energy per day over the past month from database"""
-    query = """SELECT AVG(total_demand)
-                FROM demands"""
-
-    cursor.execute(query)
-    result = cursor.fetchone()[0]
-
-    return round(result, 2)
-
-
-def get_total_generation(cursor: 'Cursor', today: str, last_month: str) -> int:
-    """Retrieving total energy generated"""
-
-    query = """SELECT SUM(mw_generated)
-                FROM generations
-                WHERE updated_at BETWEEN %s AND %s"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_total_renewable(cursor: 'Cursor', today: str, last_month: str) -> int:
-    """Retrieving total renewable energy generated"""
-
-    query = """SELECT SUM(mw_generated)
-                FROM generations g
-                JOIN fuel_types ft ON ft.fuel_type_id = g.fuel_type_id
-                JOIN fuel_categories fc ON fc.fuel_category_id = ft.fuel_category_id
-                WHERE g.updated_at BETWEEN %s AND %s
-                AND fc.fuel_category = 'Renewables'"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_average_carbon_intensity(cursor: 'Cursor', today: str, last_month: str) -> float:
-    """Retrieving average carbon emissions over the past month"""
-
-    query = """SELECT AVG(forecast_measure)
-                FROM carbon_intensities
-                WHERE measure_at BETWEEN %s AND %s"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return round(result, 2)
-
-
-def get_region_with_best_avg_carbon_intensity(cursor: 'Cursor', today: str, last_month: str) -> str:
-    """Retrieving region with the least carbon emissions"""
-
-    query = """SELECT region_name, AVG(forecast_measure) AS avg_measure
-                FROM carbon_intensities c
-                JOIN regions r ON r.region_id = c.region_id
-                WHERE measure_at BETWEEN %s AND %s
-                GROUP BY region_name
-                ORDER BY avg_measure ASC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_region_with_worst_avg_carbon_intensity(cursor: 'Cursor',
-                                               today: str,
-                                               last_month: str) -> str:
-    """Retrieving region with the most carbon emissions"""
-
-    query = """SELECT region_name, AVG(forecast_measure) AS avg_measure
-                FROM carbon_intensities c
-                JOIN regions r ON r.region_id = c.region_id
-                WHERE measure_at BETWEEN %s AND %s
-                GROUP BY region_name
-                ORDER BY avg_measure DESC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_hour_with_best_avg_carbon_intensity(cursor: 'Cursor',
-                                            today: str,
-                                            last_month: str) -> datetime:
-    """Retrieving the hour with the least carbon emissions"""
-
-    query = """SELECT EXTRACT(HOUR FROM measure_at) AS hour_of_day,
-                AVG(forecast_measure) AS avg_measure
-                FROM carbon_intensities
-                WHERE measure_at BETWEEN %s AND %s
-                GROUP BY hour_of_day
-                ORDER BY avg_measure ASC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return result
-
-
-def get_hour_with_worst_avg_carbon_intensity(cursor: 'Cursor',
-                                             today: str,
-                                             last_month: str) -> datetime:
-    """Retrieving the hour with the most carbon emissions"""
-
-    query = """SELECT EXTRACT(HOUR FROM measure_at) AS hour_of_day,
-                AVG(forecast_measure) AS avg_measure
-                FROM carbon_intensities
-                WHERE measure_at BETWEEN %s AND %s
-                GROUP BY hour_of_day
-                ORDER BY avg_measure DESC
-                LIMIT 1"""
-
-    cursor.execute(query, (last_month, today))
-    result = cursor.fetchone()[0]
-
-    return result
+def get_rollup_width(today: str, last_month: str) -> str:
+    """Picks the coarsest rollup that still has enough buckets across the report range"""
+    report_length = datetime.strptime(
+        today, DATE_FORMAT) - datetime.strptime(last_month, DATE_FORMAT)
+    for width, bucket in ROLLUP_WIDTHS.items():
+        if report_length / bucket >= MIN_REPORT_BUCKETS:
+            return width
+
+    return list(ROLLUP_WIDTHS)[-1]
+
+
+PRICE_AND_DEMAND_QUERY = """
+    WITH price AS (
+        SELECT SUM(total) / NULLIF(SUM(reading_count), 0) AS average,
+        MAX(maximum) AS highest,
+        (ARRAY_AGG(maximum_at ORDER BY maximum DESC NULLS LAST))[1] AS highest_at,
+        MIN(minimum) AS lowest,
+        (ARRAY_AGG(minimum_at ORDER BY minimum ASC NULLS LAST))[1] AS lowest_at
+        FROM price_rollups
+        WHERE bucket_width = %(width)s::INTERVAL
+        AND bucket_at BETWEEN %(start)s AND %(end)s
+    ), demand AS (
+        SELECT SUM(total)::BIGINT AS total,
+        SUM(total) / NULLIF(SUM(reading_count), 0) AS average,
+        MAX(maximum) AS highest,
+        (ARRAY_AGG(maximum_at ORDER BY maximum DESC NULLS LAST))[1] AS highest_at,
+        MIN(minimum) AS lowest,
+        (ARRAY_AGG(minimum_at ORDER BY minimum ASC NULLS LAST))[1] AS lowest_at
+        FROM demand_rollups
+        WHERE bucket_width = %(width)s::INTERVAL
+        AND bucket_at BETWEEN %(start)s AND %(end)s
+    )
+    SELECT price.average, price.highest, price.highest_at, price.lowest, price.lowest_at,
+    demand.total, demand.average, demand.highest, demand.highest_at,
+    demand.lowest, demand.lowest_at
+    FROM price CROSS JOIN demand"""
+
+GENERATION_QUERY = """
+    SELECT SUM(g.total)::BIGINT AS total_generation,
+    (SUM(g.total) FILTER (WHERE fc.fuel_category = 'Renewables'))::BIGINT AS total_renewable
+    FROM generation_rollups g
+    JOIN fuel_types ft ON ft.fuel_type_id = g.fuel_type_id
+    LEFT JOIN fuel_categories fc ON fc.fuel_category_id = ft.fuel_category_id
+    WHERE g.bucket_width = %(width)s::INTERVAL
+    AND g.bucket_at BETWEEN %(start)s AND %(end)s"""
+
+# Overall, per region and per hour of day averages from hourly rollups in one pass.
+# grouping_set is 3 for the overall row, 1 for region rows and 2 for hour rows.
+CARBON_INTENSITY_QUERY = """
+    SELECT GROUPING(r.region_name, EXTRACT(HOUR FROM c.bucket_at)) AS grouping_set,
+    r.region_name, EXTRACT(HOUR FROM c.bucket_at)::INT AS hour_of_day,
+    SUM(c.total) / NULLIF(SUM(c.reading_count), 0) AS avg_measure
+    FROM carbon_intensity_rollups c
+    JOIN regions r ON r.region_id = c.region_id
+    WHERE c.bucket_width = '1 hour'::INTERVAL
+    AND c.bucket_at BETWEEN %(start)s AND %(end)s
+    GROUP BY GROUPING SETS ((), (r.region_name), (EXTRACT(HOUR FROM c.bucket_at)))"""
+
+
+@dataclass
+class ReportStatistics:  # pylint: disable=too-many-instance-attributes
+    """Every figure shown in the monthly newsletter"""
+    average_price: float
+    highest_price: float
+    highest_price_date: str
+    lowest_price: float
+    lowest_price_date: str
+    total_demand: int
+    average_demand: float
+    highest_demand: int
+    highest_demand_date: str
+    lowest_demand: int
+    lowest_demand_date: str
+    total_generation: int
+    total_renewable: int
+    average_carbon_intensity: float
+    best_region: str
+    worst_region: str
+    best_hour: int
+    worst_hour: int
+
+    @property
+    def renewable_percentage(self) -> float:
+        """Share of generation that came from renewables"""
+        if not self.total_generation:
+            return 0.0
+        return (self.total_renewable or 0) / self.total_generation * 100
+
+    def to_report_data(self) -> dict:
+        """Maps the statistics onto the newsletter template placeholders"""
+        return {
+            "Highest Price": self.highest_price,
+            "Highest Price Date": self.highest_price_date,
+            "Lowest Price": self.lowest_price,
+            "Lowest Price Date": self.lowest_price_date,
+            "Total Demand": self.total_demand,
+            "Avg Daily Demand": self.average_demand,
+            "Highest Demand": self.highest_demand,
+            "Highest Demand Date": self.highest_demand_date,
+            "Lowest Demand": self.lowest_demand,
+            "Lowest Demand Date": self.lowest_demand_date,
+            "Total Generation": self.total_generation,
+            "Total Renewable": self.total_renewable,
+            "Avg Price": self.average_price,
+            "Avg Carbon Intensity": self.average_carbon_intensity,
+            "Best Region": self.best_region,
+            "Worst Region": self.worst_region,
+            "Best Hour": self.best_hour,
+            "Worst Hour": self.worst_hour,
+            "percentage": self.renewable_percentage
+        }
+
+
+def round_measure(value) -> float | None:
+    """Rounds a database numeric to 2dp, leaving missing values as None"""
+    return None if value is None else round(float(value), 2)
+
+
+def format_optional_date(date: datetime | None) -> str | None:
+    """Formats a date that may be missing when there is no data"""
+    return None if date is None else format_dates(date)
+
+
+def rank_carbon_intensities(rows: list[tuple]) -> dict:
+    """Splits the grouped carbon intensity rows into the overall, region and hour figures"""
+    overall = next((row[3] for row in rows if row[0] == 3), None)
+    regions = sorted((row[3], row[1]) for row in rows
+                     if row[0] == 1 and row[3] is not None)
+    hours = sorted((row[3], row[2]) for row in rows
+                   if row[0] == 2 and row[3] is not None)
+
+    return {
+        "average_carbon_intensity": round_measure(overall),
+        "best_region": regions[0][1] if regions else None,
+        "worst_region": regions[-1][1] if regions else None,
+        "best_hour": hours[0][1] if hours else None,
+        "worst_hour": hours[-1][1] if hours else None
+    }
+
+
+def get_price_and_demand_statistics(cursor: 'Cursor', params: dict) -> dict:
+    """Retrieving the price and demand figures for the report range in one query"""
+    cursor.execute(PRICE_AND_DEMAND_QUERY, params)
+    row = cursor.fetchone()
+
+    return {
+        "average_price": round_measure(row[0]),
+        "highest_price": round_measure(row[1]),
+        "highest_price_date": format_optional_date(row[2]),
+        "lowest_price": round_measure(row[3]),
+        "lowest_price_date": format_optional_date(row[4]),
+        "total_demand": row[5],
+        "average_demand": round_measure(row[6]),
+        "highest_demand": row[7],
+        "highest_demand_date": format_optional_date(row[8]),
+        "lowest_demand": row[9],
+        "lowest_demand_date": format_optional_date(row[10])
+    }
+
+
+def get_report_statistics(cursor: 'Cursor', today: str, last_month: str) -> ReportStatistics:
+    """Computes every newsletter statistic for the report range in three grouped queries"""
+    params = {"width": get_rollup_width(today, last_month),
+              "start": last_month, "end": today}
+
+    price_and_demand = get_price_and_demand_statistics(cursor, params)
+
+    cursor.execute(GENERATION_QUERY, params)
+    total_generation, total_renewable = cursor.fetchone()
+
+    cursor.execute(CARBON_INTENSITY_QUERY, params)
+    carbon = rank_carbon_intensities(cursor.fetchall())
+
+    return ReportStatistics(**price_and_demand, total_generation=total_generation,
+                            total_renewable=total_renewable, **carbon)
 
 
 if __name__ == "__main__":
@@ -280,5 +233,4 @@ if __name__ == "__main__":
     date_today, date_last_month = get_dates()
     date_today = format_dates(date_today)
     date_last_month = format_dates(date_last_month)
-    print(get_hour_with_worst_avg_carbon_intensity(
-        curr, date_today, date_last_month))
+    print(get_report_statistics(curr, date_today, date_last_month))
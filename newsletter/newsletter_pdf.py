@@ -48,65 +48,14 @@ def create_report_data():
     date_today = newsletter.format_dates(date_today)
     date_last_month = newsletter.format_dates(date_last_month)
 
-    highest_price, highest_price_date = newsletter.get_highest_price_over_past_month(
-        curr, date_today, date_last_month)
-    lowest_price, lowest_price_date = newsletter.get_lowest_price_over_past_month(
-        curr, date_today, date_last_month)
-    highest_demand, highest_demand_date = newsletter.get_highest_demand(
-        curr, date_today, date_last_month)
-    lowest_demand, lowest_demand_date = newsletter.get_lowest_demand(
-        curr, date_today, date_last_month)
-
-    total_renewable = newsletter.get_total_renewable(
-        curr, date_today, date_last_month)
-
-    total_generation = newsletter.get_total_generation(
-        curr, date_today, date_last_month)
-
-    report_data = {
-        "Highest Price": highest_price,
-        "Highest Price Date": highest_price_date,
-        "Lowest Price": lowest_price,
-        "Lowest Price Date": lowest_price_date,
-        "Total Demand": newsletter.get_total_demand_over_past_month(curr,
-                                                                    date_today,
-                                                                    date_last_month),
-        "Avg Daily Demand": newsletter.get_average_demand_per_day_over_past_month(curr,
-                                                                                  date_today,
-                                                                                  date_last_month),
-        "Highest Demand": highest_demand,
-        "Highest Demand Date": highest_demand_date,
-        "Lowest Demand": lowest_demand,
-        "Lowest Demand Date": lowest_demand_date,
-        "Total Generation": newsletter.get_total_generation(curr,
-                                                            date_today,
-                                                            date_last_month),
-        "Total Renewable": newsletter.get_total_renewable(curr,
-                                                          date_today,
-                                                          date_last_month),
-        "Avg Price": newsletter.get_average_price_over_past_month(curr,
-                                                                  date_today,
-                                                                  date_last_month),
-        "Avg Carbon Intensity": newsletter.get_average_carbon_intensity(curr,
-                                                                        date_today,
-                                                                        date_last_month),
-        "Best Region": newsletter.get_region_with_best_avg_carbon_intensity(curr,
-                                                                            date_today,
-                                                                            date_last_month),
-        "Worst Region": newsletter.get_region_with_worst_avg_carbon_intensity(curr,
-                                                                              date_today,
-                                                                              date_last_month),
-        "Best Hour": newsletter.get_hour_with_best_avg_carbon_intensity(curr,
-                                                                        date_today,
-                                                                        date_last_month),
-        "Worst Hour": newsletter.get_hour_with_worst_avg_carbon_intensity(curr,
-                                                                          date_today,
-                                                                          date_last_month),
-        "percentage": (total_renewable / total_generation) * 100
-    }
-
-    return report_data
+    try:
+        statistics = newsletter.get_report_statistics(
+            curr, date_today, date_last_month)
+    finally:
+        curr.close()
+        db_connection.close()
 
+    return statistics.to_report_data()
 
 if __name__ == "__main__":
     load_dotenv()
@@ -1,10 +1,20 @@
 """Script that sends an email with the report as an attachment"""
 import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
+from rate_limiter import RateLimiter
+
+SES_REGION = "eu-west-2"
+MAX_WORKERS = 10
+# Used if the account's SES quota can't be read
+DEFAULT_SEND_RATE = 1
 
 
 def generate_email_body(user_name: str) -> str:
@@ -18,41 +28,86 @@ Your favourite energy team,
 WattWatch"""
 
 
-def send_email_with_attachment(filename: str, recipient_email: str, user_name: str):
-    """Send email with the attached PDF report."""
-    client = boto3.client(
+def create_ses_client(max_workers: int = MAX_WORKERS):
+    """Create one SES client with enough pooled connections for every worker"""
+    return boto3.client(
         "ses",
-        region_name="eu-west-2"
+        region_name=SES_REGION,
+        config=Config(max_pool_connections=max_workers,
+                      retries={"max_attempts": 5, "mode": "standard"})
     )
 
+
+def get_max_send_rate(client) -> float:
+    """Read the maximum number of emails per second SES allows this account"""
+    try:
+        return client.get_send_quota()["MaxSendRate"] or DEFAULT_SEND_RATE
+    except (BotoCoreError, ClientError) as e:
+        logging.warning("Could not read SES send quota, using %s/s: %s",
+                        DEFAULT_SEND_RATE, e)
+        return DEFAULT_SEND_RATE
+
+
+def build_attachment(filename: str) -> MIMEApplication:
+    """Read and encode the PDF attachment once so every message can share it"""
+    with open(filename, 'rb') as attachment_file:
+        attachment = MIMEApplication(attachment_file.read())
+    attachment.add_header('Content-Disposition', 'attachment',
+                          filename=os.path.basename(filename))
+    return attachment
+
+
+def build_raw_message(attachment: MIMEApplication, recipient_email: str,
+                      user_name: str) -> str:
+    """Build the raw MIME message for one recipient around the shared attachment"""
     message = MIMEMultipart()
     message["Subject"] = "Monthly Energy Report"
     message["From"] = os.getenv("SENDER_EMAIL")
     message["To"] = recipient_email
+    message.attach(MIMEText(generate_email_body(user_name), "plain"))
+    message.attach(attachment)
+    return message.as_string()
 
-    email_body = generate_email_body(user_name)
-    message.attach(MIMEText(email_body, "plain"))
 
-    with open(filename, 'rb') as attachment_file:
-        attachment = MIMEApplication(attachment_file.read())
-        attachment.add_header('Content-Disposition',
-                              'attachment', filename=filename)
-        message.attach(attachment)
+def send_one(client, rate_limiter: RateLimiter, attachment: MIMEApplication,
+             user: tuple) -> str:
+    """Send the report to one (name, email) user once the rate limiter allows it"""
+    name, email = user
+    raw_message = build_raw_message(attachment, email, name)
+    rate_limiter.wait()
+    response = client.send_raw_email(
+        Source=os.getenv("SENDER_EMAIL"),
+        Destinations=[email],
+        RawMessage={'Data': raw_message}
+    )
+    return response['MessageId']
 
-    try:
-        response = client.send_raw_email(
-            Source=os.getenv("SENDER_EMAIL"),
-            Destinations=[recipient_email],
-            RawMessage={
-                'Data': message.as_string()
-            }
-        )
-        print(f"Email sent! Message ID: {response['MessageId']}")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+
+def deliver_batch(users: list[tuple], client, rate_limiter: RateLimiter,
+                  attachment: MIMEApplication, max_workers: int = MAX_WORKERS) -> dict:
+    """Send the report to a batch of (name, email) users concurrently, returning the
+    message id for each sent email and the error for each failed one"""
+    # Users subscribed to several regions only get the report once
+    unique_users = {email: (name, email) for name, email in users}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {email: executor.submit(send_one, client, rate_limiter, attachment, user)
+                   for email, user in unique_users.items()}
+
+    results = {"sent": {}, "failed": {}}
+    for email, future in futures.items():
+        try:
+            results["sent"][email] = future.result()
+        except (BotoCoreError, ClientError) as e:
+            logging.error("Failed to send email to %s: %s", email, e)
+            results["failed"][email] = str(e)
+
+    logging.info("Sent %s emails, %s failed",
+                 len(results["sent"]), len(results["failed"]))
+    return results
 
 
 if __name__ == "__main__":
     load_dotenv()
-    send_email_with_attachment(
-        "monthly_report.pdf", "example@email.com", "User")
+    ses_client = create_ses_client()
+    print(send_one(ses_client, RateLimiter(get_max_send_rate(ses_client)),
+                   build_attachment("monthly_report.pdf"), ("User", "example@email.com")))
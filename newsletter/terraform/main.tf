@@ -50,12 +50,23 @@ data "aws_iam_policy_document" "lambda-ses-policy" {
     effect = "Allow"
     actions = [
       "ses:SendEmail",
-      "ses:SendRawEmail"
+      "ses:SendRawEmail",
+      "ses:GetSendQuota"
     ]
     resources = ["*"]
   }
 }
 
+data "aws_iam_policy_document" "lambda-invoke-self-policy" {
+  statement {
+    effect = "Allow"
+    actions = [
+      "lambda:InvokeFunction"
+    ]
+    resources = ["arn:aws:lambda:*:*:function:c16-energy-send-email-lambda"]
+  }
+}
+
 
 resource "aws_iam_role" "energy-send-email-lambda-iam" {
   name               = "c16-energy-send-email-lambda-iam"
@@ -74,6 +85,12 @@ resource "aws_iam_role_policy" "lambda-ses-policy" {
   policy = data.aws_iam_policy_document.lambda-ses-policy.json
 }
 
+resource "aws_iam_role_policy" "lambda-invoke-self-policy" {
+  name   = "lambda-invoke-self"
+  role   = aws_iam_role.energy-send-email-lambda-iam.id
+  policy = data.aws_iam_policy_document.lambda-invoke-self-policy.json
+}
+
 resource "aws_lambda_function" "energy-send-email-lambda" {
   function_name = "c16-energy-send-email-lambda"
   image_uri = data.aws_ecr_image.send-email-image.image_uri
@@ -0,0 +1,53 @@
+# pylint: skip-file
+import pytest
+from datetime import date
+from unittest.mock import MagicMock, patch
+from newsletter.delivery_ledger import (get_report_month, enqueue_deliveries, claim_batch,
+                                        record_results, MAX_ATTEMPTS)
+
+
+@pytest.fixture
+def mock_conn():
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = MagicMock()
+    return conn
+
+
+def test_get_report_month():
+    assert get_report_month(date(2025, 4, 15)) == date(2025, 4, 1)
+
+
+def test_enqueue_deliveries_is_idempotent(mock_conn):
+    cursor = mock_conn.cursor.return_value.__enter__.return_value
+    cursor.rowcount = 3
+
+    assert enqueue_deliveries(mock_conn, date(2025, 4, 1)) == 3
+    query, params = cursor.execute.call_args.args
+    assert "ON CONFLICT (report_month, user_id) DO NOTHING" in query
+    assert params == (date(2025, 4, 1),)
+    mock_conn.commit.assert_called_once()
+
+
+def test_claim_batch_skips_locked_rows(mock_conn):
+    cursor = mock_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(1, "A", "a@fake.com")]
+
+    assert claim_batch(mock_conn, date(2025, 4, 1), batch_size=10) == [(1, "A", "a@fake.com")]
+    query, params = cursor.execute.call_args.args
+    assert "FOR UPDATE SKIP LOCKED" in query
+    assert params[1] == MAX_ATTEMPTS
+    assert params[-1] == 10
+    mock_conn.commit.assert_called_once()
+
+
+@patch("newsletter.delivery_ledger.psycopg2.extras.execute_values")
+def test_record_results(mock_execute_values, mock_conn):
+    batch = [(1, "A", "a@fake.com"), (2, "B", "b@fake.com"), (3, "C", "c@fake.com")]
+    results = {"sent": {"a@fake.com": "id-1"}, "failed": {"b@fake.com": "Rejected"}}
+
+    record_results(mock_conn, batch, results)
+
+    sent_call, failed_call = mock_execute_values.call_args_list
+    assert sent_call.args[2] == [(1, "id-1")]
+    assert failed_call.args[2] == [(2, "Rejected"), (3, "Not sent")]
+    mock_conn.commit.assert_called_once()
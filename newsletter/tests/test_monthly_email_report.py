@@ -0,0 +1,123 @@
+# pylint: skip-file
+import json
+import pytest
+from datetime import date
+from email.mime.application import MIMEApplication
+from unittest.mock import MagicMock, patch
+from newsletter.monthly_email_report import (dispatch_deliveries, has_time_left, lambda_handler,
+                                             invoke_worker)
+
+
+class StubSES:
+    """Records sends instead of calling SES"""
+
+    def __init__(self):
+        self.sent = []
+
+    def get_send_quota(self):
+        return {"MaxSendRate": 1000}
+
+    def send_raw_email(self, Source, Destinations, RawMessage):
+        self.sent.extend(Destinations)
+        return {"MessageId": f"id-{Destinations[0]}"}
+
+
+@pytest.fixture
+def ledger():
+    batches = [[(1, "A", "a@fake.com"), (2, "B", "b@fake.com")], [(3, "C", "c@fake.com")], []]
+    with patch("newsletter.monthly_email_report.claim_batch", side_effect=batches) as claim, \
+            patch("newsletter.monthly_email_report.record_results") as record, \
+            patch("newsletter.monthly_email_report.count_outstanding", return_value=0), \
+            patch("newsletter.monthly_email_report.build_attachment",
+                  return_value=MIMEApplication(b"pdf")):
+        yield claim, record
+
+
+def test_dispatch_deliveries_sends_every_batch(ledger):
+    claim, record = ledger
+    ses = StubSES()
+
+    summary = dispatch_deliveries(MagicMock(), date(2025, 4, 1), "report.pdf", client=ses)
+
+    assert sorted(ses.sent) == ["a@fake.com", "b@fake.com", "c@fake.com"]
+    assert summary == {"sent": 3, "failed": {}, "finished": True, "outstanding": 0}
+    assert claim.call_count == 3
+    assert record.call_count == 2
+
+
+def test_dispatch_deliveries_stops_when_out_of_time(ledger):
+    claim, record = ledger
+    context = MagicMock()
+    context.get_remaining_time_in_millis.side_effect = [60000, 1000]
+
+    summary = dispatch_deliveries(MagicMock(), date(2025, 4, 1), "report.pdf",
+                                  context=context, client=StubSES())
+
+    assert summary["sent"] == 2
+    assert summary["finished"] is False
+    claim.assert_called_once()
+
+
+@patch("newsletter.monthly_email_report.RateLimiter")
+def test_dispatch_deliveries_shares_send_rate_between_workers(mock_limiter, ledger):
+    dispatch_deliveries(MagicMock(), date(2025, 4, 1), "report.pdf", client=StubSES(),
+                        workers=4)
+
+    mock_limiter.assert_called_once_with(250)
+
+
+def test_has_time_left_without_lambda_context():
+    assert has_time_left({}) is True
+
+
+@patch("newsletter.monthly_email_report.invoke_worker")
+@patch("newsletter.monthly_email_report.dispatch_deliveries")
+@patch("newsletter.monthly_email_report.create_pdf_report")
+@patch("newsletter.monthly_email_report.create_report_data")
+@patch("newsletter.monthly_email_report.enqueue_deliveries")
+@patch("newsletter.monthly_email_report.get_connection_to_db")
+def test_lambda_handler_hands_over_unfinished_work(mock_get_connection, mock_enqueue,
+                                                   mock_report, mock_pdf, mock_dispatch,
+                                                   mock_invoke_worker):
+    mock_dispatch.return_value = {"sent": 2, "failed": {}, "finished": False,
+                                  "outstanding": 5}
+    context = MagicMock()
+
+    result = lambda_handler({"report_month": "2025-04-01", "workers": 2}, context)
+
+    assert result["statusCode"] == 200
+    mock_enqueue.assert_called_once_with(mock_get_connection.return_value, date(2025, 4, 1))
+    assert mock_invoke_worker.call_count == 2
+    mock_invoke_worker.assert_called_with(context, date(2025, 4, 1), 2,
+                                          mock_report.return_value)
+    assert mock_dispatch.call_args.kwargs["workers"] == 2
+
+
+@patch("newsletter.monthly_email_report.dispatch_deliveries")
+@patch("newsletter.monthly_email_report.create_pdf_report")
+@patch("newsletter.monthly_email_report.create_report_data")
+@patch("newsletter.monthly_email_report.enqueue_deliveries")
+@patch("newsletter.monthly_email_report.get_connection_to_db")
+def test_lambda_handler_worker_skips_enqueue(mock_get_connection, mock_enqueue, mock_report,
+                                            mock_pdf, mock_dispatch):
+    mock_dispatch.return_value = {"sent": 1, "failed": {}, "finished": True, "outstanding": 0}
+
+    lambda_handler({"report_month": "2025-04-01", "worker": True, "workers": 3,
+                    "report_data": {"Avg Price": 80.5}}, {})
+
+    mock_enqueue.assert_not_called()
+    mock_report.assert_not_called()
+    mock_pdf.assert_called_once_with({"Avg Price": 80.5}, "/tmp/monthly_report.pdf",
+                                     "newsletter.html")
+    assert mock_dispatch.call_args.kwargs["workers"] == 3
+
+
+@patch("newsletter.monthly_email_report.boto3.client")
+def test_invoke_worker_passes_workers_and_report_data(mock_client):
+    context = MagicMock(function_name="send-email")
+
+    invoke_worker(context, date(2025, 4, 1), 3, {"Avg Price": 80.5})
+
+    payload = json.loads(mock_client.return_value.invoke.call_args.kwargs["Payload"])
+    assert payload == {"report_month": "2025-04-01", "worker": True, "workers": 3,
+                       "report_data": {"Avg Price": 80.5}}
@@ -4,21 +4,9 @@ from unittest.mock import MagicMock
 from datetime import datetime
 from newsletter.newsletter import (
     format_dates,
-    get_average_price_over_past_month,
-    get_highest_price_over_past_month,
-    get_lowest_price_over_past_month,
-    get_total_demand_over_past_month,
-    get_average_demand_per_day_over_past_month,
-    get_highest_demand,
-    get_lowest_demand,
-    get_average_demand_historical,
-    get_total_generation,
-    get_total_renewable,
-    get_average_carbon_intensity,
-    get_region_with_best_avg_carbon_intensity,
-    get_region_with_worst_avg_carbon_intensity,
-    get_hour_with_best_avg_carbon_intensity,
-    get_hour_with_worst_avg_carbon_intensity,
+    get_rollup_width,
+    get_report_statistics,
+    rank_carbon_intensities,
 )
 
 
@@ -38,96 +26,66 @@ def test_format_dates():
     assert format_dates(date) == "2024-01-05 13:45:12"
 
 
-def test_get_average_price_over_past_month(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [105.5267]
-    result = get_average_price_over_past_month(mock_cursor, *date_range)
-    assert result == 105.53
-
-
-def test_get_highest_price_over_past_month(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [
-        234.9, datetime(2025, 4, 10, 12, 0, 0)]
-    result = get_highest_price_over_past_month(mock_cursor, *date_range)
-    assert result[0] == 234.9
-    assert isinstance(result[1], str)
-
-
-def test_get_lowest_price_over_past_month(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [
-        80.123, datetime(2025, 4, 10, 12, 0, 0)]
-    price, date = get_lowest_price_over_past_month(mock_cursor, *date_range)
-    assert price == "80.123"
-    assert isinstance(date, str)
-
-
-def test_get_total_demand_over_past_month(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [9387432]
-    assert get_total_demand_over_past_month(
-        mock_cursor, *date_range) == 9387432
-
-
-def test_get_average_demand_per_day_over_past_month(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [158203.567]
-    result = get_average_demand_per_day_over_past_month(
-        mock_cursor, *date_range)
-    assert result == 158203.57
-
-
-def test_get_highest_demand(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [
-        45230, datetime(2025, 4, 10, 12, 0, 0)]
-    result = get_highest_demand(mock_cursor, *date_range)
-    assert result[0] == 45230
-    assert isinstance(result[1], str)
-
-
-def test_get_lowest_demand(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [
-        12000, datetime(2025, 4, 10, 12, 0, 0)]
-    result = get_lowest_demand(mock_cursor, *date_range)
-    assert result[0] == 12000
-    assert isinstance(result[1], str)
-
-
-def test_get_average_demand_historical(mock_cursor):
-    mock_cursor.fetchone.return_value = [123456.789]
-    assert get_average_demand_historical(mock_cursor) == 123456.79
-
-
-def test_get_total_generation(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [23400000]
-    assert get_total_generation(mock_cursor, *date_range) == 23400000
-
-
-def test_get_total_renewable(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [15400000]
-    assert get_total_renewable(mock_cursor, *date_range) == 15400000
-
-
-def test_get_average_carbon_intensity(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [148.98]
-    assert get_average_carbon_intensity(mock_cursor, *date_range) == 148.98
-
-
-def test_get_region_with_best_avg_carbon_intensity(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = ["Scotland"]
-    assert get_region_with_best_avg_carbon_intensity(
-        mock_cursor, *date_range) == "Scotland"
-
-
-def test_get_region_with_worst_avg_carbon_intensity(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = ["London"]
-    assert get_region_with_worst_avg_carbon_intensity(
-        mock_cursor, *date_range) == "London"
-
-
-def test_get_hour_with_best_avg_carbon_intensity(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [3]
-    assert get_hour_with_best_avg_carbon_intensity(
-        mock_cursor, *date_range) == 3
-
-
-def test_get_hour_with_worst_avg_carbon_intensity(mock_cursor, date_range):
-    mock_cursor.fetchone.return_value = [17]
-    assert get_hour_with_worst_avg_carbon_intensity(
-        mock_cursor, *date_range) == 17
+def test_get_rollup_width_for_monthly_report(date_range):
+    assert get_rollup_width(*date_range) == "1 hour"
+    assert get_rollup_width("2025-04-15 12:00:00", "2025-04-15 00:00:00") == "30 minutes"
+
+
+def test_monthly_queries_read_rollups(mock_cursor, date_range):
+    mock_cursor.fetchone.side_effect = [(None,) * 11, (None, None)]
+    mock_cursor.fetchall.return_value = []
+    get_report_statistics(mock_cursor, *date_range)
+
+    query, params = mock_cursor.execute.call_args_list[0].args
+    assert "FROM price_rollups" in query
+    assert params == {"width": "1 hour", "start": "2025-03-15 00:00:00",
+                      "end": "2025-04-15 00:00:00"}
+
+
+def test_rank_carbon_intensities():
+    rows = [
+        (3, None, None, 150.456),
+        (1, "North", None, 120),
+        (1, "South", None, 200),
+        (2, None, 2, 90),
+        (2, None, 18, 210),
+    ]
+    assert rank_carbon_intensities(rows) == {
+        "average_carbon_intensity": 150.46,
+        "best_region": "North",
+        "worst_region": "South",
+        "best_hour": 2,
+        "worst_hour": 18
+    }
+
+
+def test_get_report_statistics(mock_cursor, date_range):
+    mock_cursor.fetchone.side_effect = [
+        (87.456, 234.9, datetime(2025, 4, 10, 12), 50.25, datetime(2025, 3, 18, 3),
+         450000, 15000.123, 60000, datetime(2025, 3, 20, 15), 10000, datetime(2025, 3, 25, 4)),
+        (480000, 200000)
+    ]
+    mock_cursor.fetchall.return_value = [(3, None, None, 150), (1, "North", None, 120),
+                                         (2, None, 2, 90)]
+
+    statistics = get_report_statistics(mock_cursor, *date_range)
+
+    assert mock_cursor.execute.call_count == 3
+    assert statistics.average_price == 87.46
+    assert statistics.highest_price_date == "2025-04-10 12:00:00"
+    assert statistics.average_demand == 15000.12
+    assert statistics.best_region == statistics.worst_region == "North"
+    report_data = statistics.to_report_data()
+    assert report_data["Total Demand"] == 450000
+    assert round(report_data["percentage"], 2) == 41.67
+
+
+def test_get_report_statistics_without_data(mock_cursor, date_range):
+    mock_cursor.fetchone.side_effect = [(None,) * 11, (None, None)]
+    mock_cursor.fetchall.return_value = [(3, None, None, None)]
+
+    statistics = get_report_statistics(mock_cursor, *date_range)
+
+    assert statistics.average_price is None
+    assert statistics.best_hour is None
+    assert statistics.renewable_percentage == 0.0
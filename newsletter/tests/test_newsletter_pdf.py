@@ -64,32 +64,15 @@ def test_create_pdf_report():
 
 @patch("newsletter.newsletter_pdf.newsletter")
 def test_create_report_data(mock_newsletter):
-    mock_conn = MagicMock()
-    mock_newsletter.get_connection_to_db.return_value.cursor.return_value = mock_conn
+    mock_conn = mock_newsletter.get_connection_to_db.return_value
     mock_newsletter.get_dates.return_value = (
         "2025-04-15 00:00:00", "2025-03-15 00:00:00")
     mock_newsletter.format_dates.side_effect = lambda x: x
-
-    mock_newsletter.get_highest_price_over_past_month.return_value = (
-        120.5, "2025-04-12 13:00:00")
-    mock_newsletter.get_lowest_price_over_past_month.return_value = (
-        50.25, "2025-03-18 03:00:00")
-    mock_newsletter.get_total_demand_over_past_month.return_value = 450000
-    mock_newsletter.get_average_demand_per_day_over_past_month.return_value = 15000
-    mock_newsletter.get_highest_demand.return_value = (
-        60000, "2025-03-20 15:00:00")
-    mock_newsletter.get_lowest_demand.return_value = (
-        10000, "2025-03-25 04:00:00")
-    mock_newsletter.get_total_generation.return_value = 480000
-    mock_newsletter.get_total_renewable.return_value = 200000
-    mock_newsletter.get_average_price_over_past_month.return_value = 87.45
-    mock_newsletter.get_average_carbon_intensity.return_value = 150
-    mock_newsletter.get_region_with_best_avg_carbon_intensity.return_value = "North"
-    mock_newsletter.get_region_with_worst_avg_carbon_intensity.return_value = "South"
-    mock_newsletter.get_hour_with_best_avg_carbon_intensity.return_value = "02:00"
-    mock_newsletter.get_hour_with_worst_avg_carbon_intensity.return_value = "18:00"
+    mock_newsletter.get_report_statistics.return_value.to_report_data.return_value = sample_data
 
     data = create_report_data()
-    assert data["Highest Price"] == 120.5
-    assert data["Total Demand"] == 450000
-    assert round(data["percentage"], 2) == round((200000 / 480000) * 100, 2)
+
+    assert data == sample_data
+    mock_newsletter.get_report_statistics.assert_called_once_with(
+        mock_conn.cursor.return_value, "2025-04-15 00:00:00", "2025-03-15 00:00:00")
+    mock_conn.close.assert_called_once()
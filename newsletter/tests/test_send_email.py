@@ -1,7 +1,11 @@
 # pylint: skip-file
 import pytest
-from unittest.mock import patch, mock_open, MagicMock
-from newsletter.send_email import send_email_with_attachment, generate_email_body
+from unittest.mock import patch, MagicMock
+from email.mime.application import MIMEApplication
+from botocore.exceptions import ClientError
+from newsletter.send_email import (generate_email_body, deliver_batch, get_max_send_rate,
+                                   build_raw_message, DEFAULT_SEND_RATE)
+from newsletter.rate_limiter import RateLimiter
 
 
 def test_generate_email_body():
@@ -15,31 +19,50 @@ WattWatch"""
     assert generate_email_body("FAKE") == email
 
 
-@patch("builtins.open", new_callable=mock_open, read_data=b"fake-pdf-content")
-@patch("boto3.client")
-def test_send_email_success(mock_boto_client, mock_file):
+def test_deliver_batch_records_each_recipient():
     mock_ses = MagicMock()
-    mock_ses.send_raw_email.return_value = {"MessageId": "1234"}
-    mock_boto_client.return_value = mock_ses
 
+    def send_raw_email(Destinations, **kwargs):
+        if Destinations == ["bad@fake.com"]:
+            raise ClientError({"Error": {"Code": "MessageRejected", "Message": "Nope"}},
+                              "SendRawEmail")
+        return {"MessageId": f"id-{Destinations[0]}"}
+    mock_ses.send_raw_email.side_effect = send_raw_email
+
+    users = [("A", "a@fake.com"), ("B", "bad@fake.com"), ("A", "a@fake.com")]
     with patch.dict("os.environ", {"SENDER_EMAIL": "fakeboss@fake.com"}):
-        send_email_with_attachment(
-            "report.pdf", "fakeunderling@fake.com", "FAKE")
+        results = deliver_batch(users, mock_ses, RateLimiter(1000),
+                                MIMEApplication(b"fake-pdf-content"), max_workers=2)
 
-    mock_boto_client.assert_called_once_with("ses", region_name="eu-west-2")
-    mock_file.assert_called_once_with("report.pdf", "rb")
-    mock_ses.send_raw_email.assert_called_once()
+    assert results["sent"] == {"a@fake.com": "id-a@fake.com"}
+    assert set(results["failed"]) == {"bad@fake.com"}
+    assert mock_ses.send_raw_email.call_count == 2
 
 
-@patch("builtins.open", new_callable=mock_open, read_data=b"fake-pdf-content")
-@patch("boto3.client")
-def test_send_email_failure(mock_boto_client, mock_file, capsys):
+def test_get_max_send_rate_falls_back_on_error():
     mock_ses = MagicMock()
-    mock_ses.send_raw_email.side_effect = Exception("SES is down")
-    mock_boto_client.return_value = mock_ses
+    mock_ses.get_send_quota.side_effect = ClientError(
+        {"Error": {"Code": "AccessDenied", "Message": "Nope"}}, "GetSendQuota")
 
-    with patch.dict("os.environ", {"SENDER_EMAIL": "fakeboss@fake.com"}):
-        send_email_with_attachment("report.pdf", "fake@fakemail.com", "FAKE")
+    assert get_max_send_rate(mock_ses) == DEFAULT_SEND_RATE
+
+
+def test_build_raw_message_includes_shared_attachment():
+    attachment = MIMEApplication(b"fake-pdf-content")
+    attachment.add_header("Content-Disposition", "attachment", filename="report.pdf")
+
+    raw_message = build_raw_message(attachment, "fake@fake.com", "FAKE")
+
+    assert "To: fake@fake.com" in raw_message
+    assert 'filename="report.pdf"' in raw_message
+    assert "Dear FAKE" in raw_message
+
+
+@patch("newsletter.rate_limiter.time.sleep")
+@patch("newsletter.rate_limiter.time.monotonic", return_value=100.0)
+def test_rate_limiter_spaces_calls(mock_monotonic, mock_sleep):
+    limiter = RateLimiter(2)
+    limiter.wait()
+    limiter.wait()
 
-    captured = capsys.readouterr()
-    assert "Failed to send email: SES is down" in captured.out
+    mock_sleep.assert_called_once_with(0.5)
@@ -0,0 +1,137 @@
+"""Headless Chrome browsers shared by the outage scrapers for a whole ETL run"""
+import os
+import logging
+import queue
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH', '/usr/bin/chromedriver')
+# Browsers started per run, each with its own driver, so this many scrapers can run at once.
+# Each headless Chrome needs a few hundred MB of the task's memory
+BROWSER_COUNT = max(int(os.getenv('BROWSER_COUNT', '1')), 1)
+PAGE_LOAD_TIMEOUT = 30
+CHROME_ARGUMENTS = ('--headless', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu',
+                    '--blink-settings=imagesEnabled=false')
+# Requests the scrapers never need: images, fonts and third-party tracking scripts
+BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*', '*youtube.com*'
+]
+
+logger = logging.getLogger(__name__)
+
+
+def create_chrome_options() -> Options:
+    """Chrome options for a headless browser that doesn't download images"""
+    chrome_options = Options()
+    for argument in CHROME_ARGUMENTS:
+        chrome_options.add_argument(argument)
+    chrome_options.add_experimental_option(
+        'prefs', {'profile.managed_default_content_settings.images': 2})
+    return chrome_options
+
+
+def block_resources(driver) -> None:
+    """Stop the current tab loading any of the BLOCKED_URLS"""
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+    except WebDriverException as e:
+        logger.warning("Could not block page resources: %s", e)
+
+
+class Browser:
+    """One headless Chrome, started on first use and restarted after it crashes"""
+
+    def __init__(self):
+        self.driver = None
+        self.home_window = None
+
+    def start(self):
+        """Start Chrome if it isn't already running, returning its driver"""
+        if self.driver is None:
+            logger.info("Starting headless Chrome")
+            self.driver = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH),
+                                           options=create_chrome_options())
+            self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+            self.home_window = self.driver.current_window_handle
+        return self.driver
+
+    @contextmanager
+    def tab(self):
+        """Hand out the browser in a new tab, closing the tab afterwards. If the browser
+        fails while closing it, it is shut down and started again for the next tab"""
+        driver = self.start()
+        driver.switch_to.new_window('tab')
+        block_resources(driver)
+        try:
+            yield driver
+        finally:
+            try:
+                driver.close()
+                driver.switch_to.window(self.home_window)
+            except WebDriverException as e:
+                logger.warning("Browser failed, restarting it for the next tab: %s", e)
+                self.quit()
+
+    def quit(self) -> None:
+        """Shut Chrome down, if it was started"""
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except WebDriverException as e:
+            logger.warning("Error shutting down Chrome: %s", e)
+        self.driver = None
+        self.home_window = None
+
+
+class BrowserPool:
+    """Headless Chromes for the whole run, each started on first use, handing each scraper
+    a fresh tab in a free one. WebDriver sends every command through one session, so
+    scrapers wait for a browser when all of them are in use"""
+
+    def __init__(self, size: int = None):
+        self.size = BROWSER_COUNT if size is None else max(size, 1)
+        self.browsers = [Browser() for _ in range(self.size)]
+        self.idle = queue.LifoQueue()
+        for browser in self.browsers:
+            self.idle.put(browser)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.quit()
+
+    @contextmanager
+    def tab(self):
+        """Hand out a new tab in the first free browser, preferring one already started,
+        and free the browser once the tab is closed"""
+        browser = self.idle.get()
+        try:
+            with browser.tab() as driver:
+                yield driver
+        finally:
+            self.idle.put(browser)
+
+    def quit(self) -> None:
+        """Shut down every browser that was started"""
+        for browser in self.browsers:
+            browser.quit()
+
+
+@contextmanager
+def browser_tab(browsers: BrowserPool = None):
+    """A tab from the run's browser pool, or from a browser started just for the caller"""
+    if browsers is not None:
+        with browsers.tab() as driver:
+            yield driver
+    else:
+        with BrowserPool() as own_browsers, own_browsers.tab() as driver:
+            yield driver
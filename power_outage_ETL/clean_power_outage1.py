@@ -1,24 +1,136 @@
 # pylint: disable=C0301
 '''Modules required to clean the ectracted power outage details and upload to a cleaned CSV'''
 import os
+import re
+import json
+import hashlib
 import logging
 import pandas as pd
 import numpy as np
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+CLEAN_CSV = 'clean_power_outage_data.csv'
+CLEAN_COLUMNS = ['reference_id', 'outage_start', 'outage_end', 'Provider_name', 'planned',
+                 'postcodes', 'content_hash']
+# Fields of an outage that providers update, e.g. a new estimated restoration time
+HASHED_COLUMNS = ['reference_id', 'outage_start', 'outage_end', 'planned', 'postcodes']
+# Content hash of each extracted CSV when it was last cleaned
+CLEAN_STATE_FILE = CLEAN_CSV + '.cleaned'
+# Postcodes in the clean CSV are joined with this, as they can contain spaces and commas
+POSTCODE_SEPARATOR = ';'
+POSTCODE_SPLIT_PATTERN = re.compile(r'[,;|/\n]+')
+FULL_POSTCODE_PATTERN = re.compile(r'([A-Z]{1,2}[0-9][A-Z0-9]?) ?([0-9][A-Z]{2})')
+SECTOR_PATTERN = re.compile(r'([A-Z]{1,2}[0-9][A-Z0-9]?) ([0-9])')
+DISTRICT_PATTERN = re.compile(r'[A-Z]{1,2}[0-9][A-Z0-9]?')
+
+
+def normalise_postcode(postcode: str) -> str:
+    '''Formats a postcode, sector or district as upper case with a single space,
+    e.g. 'e17db' -> 'E1 7DB', 'e1 7' -> 'E1 7'. Returns '' if it isn't one'''
+    postcode = ' '.join(postcode.upper().split())
+
+    full = FULL_POSTCODE_PATTERN.fullmatch(postcode)
+    if full:
+        return ' '.join(full.groups())
+    sector = SECTOR_PATTERN.fullmatch(postcode)
+    if sector:
+        return ' '.join(sector.groups())
+    if DISTRICT_PATTERN.fullmatch(postcode):
+        return postcode
+    return ''
+
+
+def normalise_postcodes(postcodes) -> str:
+    '''Splits a provider's list of affected postcodes into unique normalised postcodes,
+    joined by POSTCODE_SEPARATOR'''
+    if not isinstance(postcodes, str):
+        return ''
+
+    normalised = []
+    for part in POSTCODE_SPLIT_PATTERN.split(postcodes):
+        postcode = normalise_postcode(part)
+        if postcode:
+            normalised.append(postcode)
+        else:
+            normalised.extend(' '.join(match) for match in
+                              FULL_POSTCODE_PATTERN.findall(part.upper()))
+
+    return POSTCODE_SEPARATOR.join(dict.fromkeys(normalised))
+
+
+def clean_postcodes(postcodes) -> pd.Series:
+    '''Normalises a column of affected postcodes, if the provider has one'''
+    if postcodes is None:
+        return np.nan
+    return postcodes.apply(normalise_postcodes)
+
+
+def hash_outages(df: pd.DataFrame) -> pd.Series:
+    '''Hashes the fields of each cleaned outage that can change, so only outages that are
+    new or have changed are appended and loaded'''
+    return pd.Series([hashlib.md5('|'.join(map(str, row)).encode('utf-8'),
+                                  usedforsecurity=False).hexdigest()
+                      for row in df[HASHED_COLUMNS].itertuples(index=False)],
+                     index=df.index, dtype=object)
+
 
 def create_empty_clean_csv():
     '''Creates csv file to add cleaned data'''
 
-    if not os.path.exists('clean_power_outage_data.csv'):
+    if not os.path.exists(CLEAN_CSV):
         logging.info("Creating empty clean CSV as it doesn't exist.")
-        empty_df = pd.DataFrame(
-            columns=['reference_id', 'outage_start', 'outage_end', 'Provider_name', 'planned'])
-        empty_df.to_csv('clean_power_outage_data.csv', index=False)
+        empty_df = pd.DataFrame(columns=CLEAN_COLUMNS)
+        empty_df.to_csv(CLEAN_CSV, index=False)
+        if os.path.exists(CLEAN_STATE_FILE):
+            os.remove(CLEAN_STATE_FILE)
         logging.info("Empty clean CSV created.")
     else:
         logging.info("Clean CSV already exists.")
+        existing_df = pd.read_csv(CLEAN_CSV)
+        if 'content_hash' not in existing_df.columns:
+            # Rewriting the CSV changes the bytes the load's etl_load_state offset was
+            # hashed over, so the next load reads it from the start
+            logging.info("Adding content hashes to the clean CSV.")
+            existing_df.reindex(columns=CLEAN_COLUMNS).to_csv(CLEAN_CSV, index=False)
+
+
+def file_hash(filename: str) -> str:
+    '''Hashes the contents of an extracted CSV, or returns '' if it can't be read'''
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ''
+
+
+def read_clean_state() -> dict:
+    '''Reads the hash of each extracted CSV as it was last cleaned'''
+    try:
+        with open(CLEAN_STATE_FILE, mode='r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_clean_state(state: dict) -> None:
+    '''Saves the hash of each extracted CSV that has been cleaned'''
+    with open(CLEAN_STATE_FILE, mode='w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def append_new_or_changed(cleaned_df: pd.DataFrame) -> int:
+    '''Appends the cleaned outages that aren't in the clean CSV yet, or whose details have
+    changed since they were last appended, returning how many were appended'''
+    cleaned_df = cleaned_df.assign(content_hash=hash_outages(cleaned_df))
+    existing_df = pd.read_csv(CLEAN_CSV, usecols=['content_hash'])
+    new_data = cleaned_df[~cleaned_df['content_hash'].isin(existing_df['content_hash'])]
+
+    if not new_data.empty:
+        new_data[CLEAN_COLUMNS].to_csv(CLEAN_CSV, mode='a', header=False, index=False)
+        logging.info("Uploaded %s new or changed rows.", len(new_data))
+    return len(new_data)
 
 
 def clean_electric_nw():
@@ -33,20 +145,14 @@ def clean_electric_nw():
         'outage_start': pd.to_datetime(df['First reported at'], errors='coerce'),
         'outage_end': pd.to_datetime(df['Estimated time of restoration'], errors='coerce'),
         'Provider_name': 'Electricity North West',
-        'planned': np.nan
+        'planned': np.nan,
+        'postcodes': clean_postcodes(df.get('Postcodes'))
     })
 
     cleaned_df = cleaned_df.map(
         lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-    existing_df = pd.read_csv('clean_power_outage_data.csv')
-    new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-        existing_df['reference_id'])]
-
-    if not new_data.empty:
-        new_data.to_csv('clean_power_outage_data.csv',
-                        mode='a', header=False, index=False)
-        logging.info("Uploaded %s full rows.", len(new_data))
+    append_new_or_changed(cleaned_df)
 
     logging.info("Cleaning process completed.")
 
@@ -63,20 +169,14 @@ def clean_national_grid():
         'outage_start': pd.to_datetime(df['outage_start'], errors='coerce'),
         'outage_end': pd.to_datetime(df['outage_end'], errors='coerce'),
         'Provider_name': 'National Grid',
-        'planned': df['planned'].apply(lambda x: x == 'Planned')
+        'planned': df['planned'].apply(lambda x: x == 'Planned'),
+        'postcodes': clean_postcodes(df.get('postcodes'))
     })
 
     cleaned_df = cleaned_df.map(
         lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-    existing_df = pd.read_csv('clean_power_outage_data.csv')
-    new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-        existing_df['reference_id'])]
-
-    if not new_data.empty:
-        new_data.to_csv('clean_power_outage_data.csv',
-                        mode='a', header=False, index=False)
-        logging.info("Uploaded %s full rows.", len(new_data))
+    append_new_or_changed(cleaned_df)
 
     logging.info("Cleaning process completed.")
 
@@ -109,27 +209,15 @@ def clean_northern_power():
             'outage_start': pd.to_datetime(df['Start Time'], errors='coerce'),
             'outage_end': pd.to_datetime(df['End Time'], errors='coerce'),
             'Provider_name': 'Northern Powergrid',
-            'planned': df['Category'].apply(infer_planned)
+            'planned': df['Category'].apply(infer_planned),
+            'postcodes': clean_postcodes(df.get('Postcodes Affected'))
         })
 
         cleaned_df = cleaned_df.map(
             lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-        if not os.path.exists('clean_power_outage_data.csv'):
-            logging.info("Creating clean_power_outage_data.csv with headers")
-            cleaned_df.to_csv('clean_power_outage_data.csv', index=False)
-            logging.info("Created file with %s rows.", len(cleaned_df))
-            return
-
-        existing_df = pd.read_csv('clean_power_outage_data.csv')
-        new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-            existing_df['reference_id'])]
-
-        if not new_data.empty:
-            new_data.to_csv('clean_power_outage_data.csv',
-                            mode='a', header=False, index=False)
-            logging.info("Uploaded %s new rows.", len(new_data))
-        else:
+        create_empty_clean_csv()
+        if not append_new_or_changed(cleaned_df):
             logging.info("No new data to append.")
 
     except pd.errors.EmptyDataError:
@@ -162,7 +250,8 @@ def clean_sp():
         'outage_start': pd.to_datetime(df['outage_start'], errors='coerce'),
         'outage_end': pd.to_datetime(df['outage_end'], errors='coerce'),
         'Provider_name': 'SP Energy Networks',
-        'planned': df['status'].apply(interpret_planned)
+        'planned': df['status'].apply(interpret_planned),
+        'postcodes': clean_postcodes(df.get('postcodes'))
     })
 
     cleaned_df.loc[cleaned_df['planned'] == 'false', 'outage_end'] = np.nan
@@ -171,14 +260,7 @@ def clean_sp():
     cleaned_df = cleaned_df.map(
         lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-    existing_df = pd.read_csv('clean_power_outage_data.csv')
-    new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-        existing_df['reference_id'])]
-
-    if not new_data.empty:
-        new_data.to_csv('clean_power_outage_data.csv',
-                        mode='a', header=False, index=False)
-        logging.info("Uploaded %s full rows.", len(new_data))
+    append_new_or_changed(cleaned_df)
 
     logging.info("Cleaning process completed.")
 
@@ -203,20 +285,14 @@ def clean_ssen():
         'outage_start': pd.to_datetime(df['outage_start'], errors='coerce'),
         'outage_end': pd.to_datetime(df['outage_end'], errors='coerce'),
         'Provider_name': 'Scottish and Southern Energy (SSE)',
-        'planned': df['planned'].apply(infer_planned)
+        'planned': df['planned'].apply(infer_planned),
+        'postcodes': clean_postcodes(df.get('postcodes'))
     })
 
     cleaned_df = cleaned_df.map(
         lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-    existing_df = pd.read_csv('clean_power_outage_data.csv')
-    new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-        existing_df['reference_id'])]
-
-    if not new_data.empty:
-        new_data.to_csv('clean_power_outage_data.csv',
-                        mode='a', header=False, index=False)
-        logging.info("Uploaded %s full rows.", len(new_data))
+    append_new_or_changed(cleaned_df)
 
     logging.info("Cleaning process for SSE completed.")
 
@@ -233,29 +309,55 @@ def clean_uk_power():
         'outage_start': pd.to_datetime(df['outage_start'], errors='coerce'),
         'outage_end': pd.to_datetime(df['outage_end'], errors='coerce'),
         'Provider_name': 'UK Power Networks',
-        'planned': df['planned'].apply(lambda x: x == 'Planned')
+        'planned': df['planned'].apply(lambda x: x == 'Planned'),
+        'postcodes': clean_postcodes(df.get('postcodes'))
     })
 
     cleaned_df = cleaned_df.map(
         lambda x: np.nan if pd.isna(x) or x == '' else x)
 
-    existing_df = pd.read_csv('clean_power_outage_data.csv')
-    new_data = cleaned_df[~cleaned_df['reference_id'].isin(
-        existing_df['reference_id'])]
-
-    if not new_data.empty:
-        new_data.to_csv('clean_power_outage_data.csv',
-                        mode='a', header=False, index=False)
-        logging.info("Uploaded %s full rows.", len(new_data))
+    append_new_or_changed(cleaned_df)
 
     logging.info("Cleaning process for UK Power Networks completed.")
 
 
+# Extracted CSV -> the function that cleans it
+CLEANERS = {
+    'electric_nw_outage_data.csv': clean_electric_nw,
+    'national_grid_power_outages.csv': clean_national_grid,
+    'northern_power_outage_data.csv': clean_northern_power,
+    'sp_outage_data.csv': clean_sp,
+    'ssen_outage_data.csv': clean_ssen,
+    'ukpowernetworks_outage.csv': clean_uk_power
+}
+
+
+def clean_changed_files(cleaners: dict = None) -> int:
+    '''Cleans each extracted CSV whose contents have changed since it was last cleaned,
+    skipping providers whose feed was unchanged, and those with no CSV because the extract
+    skipped a feed that hadn't changed since the last run. Returns how many files were
+    cleaned'''
+    cleaners = CLEANERS if cleaners is None else cleaners
+    state = read_clean_state()
+    cleaned = 0
+
+    for filename, cleaner in cleaners.items():
+        content_hash = file_hash(filename)
+        if not content_hash:
+            logging.info("%s wasn't extracted this run, skipping it.", filename)
+            continue
+        if state.get(filename) == content_hash:
+            logging.info("%s unchanged since it was last cleaned, skipping it.", filename)
+            continue
+
+        cleaner()
+        cleaned += 1
+        state[filename] = content_hash
+        save_clean_state(state)
+
+    return cleaned
+
+
 if __name__ == "__main__":
     create_empty_clean_csv()
-    clean_electric_nw()
-    clean_national_grid()
-    clean_northern_power()
-    clean_sp()
-    clean_ssen()
-    clean_uk_power()
+    clean_changed_files()
@@ -0,0 +1,19 @@
+"""Connection to the outages database for the extract's state, which has to outlive the
+ETL task's throwaway disk"""
+import os
+import psycopg2
+from psycopg2.extensions import connection as Connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def connect_to_db() -> Connection:
+    """Open a connection to the outages database configured by the DB_ variables"""
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT'),
+        dbname=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD')
+    )
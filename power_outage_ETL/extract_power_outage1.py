@@ -1,23 +1,30 @@
 # pylint: disable=C0301
 '''This script extracts data from various API's and scrapes website for Power outage data.'''
 import csv
+import hashlib
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from os.path import exists
+from typing import Optional
 import pandas as pd
 import requests
 import urllib3
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
+from http_client import http_get
+from browser_pool import BrowserPool, browser_tab
+from seen_store import SeenRecords, clear_staged_records
+from feed_state import read_feed_state, save_feed_state, clear_staged_feed_state
 
 
 logging.basicConfig(level=logging.INFO,
@@ -34,242 +41,281 @@ NORTHERN_POWER_URL = "https://power.northernpowergrid.com/Powercuts/map"
 ELECTRIC_NW_URL = "https://www.enwl.co.uk/power-cuts/power-cuts-power-cuts-live-power-cut-information-fault-list/fault-list/?postcodeOrReferenceNumber="
 
 
-def setup_chrome_driver():
-    """Setup Chrome WebDriver with appropriate options for Docker environment"""
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--disable-gpu')
-
-    try:
-        service = Service('/usr/bin/chromedriver')
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        return driver
-    except Exception as e:
-        logging.error("Failed to initialize Chrome driver: %s", e)
+NATIONAL_GRID_TIMEOUT = (3.05, 30)
+UK_POWER_NETWORKS_TIMEOUT = (3.05, 15)
+SSEN_TIMEOUT = (3.05, 15)
+SP_TIMEOUT = (3.05, 20)
+ENW_TIMEOUT = (3.05, 15)
+# Longest to wait for the ENW fault list or a fault's details to render
+ENW_WAIT_SECONDS = 15
+ENW_DETAIL_WORKERS = 8
+ENW_FAULT_SELECTOR = ".c-fault-listing__item"
+ENW_DETAILS_SELECTOR = ".c-fault-information__list"
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+SP_FIELDNAMES = ['incident_id', 'outage_start', 'outage_end', 'status', 'postcodes']
+
+
+def record_hash(row: dict, fieldnames: list) -> str:
+    """Hash an extracted record's values, so a changed record can be told apart from the
+    version already saved"""
+    values = '|'.join('' if row.get(field) is None else str(row.get(field))
+                      for field in fieldnames)
+    return hashlib.md5(values.encode('utf-8'), usedforsecurity=False).hexdigest()
+
+
+def read_saved_hashes(filename: str, fieldnames: list) -> dict:
+    """Read the hash of the latest saved version of each incident in an extract CSV.
+    Only used to start a provider's seen records from the CSV it already has"""
+    hashes = {}
+    if os.path.exists(filename):
+        with open(filename, mode='r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                hashes[row['incident_id']] = record_hash(row, fieldnames)
+    return hashes
+
+
+def open_seen_records(provider: str, filename: str, fieldnames: list) -> SeenRecords:
+    """Open a provider's seen records, starting them from its CSV if it has one and none
+    have been saved yet. The CSV starts empty on every ETL task, so a missing CSV doesn't
+    clear them"""
+    seen = SeenRecords(provider)
+    seen.seed(lambda: read_saved_hashes(filename, fieldnames))
+    return seen
+
+
+def fetch_if_changed(source: str, url: str, timeout: tuple,
+                     **kwargs) -> Optional[requests.Response]:
+    """GET a feed conditionally on its saved ETag and Last-Modified, returning None if
+    the server says it's unchanged or its payload hashes the same as the last one
+    processed. Raises for error statuses"""
+    saved = read_feed_state(source)
+    headers = dict(kwargs.pop('headers', None) or {})
+    if saved.get('etag'):
+        headers['If-None-Match'] = saved['etag']
+    if saved.get('last_modified'):
+        headers['If-Modified-Since'] = saved['last_modified']
+
+    response = http_get(url, timeout=timeout, headers=headers, **kwargs)
+    if response.status_code == 304:
+        logging.info("%s feed not modified, skipping it.", source)
+        return None
+    response.raise_for_status()
+
+    if saved.get('content_hash') == hashlib.sha256(response.content).hexdigest():
+        logging.info("%s feed unchanged, skipping it.", source)
+        return None
+    return response
 
 
 def national_gird_outage_data():
-    '''Fetch and append unique power outage records for Midlands (National Grid).'''
+    '''Fetch and append unique power outage records for Midlands (National Grid),
+    returning how many were appended.'''
     logging.info("Fetching data from National Grid.")
-    url = NATIONAL_GRID_URL
     current_dir = os.path.dirname(os.path.abspath(__file__))
     save_path = os.path.join(current_dir, "national_grid_power_outages.csv")
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        response = fetch_if_changed('national_grid', NATIONAL_GRID_URL, NATIONAL_GRID_TIMEOUT)
+        if response is None:
+            return 0
         content = response.content.decode('utf-8').splitlines()
         reader = csv.DictReader(content)
     except requests.exceptions.RequestException as e:
         logging.error("Error fetching data from National Grid: %s", e)
-        return
-
-    existing_ids = set()
-    if os.path.exists(save_path):
-        with open(save_path, mode='r', encoding='utf-8') as f:
-            existing = csv.DictReader(f)
-            for row in existing:
-                existing_ids.add(row['incident_id'])
-
-    with open(save_path, mode='a', newline='', encoding='utf-8') as f:
-        fieldnames = ['incident_id', 'outage_start',
-                      'planned', 'outage_end', 'region', 'postcodes']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-
-        if f.tell() == 0:
-            writer.writeheader()
-
-        new_rows = 0
-        for row in reader:
-            incident_id = row['Incident ID']
-            if incident_id not in existing_ids:
-                writer.writerow({
+        return None
+
+    fieldnames = ['incident_id', 'outage_start',
+                  'planned', 'outage_end', 'region', 'postcodes']
+    with open_seen_records('national_grid', save_path, fieldnames) as seen:
+        with open(save_path, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+
+            if f.tell() == 0:
+                writer.writeheader()
+
+            new_rows = 0
+            for row in reader:
+                incident_id = row['Incident ID']
+                outage = {
                     'incident_id': incident_id,
                     'outage_start': row['Start Time'],
                     'planned': row['Planned'],
                     'outage_end': row['ETR'],
                     'region': row['Region'],
                     'postcodes': row['Postcodes']
-                })
-                new_rows += 1
-                existing_ids.add(incident_id)
+                }
+                outage_hash = record_hash(outage, fieldnames)
+                if seen.is_new_or_changed(incident_id, outage_hash):
+                    writer.writerow(outage)
+                    new_rows += 1
+        seen.save()
 
-    logging.info("Appended %s new records to %s", new_rows, save_path)
+    save_feed_state('national_grid', response)
+    logging.info("Appended %s new or changed records to %s", new_rows, save_path)
+    return new_rows
 
 
 def uk_power_networks_outage_data():
-    '''Fetch and append unique UK Power Networks outage records.'''
+    '''Fetch and append unique UK Power Networks outage records, returning how many were
+    appended.'''
     logging.info("Fetching data from UK Power Networks.")
-    url = UK_POWER_NETWORKS_URL
     filename = 'ukpowernetworks_outage.csv'
-    file_exists = os.path.exists(filename)
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        response = fetch_if_changed('uk_power_networks', UK_POWER_NETWORKS_URL,
+                                    UK_POWER_NETWORKS_TIMEOUT)
+        if response is None:
+            return 0
         data = response.json()
     except requests.exceptions.RequestException as e:
         logging.error("Error fetching data from UK Power Networks: %s", e)
-        return
-
-    existing_ids = set()
-    if file_exists:
-        with open(filename, mode='r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                existing_ids.add(row['incident_id'])
+        return None
 
-    with open(filename, mode='a', newline='', encoding='utf-8') as f:
-        fieldnames = ['incident_id', 'outage_start',
-                      'planned', 'outage_end', 'region', 'postcodes']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+    fieldnames = ['incident_id', 'outage_start',
+                  'planned', 'outage_end', 'region', 'postcodes']
+    with open_seen_records('uk_power_networks', filename, fieldnames) as seen:
+        with open(filename, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
 
-        if f.tell() == 0:
-            writer.writeheader()
+            if f.tell() == 0:
+                writer.writeheader()
 
-        new_rows = 0
-        for record in data['results']:
-            incident_id = record.get('incidentreference')
-            if incident_id not in existing_ids:
-                writer.writerow({
+            new_rows = 0
+            for record in data['results']:
+                incident_id = record.get('incidentreference')
+                outage = {
                     'incident_id': incident_id,
                     'outage_start': record.get('planneddate', 'N/A'),
                     'planned': 'Planned' if record.get('powercuttype') == 'Planned' else 'Unplanned',
                     'outage_end': record.get('estimatedrestorationdate', 'N/A'),
                     'region': 'UK Power Networks',
                     'postcodes': record.get('postcodesaffected', 'N/A')
-                })
-                existing_ids.add(incident_id)
-                new_rows += 1
+                }
+                outage_hash = record_hash(outage, fieldnames)
+                if seen.is_new_or_changed(incident_id, outage_hash):
+                    writer.writerow(outage)
+                    new_rows += 1
+        seen.save()
 
-    logging.info("Appended %s new records to '%s'.", new_rows, filename)
+    save_feed_state('uk_power_networks', response)
+    logging.info("Appended %s new or changed records to '%s'.", new_rows, filename)
+    return new_rows
 
 
 def ssen_outage_data():
-    '''Fetch and append unique SSEN outage records'''
+    '''Fetch and append unique SSEN outage records, returning how many were appended'''
     logging.info("Fetching data from SSEN.")
-    url = SSEN_URL
     filename = 'ssen_outage_data.csv'
-    file_exists = os.path.exists(filename)
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        response = fetch_if_changed('ssen', SSEN_URL, SSEN_TIMEOUT)
+        if response is None:
+            return 0
         data = response.json()
     except requests.exceptions.RequestException as e:
         logging.error("Error fetching data from SSEN: %s", e)
-        return
+        return None
 
-    existing_ids = set()
-    if file_exists:
-        with open(filename, mode='r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                existing_ids.add(row['incident_id'])
+    fieldnames = ['incident_id', 'outage_start',
+                  'planned', 'outage_end', 'region', 'postcodes']
+    with open_seen_records('ssen', filename, fieldnames) as seen:
+        with open(filename, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
 
-    with open(filename, mode='a', newline='', encoding='utf-8') as f:
-        fieldnames = ['incident_id', 'outage_start',
-                      'planned', 'outage_end', 'region', 'postcodes']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-
-        if f.tell() == 0:
-            writer.writeheader()
+            if f.tell() == 0:
+                writer.writeheader()
 
-        new_rows = 0
-        for fault in data.get('faults', []):
-            incident_id = fault.get('reference')
-            if incident_id not in existing_ids:
-                writer.writerow({
+            new_rows = 0
+            for fault in data.get('faults', []):
+                incident_id = fault.get('reference')
+                outage = {
                     'incident_id': incident_id,
                     'outage_start': fault.get('loggedAtUtc', 'N/A'),
                     'planned': fault.get('type', 'N/A'),
                     'outage_end': fault.get('estimatedRestorationTimeUtc', 'N/A'),
                     'region': 'SSEN',
                     'postcodes': ', '.join(fault.get('affectedAreas', [])) or 'N/A'
-                })
-                existing_ids.add(incident_id)
-                new_rows += 1
+                }
+                outage_hash = record_hash(outage, fieldnames)
+                if seen.is_new_or_changed(incident_id, outage_hash):
+                    writer.writerow(outage)
+                    new_rows += 1
+        seen.save()
 
-    logging.info("Appended %s new records to '%s'.", new_rows, filename)
+    save_feed_state('ssen', response)
+    logging.info("Appended %s new or changed records to '%s'.", new_rows, filename)
+    return new_rows
 
 
 def sp_outage_scraper():
-    '''Scrapes Scottish Power outage data and appends unique entries to CSV'''
+    '''Scrapes Scottish Power outage data and appends unique entries to CSV, returning how
+    many were appended. The list is plain HTML, so it's fetched without a browser'''
     logging.info("Starting scrape for Scottish Power outage data.")
-    url = 'https://www.spenergynetworks.co.uk/pages/power_cuts_list.aspx'
     filename = 'sp_outage_data.csv'
 
-    driver = setup_chrome_driver()
-
     try:
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        response = requests.get(url, verify=False, headers=headers)
-        if response.status_code != 200:
-            logging.error("Failed to retrieve the webpage.")
-            return
+        response = fetch_if_changed('scottish_power', SP_URL, SP_TIMEOUT,
+                                    verify=False, headers=BROWSER_HEADERS)
+        if response is None:
+            return 0
 
         soup = BeautifulSoup(response.content, 'html.parser')
         rows = soup.find_all('div', class_='Item')
 
-        existing_ids = set()
-        if os.path.exists(filename):
-            df_existing = pd.read_csv(filename)
-            existing_ids = set(df_existing['incident_id'])
+        with open_seen_records('scottish_power', filename, SP_FIELDNAMES) as seen:
+            new_data = []
 
-        new_data = []
+            for row in rows:
+                fields = row.find_all('div', class_='Field')
 
-        for row in rows:
-            fields = row.find_all('div', class_='Field')
+                reference = fields[0].find('span', class_='Value')
+                reference = reference.text.strip() if reference else "N/A"
 
-            reference = fields[0].find('span', class_='Value')
-            reference = reference.text.strip() if reference else "N/A"
+                created_on = fields[1].find('span', class_='Value')
+                created_on = created_on.text.strip() if created_on else "N/A"
 
-            created_on = fields[1].find('span', class_='Value')
-            created_on = created_on.text.strip() if created_on else "N/A"
+                estimated_on = fields[2].find('span', class_='Value')
+                estimated_on = estimated_on.text.strip() if estimated_on else "N/A"
 
-            estimated_on = fields[2].find('span', class_='Value')
-            estimated_on = estimated_on.text.strip() if estimated_on else "N/A"
+                status = fields[3].find('span', class_='Value')
+                status = status.text.strip() if status else "N/A"
 
-            status = fields[3].find('span', class_='Value')
-            status = status.text.strip() if status else "N/A"
+                affected_postcodes = fields[4].find('span', class_='Value')
+                affected_postcodes = affected_postcodes.text.strip() if affected_postcodes else "N/A"
 
-            affected_postcodes = fields[4].find('span', class_='Value')
-            affected_postcodes = affected_postcodes.text.strip() if affected_postcodes else "N/A"
+                outage = [reference, created_on, estimated_on, status, affected_postcodes]
+                outage_hash = record_hash(dict(zip(SP_FIELDNAMES, outage)), SP_FIELDNAMES)
+                if seen.is_new_or_changed(reference, outage_hash):
+                    new_data.append(outage)
 
-            if reference not in existing_ids:
-                new_data.append(
-                    [reference, created_on, estimated_on, status, affected_postcodes])
+            if new_data:
+                with open(filename, mode='a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    if os.path.getsize(filename) == 0:
+                        writer.writerow(SP_FIELDNAMES)
 
-        if new_data:
-            with open(filename, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                if os.path.getsize(filename) == 0:
-                    writer.writerow(
-                        ['incident_id', 'outage_start', 'outage_end', 'status', 'postcodes'])
+                    writer.writerows(new_data)
 
-                writer.writerows(new_data)
+                logging.info("Appended %s new or changed records to '%s'.",
+                             len(new_data), filename)
+            seen.save()
 
-            logging.info("Appended %s new records to '%s'.",
-                         len(new_data), filename)
-
-        driver.quit()
+        save_feed_state('scottish_power', response)
+        return len(new_data)
 
     except Exception as e:
         logging.error("Error during scrape: %s", e)
+        return None
 
 
-def scrape_northern_powergrid_map():
-    '''Scrapes Northern Powergrid website for outage data'''
-
-    driver = setup_chrome_driver()
+def scrape_northern_powergrid_map(browsers: BrowserPool = None):
+    '''Scrapes Northern Powergrid website for outage data in a tab of the run's browser,
+    returning how many outages were saved'''
 
-    try:
+    with browser_tab(browsers) as driver:
         driver.get(NORTHERN_POWER_URL)
         logging.info("Opened URL: %s", NORTHERN_POWER_URL)
 
@@ -349,64 +395,113 @@ def scrape_northern_powergrid_map():
 
         df.to_csv("northern_power_outage_data.csv", index=False)
         logging.info("Data saved to northern_power_outage_data.csv")
-
-    finally:
-        driver.quit()
+        return len(df)
 
 
-def electric_nw_outage_data():
-    '''Scrapes the Electric Northwest power cut website for data about outages'''
+def parse_enw_fault(html: str) -> dict:
+    '''Reads the title -> value details of an Electric Northwest fault page'''
+    detail_soup = BeautifulSoup(html, 'html.parser')
+    outage_details = {}
+    for ul in detail_soup.select(ENW_DETAILS_SELECTOR):
+        for li in ul.select("li"):
+            title = li.select_one("h3")
+            desc = li.select_one("p")
+            if title and desc:
+                outage_details[title.text.strip()] = desc.text.strip()
+    return outage_details
 
-    driver = setup_chrome_driver()
 
+def find_enw_fault_links(wait: WebDriverWait) -> list:
+    '''Waits for the Electric Northwest fault list to render, returning the detail page
+    URL of each fault, or None for faults that can only be opened by clicking'''
     try:
-        url = ELECTRIC_NW_URL
-        driver.get(url)
-        logging.info("Opened URL: %s", url)
-        time.sleep(5)
+        faults = wait.until(EC.presence_of_all_elements_located(
+            (By.CSS_SELECTOR, ENW_FAULT_SELECTOR)))
+    except TimeoutException:
+        return []
 
-        total_faults = len(driver.find_elements(
-            By.CLASS_NAME, "c-fault-listing__item"))
-        logging.info("Found %s total faults.", total_faults)
+    links = []
+    for fault in faults:
+        href = fault.find_element(By.CLASS_NAME, "c-fault-listing__link").get_attribute("href")
+        links.append(href if href and href.startswith("http") else None)
+    return links
 
-        all_outages = []
-
-        for i in range(total_faults):
-            try:
-                faults = driver.find_elements(
-                    By.CLASS_NAME, "c-fault-listing__item")
-                fault = faults[i]
-
-                button = fault.find_element(
-                    By.CLASS_NAME, "c-fault-listing__link")
-                driver.execute_script("arguments[0].scrollIntoView();", button)
-                button.click()
-                time.sleep(3)
-
-                detail_soup = BeautifulSoup(driver.page_source, 'html.parser')
-                info_list = detail_soup.select(".c-fault-information__list")
-
-                outage_details = {}
-                for ul in info_list:
-                    for li in ul.select("li"):
-                        title = li.select_one("h3")
-                        desc = li.select_one("p")
-                        if title and desc:
-                            outage_details[title.text.strip()
-                                           ] = desc.text.strip()
-
-                all_outages.append(outage_details)
-
-                back_button = driver.find_element(
-                    By.CLASS_NAME, "c-fault-back__link")
-                driver.execute_script(
-                    "arguments[0].scrollIntoView();", back_button)
-                back_button.click()
-                time.sleep(3)
 
-            except Exception as e:
-                logging.error("Error processing fault #%s: %s", i + 1, e)
-                continue
+def fetch_enw_fault(url: str) -> dict:
+    '''Fetches and reads one Electric Northwest fault page over HTTP, returning no details
+    if it can't be fetched or its details are rendered in the browser'''
+    try:
+        response = http_get(url, timeout=ENW_TIMEOUT, headers=BROWSER_HEADERS)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logging.warning("Error fetching fault %s: %s", url, e)
+        return {}
+    return parse_enw_fault(response.text)
+
+
+def fetch_enw_faults(links: list) -> list:
+    '''Fetches the detail pages of the faults with their own URL concurrently over HTTP.
+    Once one comes back without details the site is rendering them in the browser, so the
+    faults not fetched yet are left for the browser rather than requested'''
+    use_browser = threading.Event()
+
+    def fetch(link: str) -> dict:
+        if not link or use_browser.is_set():
+            return {}
+        outage_details = fetch_enw_fault(link)
+        if not outage_details:
+            use_browser.set()
+        return outage_details
+
+    with ThreadPoolExecutor(max_workers=ENW_DETAIL_WORKERS) as pool:
+        fetched = list(pool.map(fetch, links))
+    if use_browser.is_set():
+        logging.info("Fault details not served over HTTP, opening the rest in the browser.")
+    return fetched
+
+
+def open_enw_fault_in_browser(driver, wait: WebDriverWait, index: int) -> dict:
+    '''Clicks into one fault of the Electric Northwest fault list and back out, waiting
+    for each page to render rather than for a fixed time'''
+    wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, ENW_FAULT_SELECTOR)) > index)
+    faults = driver.find_elements(By.CSS_SELECTOR, ENW_FAULT_SELECTOR)
+    button = faults[index].find_element(By.CLASS_NAME, "c-fault-listing__link")
+    driver.execute_script("arguments[0].scrollIntoView();", button)
+    button.click()
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ENW_DETAILS_SELECTOR)))
+    outage_details = parse_enw_fault(driver.page_source)
+
+    back_button = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "c-fault-back__link")))
+    driver.execute_script("arguments[0].scrollIntoView();", back_button)
+    back_button.click()
+    return outage_details
+
+
+def electric_nw_outage_data(browsers: BrowserPool = None):
+    '''Scrapes the Electric Northwest power cut website for data about outages in a tab of
+    the run's browser, returning how many were saved. Fault pages with their own URL are
+    fetched concurrently over HTTP until one comes back empty, the rest are opened one at a
+    time in the browser'''
+
+    with browser_tab(browsers) as driver:
+        driver.get(ELECTRIC_NW_URL)
+        logging.info("Opened URL: %s", ELECTRIC_NW_URL)
+        wait = WebDriverWait(driver, ENW_WAIT_SECONDS)
+
+        links = find_enw_fault_links(wait)
+        logging.info("Found %s total faults, %s with detail pages.",
+                     len(links), sum(1 for link in links if link))
+
+        fetched = fetch_enw_faults(links)
+        all_outages = []
+        for i, outage_details in enumerate(fetched):
+            if not outage_details:
+                try:
+                    outage_details = open_enw_fault_in_browser(driver, wait, i)
+                except Exception as e:
+                    logging.error("Error processing fault #%s: %s", i + 1, e)
+                    continue
+            all_outages.append(outage_details)
 
         csv_filename = 'electric_nw_outage_data.csv'
         if all_outages:
@@ -420,9 +515,7 @@ def electric_nw_outage_data():
                 "Data successfully saved to %s", csv_filename)
         else:
             logging.warning("No outage data found.")
-
-    finally:
-        driver.quit()
+        return len(all_outages)
 
 
 def create_empty_csv_files():
@@ -431,7 +524,7 @@ def create_empty_csv_files():
     csv_files = {
         'northern_power_outage_data.csv': ['Power Cut ID', 'Category', 'Start Time', 'End Time', 'Postcodes Affected', 'Premises Affected'],
         'electric_nw_outage_data.csv': ['Incident ID', 'Type', 'Start Time', 'End Time', 'Region', 'Postcodes'],
-        'sp_outage_data.csv': ['incident_id', 'outage_start', 'outage_end', 'status', 'postcodes'],
+        'sp_outage_data.csv': SP_FIELDNAMES,
     }
 
     for filename, headers in csv_files.items():
@@ -442,27 +535,82 @@ def create_empty_csv_files():
                 writer.writerow(headers)
 
 
-if __name__ == "__main__":
-    national_gird_outage_data()
-    uk_power_networks_outage_data()
-    ssen_outage_data()
-
+# Providers served by APIs or plain HTML, fetched concurrently through the shared session
+HTTP_EXTRACTORS = {
+    'National Grid': national_gird_outage_data,
+    'UK Power Networks': uk_power_networks_outage_data,
+    'SSEN': ssen_outage_data,
+    'SP Energy Networks': sp_outage_scraper
+}
+# Providers that need a headless browser, sharing the run's BROWSER_COUNT browsers
+BROWSER_EXTRACTORS = {
+    'Northern Powergrid': scrape_northern_powergrid_map,
+    'Electricity North West': electric_nw_outage_data
+}
+
+
+def run_extractor(provider: str, extractor) -> dict:
+    """Run one provider's extractor, returning how long it took, whether it succeeded and
+    how many records it saved"""
+    start = time.monotonic()
     try:
-        sp_outage_scraper()
+        records = extractor()
+        error = None if records is not None else "No data extracted"
     except Exception as e:
-        logging.error("Error in sp_outage_scraper: %s", e)
+        records = None
+        error = str(e)
+        logging.error("Error extracting %s: %s", provider, e)
+
+    return {
+        'provider': provider,
+        'seconds': round(time.monotonic() - start, 2),
+        'succeeded': error is None,
+        'records': records,
+        'error': error
+    }
 
-    try:
-        scrape_northern_powergrid_map()
-    except Exception as e:
-        logging.error("Error in scrape_northern_powergrid_map: %s", e)
 
-    try:
-        electric_nw_outage_data()
-    except Exception as e:
-        logging.error("Error in electric_nw_outage_data: %s", e)
+def report_metrics(metrics: list, total_seconds: float) -> None:
+    """Log each provider's timing and outcome, and the extract's total time"""
+    for metric in metrics:
+        if metric['succeeded']:
+            logging.info("%s: extracted %s records in %ss",
+                         metric['provider'], metric['records'], metric['seconds'])
+        else:
+            logging.warning("%s: failed after %ss: %s",
+                            metric['provider'], metric['seconds'], metric['error'])
+
+    succeeded = sum(metric['succeeded'] for metric in metrics)
+    logging.info("Extracted %s/%s providers in %ss (%ss if run one after another)",
+                 succeeded, len(metrics), round(total_seconds, 2),
+                 round(sum(metric['seconds'] for metric in metrics), 2))
+
+
+def extract_all(http_extractors: dict = None, browser_extractors: dict = None) -> list:
+    """Run every provider's extractor, the HTTP ones all at once alongside the browser
+    scrapers, which run one per headless Chrome started for the run. The extract takes
+    about as long as the slowest of the two groups rather than every provider. Returns
+    each provider's metrics. Feed state and seen records staged by an earlier run that
+    never finished loading are discarded first, so its feeds are fetched again"""
+    http_extractors = HTTP_EXTRACTORS if http_extractors is None else http_extractors
+    browser_extractors = BROWSER_EXTRACTORS if browser_extractors is None else browser_extractors
+    start = time.monotonic()
+    clear_staged_feed_state()
+    clear_staged_records()
+
+    with BrowserPool() as browsers, \
+            ThreadPoolExecutor(max_workers=max(len(http_extractors), 1)) as http_pool, \
+            ThreadPoolExecutor(max_workers=browsers.size) as browser_pool:
+        futures = [http_pool.submit(run_extractor, provider, extractor)
+                   for provider, extractor in http_extractors.items()]
+        futures += [browser_pool.submit(run_extractor, provider, partial(extractor, browsers))
+                    for provider, extractor in browser_extractors.items()]
+        metrics = [future.result() for future in futures]
+
+    create_empty_csv_files()
+    report_metrics(metrics, time.monotonic() - start)
+    return metrics
 
-        create_empty_csv_files()
-    except Exception as e:
-        logging.error("Critical error in ETL process: %s", e)
-        create_empty_csv_files()
+
+if __name__ == "__main__":
+    extract_all()
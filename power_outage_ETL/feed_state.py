@@ -0,0 +1,83 @@
+"""ETag, Last-Modified and content hash of the last payload processed from each outage
+feed, kept in the outage_feed_state table. The extract only stages the state of the feeds
+it processes, and the load saves it once their outages are in the database, so a run that
+fails part way fetches them again"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import closing
+import psycopg2
+import requests
+from psycopg2.extensions import cursor as Cursor
+from etl_db import connect_to_db
+
+# Feed state staged by the extract for the load to save, on the task's disk for the run
+FEED_STATE_STAGING_FILE = 'outage_feed_state.staged.jsonl'
+# Extractors read and stage their feed's state from their own threads
+FEED_STATE_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def read_feed_state(source: str) -> dict:
+    """Read the ETag, Last-Modified and content hash of the last payload processed from a
+    feed, or nothing if none has been saved or the database can't be reached"""
+    try:
+        with FEED_STATE_LOCK, closing(connect_to_db()) as connection, \
+                connection.cursor() as cursor:
+            cursor.execute("""SELECT etag, last_modified, content_hash
+                              FROM outage_feed_state
+                              WHERE source = %s""", (source, ))
+            saved = cursor.fetchone()
+    except psycopg2.Error as e:
+        logger.warning("Could not read the %s feed state: %s", source, e)
+        return {}
+    if not saved:
+        return {}
+    return dict(zip(('etag', 'last_modified', 'content_hash'), saved))
+
+
+def save_feed_state(source: str, response: requests.Response) -> None:
+    """Stage the validators and content hash of a feed's payload once its records have
+    been extracted, for the load to save once they're in the database"""
+    state = [source, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+             hashlib.sha256(response.content).hexdigest()]
+    with FEED_STATE_LOCK, open(FEED_STATE_STAGING_FILE, mode='a', encoding='utf-8') as f:
+        f.write(json.dumps(state) + '\n')
+
+
+def read_staged_feed_state() -> dict:
+    """Read the latest state staged for each feed this run"""
+    staged = {}
+    try:
+        with open(FEED_STATE_STAGING_FILE, mode='r', encoding='utf-8') as f:
+            for line in f:
+                state = json.loads(line)
+                staged[state[0]] = tuple(state)
+    except OSError:
+        return {}
+    return staged
+
+
+def persist_staged_feed_state(cursor: Cursor) -> int:
+    """Save the feed state staged this run in the caller's transaction, returning how many
+    feeds it covered. Call clear_staged_feed_state once it's committed"""
+    staged = read_staged_feed_state()
+    for state in staged.values():
+        cursor.execute("""INSERT INTO outage_feed_state
+                          (source, etag, last_modified, content_hash)
+                          VALUES (%s, %s, %s, %s)
+                          ON CONFLICT (source) DO UPDATE
+                          SET etag = EXCLUDED.etag,
+                              last_modified = EXCLUDED.last_modified,
+                              content_hash = EXCLUDED.content_hash,
+                              updated_at = NOW()""", state)
+    return len(staged)
+
+
+def clear_staged_feed_state() -> None:
+    """Forget the feed state staged this run, once it has been saved"""
+    if os.path.exists(FEED_STATE_STAGING_FILE):
+        os.remove(FEED_STATE_STAGING_FILE)
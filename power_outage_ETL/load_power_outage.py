@@ -1,12 +1,19 @@
 '''This script loads the cleaned power outages data to an RDS'''
 import os
+import io
+import json
+import hashlib
 import logging
-from typing import Tuple, Optional, Any
+from typing import Tuple, Optional, Any, List, Dict
 import pandas as pd
 import psycopg2
-from psycopg2 import sql
+import psycopg2.extras
 from psycopg2.extensions import connection as Connection, cursor as Cursor
 from dotenv import load_dotenv
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from feed_state import persist_staged_feed_state, clear_staged_feed_state
+from seen_store import persist_staged_records, clear_staged_records
 
 load_dotenv()
 
@@ -18,6 +25,15 @@ DB_PORT = os.getenv('DB_PORT')
 DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
+# Alerts Lambda triggered after new outages are loaded, if set
+ALERTS_FUNCTION_NAME = os.getenv('ALERTS_FUNCTION_NAME')
+
+# Separator used for the postcodes column of the clean CSV
+POSTCODE_SEPARATOR = ';'
+# Outages inserted and committed together
+BATCH_SIZE = 500
+# Bytes of the clean CSV hashed at a time when checking it's the one last loaded
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 def connect_to_db() -> Tuple[Connection, Cursor]:
@@ -35,49 +51,68 @@ def connect_to_db() -> Tuple[Connection, Cursor]:
     return connection, cursor
 
 
-def check_if_outage_exists(cursor: Cursor, reference_id: str) -> bool:
+def get_provider_ids(cursor: Cursor) -> Dict[str, int]:
     """
-    Check if an outage_id already exists in the database.
+    Get the provider_name -> provider_id map from the providers table.
     """
-    query = sql.SQL(
-        "SELECT EXISTS(SELECT 1 FROM outages WHERE reference_id = %s);")
-    cursor.execute(query, (reference_id,))
-    result = cursor.fetchone()
-    return result[0]
+    cursor.execute("SELECT provider_name, provider_id FROM providers;")
+    return dict(cursor.fetchall())
 
 
-def get_provider_id(cursor: Cursor, provider_name: str) -> None:
+def split_postcodes(postcodes: Any) -> List[str]:
     """
-    Get the provider_id based on the provider_name from the providers table.
+    Split the clean CSV's postcodes column into a list of postcodes.
     """
-    query = sql.SQL(
-        "SELECT provider_id FROM providers WHERE provider_name = %s;")
-    cursor.execute(query, (provider_name,))
-    result = cursor.fetchone()
+    if not isinstance(postcodes, str):
+        return []
+    return [postcode for postcode in postcodes.split(POSTCODE_SEPARATOR) if postcode]
 
-    if result:
-        return result[0]
-    return None
+
+def upsert_outages(cursor: Cursor, outages: List[tuple]) -> Dict[str, Tuple[int, bool]]:
+    """
+    Insert a batch of (reference_id, outage_start, outage_end, provider_id, planned,
+    content_hash) outages, updating the times and planned flag of any already loaded whose
+    content hash has changed. Returns reference_id -> (outage_id, whether it was inserted)
+    for the outages that were inserted or updated.
+    """
+    upserted = psycopg2.extras.execute_values(cursor, """
+        INSERT INTO outages (reference_id, outage_start, outage_end, provider_id, planned,
+                             content_hash)
+        VALUES %s
+        ON CONFLICT (reference_id) DO UPDATE
+        SET outage_start = EXCLUDED.outage_start,
+            outage_end = EXCLUDED.outage_end,
+            planned = EXCLUDED.planned,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = NOW()
+        WHERE outages.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING reference_id, outage_id, xmax = 0;
+    """, outages, page_size=len(outages), fetch=True)
+    return {reference_id: (outage_id, inserted)
+            for reference_id, outage_id, inserted in upserted}
 
 
-def insert_outage_data(cursor: Cursor,
-                       connection: Connection,
-                       reference_id: str,
-                       outage_start: Optional[Any],
-                       outage_end: Optional[Any],
-                       provider_id: Any,
-                       planned: Optional[bool]
-                       ) -> None:
+def delete_outage_postcodes(cursor: Cursor, outage_ids: List[int]) -> None:
     """
-    Insert a new outage record into the database.
+    Delete the postcodes of updated outages, so they can be replaced with their latest ones.
     """
-    query = sql.SQL("""
-        INSERT INTO outages (reference_id, outage_start, outage_end, provider_id, planned)
-        VALUES (%s, %s, %s, %s, %s);
-    """)
-    cursor.execute(query, (reference_id, outage_start,
-                           outage_end, provider_id, planned))
-    connection.commit()
+    if not outage_ids:
+        return
+    cursor.execute("DELETE FROM outage_postcodes WHERE outage_id = ANY(%s);", (outage_ids,))
+
+
+def insert_outage_postcodes(cursor: Cursor, outage_postcodes: List[tuple]) -> None:
+    """
+    Insert (outage_id, postcode) rows for the postcodes, sectors and districts affected
+    by outages.
+    """
+    if not outage_postcodes:
+        return
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO outage_postcodes (outage_id, postcode)
+        VALUES %s
+        ON CONFLICT (outage_id, postcode) DO NOTHING;
+    """, outage_postcodes)
 
 
 def convert_planned_to_bool(planned: Any) -> Optional[bool]:
@@ -95,57 +130,194 @@ def convert_planned_to_bool(planned: Any) -> Optional[bool]:
     return None
 
 
-def upload_data_from_csv(csv_file: str) -> None:
+def notify_new_outages(reference_ids: List[str]) -> None:
     """
-    Upload the cleaned data from the CSV file to the RDS Postgres database.
+    Trigger the alerts Lambda for newly inserted outages, so users are alerted as soon as
+    they're loaded. Only their count is sent, as the alerts run finds new outages itself
+    and an async invoke's payload is limited to 256 KB. Outages that fail to trigger it are
+    picked up by its scheduled run.
     """
-    logging.info(
-        "Starting the upload process from CSV file: %s", csv_file)
+    if not reference_ids or not ALERTS_FUNCTION_NAME:
+        return
 
     try:
-        df = pd.read_csv(csv_file)
-        logging.info(
-            "CSV file %s read successfully, %s rows found.", csv_file, len(df))
-    except Exception as e:
-        logging.error(
-            "Error reading the CSV file %s: %s", csv_file, e)
-        return
+        boto3.client('lambda', region_name='eu-west-2').invoke(
+            FunctionName=ALERTS_FUNCTION_NAME,
+            InvocationType='Event',
+            Payload=json.dumps({"source": "outage_load", "new_outages": len(reference_ids)})
+        )
+        logging.info("Triggered alerts for %s new outages.", len(reference_ids))
+    except (BotoCoreError, ClientError) as e:
+        logging.error("Error triggering alerts for new outages: %s", e)
 
-    connection, cursor = connect_to_db()
 
-    logging.info("Connected to the database.")
+def hash_file_prefix(csv_file: str, length: int) -> str:
+    """
+    Hash the first length bytes of a file, identifying the part of the clean CSV loaded.
+    """
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        while length > 0:
+            chunk = f.read(min(HASH_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            digest.update(chunk)
+            length -= len(chunk)
+    return digest.hexdigest()
+
+
+def read_load_offset(cursor: Cursor, csv_file: str) -> int:
+    """
+    Read the byte offset of the clean CSV loaded by the last run from etl_load_state.
+    Starts from the beginning if there's no record, or the bytes before the offset don't
+    hash the same as when they were loaded, e.g. the CSV has been recreated since.
+    """
+    cursor.execute("SELECT byte_offset, content_hash FROM etl_load_state WHERE name = %s;",
+                   (os.path.basename(csv_file),))
+    saved = cursor.fetchone()
+    if not saved:
+        return 0
+
+    offset, content_hash = saved
+    if offset > os.path.getsize(csv_file) or hash_file_prefix(csv_file, offset) != content_hash:
+        logging.info("%s has changed since it was last loaded, reading it all.", csv_file)
+        return 0
+    return offset
+
+
+def save_load_offset(connection: Connection, cursor: Cursor, csv_file: str,
+                     offset: int) -> None:
+    """
+    Record the byte offset of the clean CSV loaded so far, with a hash of the bytes before
+    it so a recreated CSV isn't read from the same offset.
+    """
+    cursor.execute("""
+        INSERT INTO etl_load_state (name, byte_offset, content_hash)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET byte_offset = EXCLUDED.byte_offset,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = NOW();
+    """, (os.path.basename(csv_file), offset, hash_file_prefix(csv_file, offset)))
+    connection.commit()
 
-    for _, row in df.iterrows():
-        reference_id = row['reference_id']
 
-        outage_start = row['outage_start'] if pd.notnull(
-            row['outage_start']) else None
-        outage_end = row['outage_end'] if pd.notnull(
-            row['outage_end']) else None
-        provider_name = row['Provider_name'] if pd.notnull(
-            row['Provider_name']) else 'NA'
-        planned = convert_planned_to_bool(row['planned'])
+def read_new_rows(csv_file: str, offset: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Read the rows appended to the clean CSV after the byte offset, returning them with
+    the offset of the end of the file. The cleaners only ever append outages that aren't
+    already in the CSV, so only these rows can be new.
+    """
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        new_data = f.read()
+        end = f.tell()
+    return pd.read_csv(io.BytesIO(header + new_data)), end
 
-        provider_id = get_provider_id(cursor, provider_name)
 
+def build_outage_rows(df: pd.DataFrame,
+                      provider_ids: Dict[str, int]) -> Tuple[List[tuple], Dict[str, List[str]]]:
+    """
+    Convert clean CSV rows into outage rows for upsert_outages, with the postcodes of
+    each outage by reference_id. Only the latest version of an outage appended more than
+    once is kept.
+    """
+    df = df.drop_duplicates('reference_id', keep='last')
+    df = df.astype(object).where(df.notnull(), None)
+    outages = []
+    postcodes = {}
+    for row in df.to_dict('records'):
+        reference_id = str(row['reference_id'])
+        provider_name = row['Provider_name'] or 'NA'
+        provider_id = provider_ids.get(provider_name)
         if provider_id is None:
             logging.warning(
                 "Provider '%s' not found in the database.", provider_name)
-            provider_id = 'NA'
 
-        if not check_if_outage_exists(cursor, reference_id):
-            logging.info(
-                "Inserting outage data for reference_id: %s", reference_id)
-            insert_outage_data(cursor, connection, reference_id,
-                               outage_start, outage_end, provider_id, planned)
-        else:
-            logging.info(
-                "Outage with reference_id %s already exists, skipping insertion.", reference_id)
+        outages.append((reference_id, row['outage_start'], row['outage_end'], provider_id,
+                        convert_planned_to_bool(row['planned']), row.get('content_hash')))
+        postcodes[reference_id] = split_postcodes(row.get('postcodes'))
+    return outages, postcodes
+
+
+def load_outages(connection: Connection, cursor: Cursor, outages: List[tuple],
+                 postcodes: Dict[str, List[str]],
+                 batch_size: int = BATCH_SIZE) -> Tuple[List[str], List[str]]:
+    """
+    Upsert outages and their postcodes a batch at a time, committing once per batch.
+    Returns the reference ids of the outages that were new and of those that were updated.
+    """
+    inserted = []
+    updated = []
+    for i in range(0, len(outages), batch_size):
+        upserted = upsert_outages(cursor, outages[i:i + batch_size])
+        delete_outage_postcodes(cursor, [outage_id for outage_id, new in upserted.values()
+                                         if not new])
+        insert_outage_postcodes(cursor, [(outage_id, postcode)
+                                         for reference_id, (outage_id, _) in upserted.items()
+                                         for postcode in postcodes.get(reference_id, [])])
+        connection.commit()
+        inserted.extend(reference_id for reference_id, (_, new) in upserted.items() if new)
+        updated.extend(reference_id for reference_id, (_, new) in upserted.items() if not new)
+    return inserted, updated
+
+
+def persist_extract_state(connection: Connection, cursor: Cursor) -> None:
+    """
+    Save the feed state and seen records the extract staged, once the outages they cover
+    have been loaded, so feeds and records from a run that failed before this point are
+    fetched and appended again.
+    """
+    feeds = persist_staged_feed_state(cursor)
+    records = persist_staged_records(cursor)
+    connection.commit()
+    clear_staged_feed_state()
+    clear_staged_records()
+    logging.info("Saved the state of %s feeds and %s seen records.", feeds, records)
+
+
+def upload_data_from_csv(csv_file: str) -> None:
+    """
+    Upload the rows added to the cleaned CSV file since the last run to the RDS Postgres
+    database.
+    """
+    logging.info(
+        "Starting the upload process from CSV file: %s", csv_file)
+
+    connection, cursor = connect_to_db()
+
+    logging.info("Connected to the database.")
+
+    try:
+        df, end = read_new_rows(csv_file, read_load_offset(cursor, csv_file))
+        logging.info(
+            "CSV file %s read successfully, %s new rows found.", csv_file, len(df))
+    except Exception as e:
+        logging.error(
+            "Error reading the CSV file %s: %s", csv_file, e)
+        cursor.close()
+        connection.close()
+        return
+
+    inserted = []
+    if df.empty:
+        logging.info("No new outages to load.")
+    else:
+        outages, postcodes = build_outage_rows(df, get_provider_ids(cursor))
+        inserted, updated = load_outages(connection, cursor, outages, postcodes)
+        save_load_offset(connection, cursor, csv_file, end)
+        logging.info("Inserted %s new outages, updated %s, %s unchanged.",
+                     len(inserted), len(updated),
+                     len(outages) - len(inserted) - len(updated))
+    persist_extract_state(connection, cursor)
 
     cursor.close()
     connection.close()
     logging.info("Database connection closed. Data upload process completed.")
 
+    notify_new_outages(inserted)
+
 
 if __name__ == "__main__":
     upload_data_from_csv('clean_power_outage_data.csv')
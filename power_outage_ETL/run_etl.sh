@@ -1,4 +1,6 @@
 #!/bin/bash
+# Stop if a stage fails, so the load doesn't save the state of feeds that weren't loaded
+set -e
 
 echo "Starting ETL process..."
 
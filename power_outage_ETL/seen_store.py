@@ -0,0 +1,136 @@
+"""Persistent index of the outage records each extractor has already saved, so an extract
+looks up only the records in its feed instead of re-reading the provider's whole CSV. The
+index is kept in the outages database, as the ETL task's disk doesn't outlive a run. The
+extract only stages the records it appends, and the load saves them once they're in the
+database, so records from a run that fails part way are appended again"""
+import os
+import json
+import logging
+import threading
+from typing import Callable, Dict
+import psycopg2.extras
+from psycopg2.extensions import connection as Connection, cursor as Cursor
+from etl_db import connect_to_db
+
+# Records that haven't appeared in a provider's feed for this many days are forgotten.
+# 0 keeps them forever
+SEEN_TTL_DAYS = float(os.getenv('SEEN_TTL_DAYS', '0'))
+# Seen records staged by the extract for the load to save, on the task's disk for the run
+SEEN_STAGING_FILE = 'outage_seen_records.staged.jsonl'
+# Extractors stage their records from their own threads
+STAGING_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class SeenRecords:
+    """One provider's seen records for an extract, on its own connection. Each lookup is a
+    primary key read, and the records checked are staged by `save` once they've been
+    appended to the CSV. Closing without saving discards them"""
+
+    def __init__(self, provider: str, conn: Connection = None):
+        self.provider = provider
+        self.pending = {}
+        self.staged = {}
+        self.conn = conn or connect_to_db()
+        self.cursor = self.conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def is_seeded(self) -> bool:
+        """Whether any of this provider's records have been saved yet"""
+        self.cursor.execute(
+            'SELECT 1 FROM outage_seen_records WHERE provider = %s LIMIT 1',
+            (self.provider, ))
+        return self.cursor.fetchone() is not None
+
+    def seed(self, load_hashes: Callable[[], Dict[str, str]]) -> None:
+        """Start the provider's records from the record id -> hash map returned by
+        `load_hashes`, which is only called while the provider has none saved"""
+        if self.is_seeded():
+            return
+        hashes = load_hashes()
+        if not hashes:
+            return
+        self.pending.update((str(record_id), content_hash)
+                            for record_id, content_hash in hashes.items())
+        self.save()
+        logger.info("Seeded %s seen records for %s", len(hashes), self.provider)
+
+    def is_new_or_changed(self, record_id: str, content_hash: str) -> bool:
+        """Whether a record hasn't been seen before, or its hash differs from the version
+        last seen. The record is saved as seen by the next `save`"""
+        record_id = str(record_id)
+        if record_id in self.pending:
+            saved_hash = self.pending[record_id]
+        elif record_id in self.staged:
+            saved_hash = self.staged[record_id]
+        else:
+            self.cursor.execute(
+                """SELECT content_hash FROM outage_seen_records
+                   WHERE provider = %s AND record_id = %s""",
+                (self.provider, record_id))
+            row = self.cursor.fetchone()
+            saved_hash = row[0] if row else None
+        self.pending[record_id] = content_hash
+        return saved_hash != content_hash
+
+    def save(self) -> None:
+        """Stage the records checked since the last save for the load to save as seen"""
+        with STAGING_LOCK, open(SEEN_STAGING_FILE, mode='a', encoding='utf-8') as f:
+            for record_id, content_hash in self.pending.items():
+                f.write(json.dumps([self.provider, record_id, content_hash]) + '\n')
+        self.staged.update(self.pending)
+        self.pending.clear()
+
+    def close(self) -> None:
+        """Close the connection, discarding any records not saved"""
+        self.conn.close()
+
+
+def read_staged_records() -> dict:
+    """Read the latest hash staged for each provider's records this run"""
+    staged = {}
+    try:
+        with open(SEEN_STAGING_FILE, mode='r', encoding='utf-8') as f:
+            for line in f:
+                provider, record_id, content_hash = json.loads(line)
+                staged[(provider, record_id)] = content_hash
+    except OSError:
+        return {}
+    return staged
+
+
+def persist_staged_records(cursor: Cursor, ttl_days: float = None) -> int:
+    """Save the records staged this run as seen now in the caller's transaction, and forget
+    the staged providers' records older than the TTL. Returns how many were saved. Call
+    clear_staged_records once it's committed"""
+    ttl_days = SEEN_TTL_DAYS if ttl_days is None else ttl_days
+    staged = read_staged_records()
+    psycopg2.extras.execute_values(
+        cursor,
+        """INSERT INTO outage_seen_records (provider, record_id, content_hash)
+           VALUES %s
+           ON CONFLICT (provider, record_id) DO UPDATE
+           SET content_hash = EXCLUDED.content_hash, seen_at = NOW()""",
+        [(provider, record_id, content_hash)
+         for (provider, record_id), content_hash in staged.items()])
+    if ttl_days > 0:
+        for provider in sorted({provider for provider, _ in staged}):
+            cursor.execute(
+                """DELETE FROM outage_seen_records
+                   WHERE provider = %s AND seen_at < NOW() - %s * INTERVAL '1 day'""",
+                (provider, ttl_days))
+            if cursor.rowcount:
+                logger.info("Expired %s seen records for %s", cursor.rowcount, provider)
+    return len(staged)
+
+
+def clear_staged_records() -> None:
+    """Forget the records staged this run, once they've been saved"""
+    if os.path.exists(SEEN_STAGING_FILE):
+        os.remove(SEEN_STAGING_FILE)
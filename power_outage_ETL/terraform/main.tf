@@ -34,6 +34,42 @@ resource "aws_cloudwatch_log_group" "ecs_log_group" {
   name = "/ecs/c16-energy-outage-pipeline"
 }
 
+data "aws_iam_policy_document" "ecs-task-assume-role" {
+  statement {
+    effect = "Allow"
+
+    principals {
+      type        = "Service"
+      identifiers = ["ecs-tasks.amazonaws.com"]
+    }
+
+    actions = [
+      "sts:AssumeRole"
+      ]
+  }
+}
+
+data "aws_iam_policy_document" "trigger-alerts-policy" {
+  statement {
+    effect = "Allow"
+    actions = [
+      "lambda:InvokeFunction"
+    ]
+    resources = ["arn:aws:lambda:eu-west-2:*:function:${var.ALERTS_FUNCTION_NAME}"]
+  }
+}
+
+resource "aws_iam_role" "energy-outage-pipeline-task-role" {
+  name               = "c16-energy-outage-pipeline-task-role"
+  assume_role_policy = data.aws_iam_policy_document.ecs-task-assume-role.json
+}
+
+resource "aws_iam_role_policy" "trigger-alerts-policy" {
+  name   = "trigger-alerts"
+  role   = aws_iam_role.energy-outage-pipeline-task-role.id
+  policy = data.aws_iam_policy_document.trigger-alerts-policy.json
+}
+
 resource "aws_ecs_task_definition" "service" {
   family                   = "c16-power-outage-pipeline"
   requires_compatibilities = ["FARGATE"]
@@ -41,6 +77,7 @@ resource "aws_ecs_task_definition" "service" {
   cpu                      = 512
   memory                   = 3072
   execution_role_arn       = "arn:aws:iam::129033205317:role/ecsTaskExecutionRole"
+  task_role_arn            = aws_iam_role.energy-outage-pipeline-task-role.arn
 
   container_definitions = jsonencode([
     {
@@ -69,6 +106,14 @@ resource "aws_ecs_task_definition" "service" {
         {
           name  = "DB_PASSWORD"
           value = var.DB_PASSWORD
+        },
+        {
+          name  = "ALERTS_FUNCTION_NAME"
+          value = var.ALERTS_FUNCTION_NAME
+        },
+        {
+          name  = "BROWSER_COUNT"
+          value = "2"
         }
       ]
 
@@ -27,4 +27,10 @@ variable "DB_PORT" {
 variable "existing_vpc_name" {
   type = string
   description = "VPC Name"
-}
\ No newline at end of file
+}
+
+variable "ALERTS_FUNCTION_NAME" {
+  type = string
+  description = "Name of the Lambda that sends outage alerts, triggered after new outages load"
+  default = "c16-energy-send-alerts-lambda"
+}
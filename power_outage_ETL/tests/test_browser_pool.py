@@ -0,0 +1,102 @@
+# pylint: skip-file
+
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from selenium.common.exceptions import WebDriverException
+import browser_pool
+
+
+@pytest.fixture
+def mock_chrome():
+    with patch("browser_pool.webdriver.Chrome") as chrome, patch("browser_pool.Service"):
+        chrome.return_value.current_window_handle = "home"
+        yield chrome
+
+
+def test_browser_started_once_per_pool(mock_chrome):
+    with browser_pool.BrowserPool() as browsers:
+        with browsers.tab() as first:
+            pass
+        with browsers.tab() as second:
+            pass
+
+    assert first is second
+    mock_chrome.assert_called_once()
+    driver = mock_chrome.return_value
+    assert driver.switch_to.new_window.call_count == 2
+    assert driver.close.call_count == 2
+    driver.switch_to.window.assert_called_with("home")
+    driver.quit.assert_called_once()
+
+
+def test_browser_not_started_if_unused(mock_chrome):
+    with browser_pool.BrowserPool():
+        pass
+    mock_chrome.assert_not_called()
+
+
+def test_tab_blocks_resources(mock_chrome):
+    with browser_pool.BrowserPool() as browsers, browsers.tab():
+        pass
+    mock_chrome.return_value.execute_cdp_cmd.assert_any_call(
+        'Network.setBlockedURLs', {'urls': browser_pool.BLOCKED_URLS})
+
+
+def test_tab_closed_when_scraper_fails(mock_chrome):
+    with browser_pool.BrowserPool() as browsers:
+        with pytest.raises(RuntimeError):
+            with browsers.tab():
+                raise RuntimeError("scrape failed")
+        mock_chrome.return_value.close.assert_called_once()
+
+
+def test_browser_restarted_after_crash(mock_chrome):
+    crashed = MagicMock(current_window_handle="home")
+    crashed.close.side_effect = WebDriverException("chrome not reachable")
+    mock_chrome.side_effect = [crashed, MagicMock(current_window_handle="home")]
+
+    with browser_pool.BrowserPool() as browsers:
+        with browsers.tab():
+            pass
+        with browsers.tab():
+            pass
+
+    assert mock_chrome.call_count == 2
+    crashed.quit.assert_called_once()
+
+
+def test_browser_tab_without_pool(mock_chrome):
+    with browser_pool.browser_tab() as driver:
+        assert driver is mock_chrome.return_value
+    mock_chrome.return_value.quit.assert_called_once()
+
+
+def test_pool_gives_each_concurrent_tab_its_own_browser(mock_chrome):
+    mock_chrome.side_effect = lambda **_: MagicMock(current_window_handle="home")
+    barrier = threading.Barrier(2, timeout=5)
+    drivers = []
+
+    def scrape(browsers):
+        with browsers.tab() as driver:
+            drivers.append(driver)
+            barrier.wait()
+
+    with browser_pool.BrowserPool(2) as browsers:
+        threads = [threading.Thread(target=scrape, args=(browsers, )) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert mock_chrome.call_count == 2
+    assert drivers[0] is not drivers[1]
+    assert all(driver.quit.called for driver in drivers)
+
+
+def test_pool_reuses_a_started_browser(mock_chrome):
+    with browser_pool.BrowserPool(2) as browsers:
+        for _ in range(3):
+            with browsers.tab():
+                pass
+    mock_chrome.assert_called_once()
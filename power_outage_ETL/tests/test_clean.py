@@ -7,6 +7,7 @@ import os
 from unittest import mock
 from unittest.mock import patch, mock_open, MagicMock
 import clean_power_outage1 as cpo
+import extract_power_outage1
 
 CLEAN_CSV = 'clean_power_outage_data.csv'
 
@@ -24,8 +25,8 @@ def test_create_empty_clean_csv_creates_file():
     cpo.create_empty_clean_csv()
     assert os.path.exists(CLEAN_CSV)
     df = pd.read_csv(CLEAN_CSV)
-    expected_columns = ['reference_id', 'outage_start',
-                        'outage_end', 'Provider_name', 'planned']
+    expected_columns = ['reference_id', 'outage_start', 'outage_end', 'Provider_name',
+                        'planned', 'postcodes', 'content_hash']
     assert list(df.columns) == expected_columns
     assert df.empty
 
@@ -47,8 +48,7 @@ def test_clean_electric_nw_adds_new_data(mock_to_csv, mock_read_csv):
         'First reported at': ['2023-01-01 10:00'],
         'Estimated time of restoration': ['2023-01-01 14:00']
     })
-    mock_read_csv.side_effect = [input_df, pd.DataFrame(
-        columns=['reference_id'])]
+    mock_read_csv.side_effect = [input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
 
     cpo.clean_electric_nw()
 
@@ -68,7 +68,7 @@ def test_clean_national_grid_adds_data(mock_to_csv, mock_read_csv):
         'planned': ['true']
     })
     mock_read_csv.side_effect = [
-        input_df, pd.DataFrame(columns=['reference_id'])]
+        input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
 
     cpo.clean_national_grid()
     assert mock_to_csv.called
@@ -84,7 +84,7 @@ def test_clean_sp_handles_status_and_nan(mock_to_csv, mock_read_csv):
         'status': ['live']
     })
     mock_read_csv.side_effect = [
-        input_df, pd.DataFrame(columns=['reference_id'])]
+        input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
 
     cpo.clean_sp()
     assert mock_to_csv.called
@@ -108,7 +108,7 @@ def test_clean_ssen_adds_data(mock_to_csv, mock_read_csv):
         'planned': ['LV']
     })
     mock_read_csv.side_effect = [
-        input_df, pd.DataFrame(columns=['reference_id'])]
+        input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
 
     cpo.clean_ssen()
     assert mock_to_csv.called
@@ -124,7 +124,109 @@ def test_clean_uk_power_adds_data(mock_to_csv, mock_read_csv):
         'planned': ['Planned']
     })
     mock_read_csv.side_effect = [
-        input_df, pd.DataFrame(columns=['reference_id'])]
+        input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
 
     cpo.clean_uk_power()
     assert mock_to_csv.called
+
+
+def test_create_empty_clean_csv_adds_content_hash_column():
+    pd.DataFrame({'reference_id': ['NG1'], 'outage_start': [np.nan], 'outage_end': [np.nan],
+                  'Provider_name': ['National Grid'], 'planned': [True],
+                  'postcodes': [np.nan]}).to_csv(CLEAN_CSV, index=False)
+
+    cpo.create_empty_clean_csv()
+
+    df = pd.read_csv(CLEAN_CSV)
+    assert list(df.columns) == cpo.CLEAN_COLUMNS
+    assert df['reference_id'].tolist() == ['NG1']
+
+
+def test_hash_outages_changes_with_restoration_time():
+    df = pd.DataFrame({'reference_id': ['A', 'A', 'B'],
+                       'outage_start': ['2023-01-01 08:00'] * 3,
+                       'outage_end': ['2023-01-01 12:00', '2023-01-01 14:00', '2023-01-01 12:00'],
+                       'planned': [True] * 3, 'postcodes': ['E1 7DB'] * 3})
+    hashes = cpo.hash_outages(df)
+    assert hashes.nunique() == 3
+    assert hashes.equals(cpo.hash_outages(df.copy()))
+
+
+def test_append_new_or_changed_only_appends_changes():
+    cpo.create_empty_clean_csv()
+    outage = pd.DataFrame({'reference_id': ['NG1'], 'outage_start': ['2023-01-01 08:00'],
+                           'outage_end': ['2023-01-01 12:00'],
+                           'Provider_name': ['National Grid'], 'planned': [True],
+                           'postcodes': ['E1 7DB']})
+
+    assert cpo.append_new_or_changed(outage) == 1
+    assert cpo.append_new_or_changed(outage) == 0
+    assert cpo.append_new_or_changed(outage.assign(outage_end='2023-01-01 15:00')) == 1
+
+    df = pd.read_csv(CLEAN_CSV)
+    assert df['outage_end'].tolist() == ['2023-01-01 12:00', '2023-01-01 15:00']
+    assert df['content_hash'].nunique() == 2
+
+
+def test_normalise_postcode_formats():
+    assert cpo.normalise_postcode(' e17db ') == 'E1 7DB'
+    assert cpo.normalise_postcode('SW1A 1AA') == 'SW1A 1AA'
+    assert cpo.normalise_postcode('e1  7') == 'E1 7'
+    assert cpo.normalise_postcode('cv1') == 'CV1'
+    assert cpo.normalise_postcode('N/A') == ''
+
+
+def test_normalise_postcodes_splits_and_dedupes():
+    assert cpo.normalise_postcodes(
+        'e1 7db, E1 7;CV1|N/A, AB1 2CD AB1 2CE, E17DB') == 'E1 7DB;E1 7;CV1;AB1 2CD;AB1 2CE'
+    assert cpo.normalise_postcodes(np.nan) == ''
+
+
+@patch('pandas.read_csv')
+@patch('pandas.DataFrame.to_csv', autospec=True)
+def test_clean_uk_power_keeps_postcodes(mock_to_csv, mock_read_csv):
+    input_df = pd.DataFrame({
+        'incident_id': ['UK1', 'UK2'],
+        'outage_start': ['2023-01-01 08:00', '2023-01-01 09:00'],
+        'outage_end': ['2023-01-01 12:00', '2023-01-01 13:00'],
+        'planned': ['Planned', 'Unplanned'],
+        'postcodes': ['n1 9gu;N1 9GT', 'N/A']
+    })
+    mock_read_csv.side_effect = [
+        input_df, pd.DataFrame(columns=cpo.CLEAN_COLUMNS)]
+
+    cpo.clean_uk_power()
+
+    written = mock_to_csv.call_args[0][0]
+    assert written['postcodes'].iloc[0] == 'N1 9GU;N1 9GT'
+    assert pd.isna(written['postcodes'].iloc[1])
+
+
+def test_clean_changed_files_skips_unchanged_extracts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'ssen.csv').write_text('incident_id\nS1\n')
+    (tmp_path / 'sp.csv').write_text('Reference\nP1\n')
+    clean_ssen, clean_sp, clean_missing = MagicMock(), MagicMock(), MagicMock()
+    cleaners = {'ssen.csv': clean_ssen, 'sp.csv': clean_sp, 'missing.csv': clean_missing}
+
+    assert cpo.clean_changed_files(cleaners) == 2
+    (tmp_path / 'sp.csv').write_text('Reference\nP1\nP2\n')
+    assert cpo.clean_changed_files(cleaners) == 1
+
+    assert clean_ssen.call_count == 1
+    assert clean_sp.call_count == 2
+    clean_missing.assert_not_called()
+
+
+@patch("extract_power_outage1.fetch_if_changed", return_value=None)
+def test_unchanged_feed_leaves_other_providers_to_clean(_, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert extract_power_outage1.ssen_outage_data() == 0
+    assert not (tmp_path / 'ssen_outage_data.csv').exists()
+    (tmp_path / 'sp.csv').write_text('Reference\nP1\n')
+    clean_ssen, clean_sp = MagicMock(), MagicMock()
+
+    assert cpo.clean_changed_files({'ssen_outage_data.csv': clean_ssen,
+                                    'sp.csv': clean_sp}) == 1
+    clean_ssen.assert_not_called()
+    clean_sp.assert_called_once()
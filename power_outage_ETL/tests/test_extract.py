@@ -4,18 +4,44 @@ import unittest
 from unittest.mock import patch, mock_open, MagicMock
 import requests
 import os
+import tempfile
+import threading
 
+import psycopg2
 import extract_power_outage1
+import feed_state
+import seen_store
+from tests.test_feed_state import FakeFeedStateDB
+from tests.test_seen_store import FakeSeenDB
 
 
 class TestOutageScraper(unittest.TestCase):
 
-    @patch("extract_power_outage1.requests.get")
+    def setUp(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.feed_db = FakeFeedStateDB()
+        for state_patch in (patch("feed_state.connect_to_db", side_effect=self.feed_db.connect),
+                            patch("feed_state.FEED_STATE_STAGING_FILE",
+                                  os.path.join(state_dir.name, "feed_state.jsonl"))):
+            state_patch.start()
+            self.addCleanup(state_patch.stop)
+        self.seen_db = FakeSeenDB()
+        for seen_patch in (patch("seen_store.connect_to_db", side_effect=self.seen_db.connect),
+                           patch("seen_store.psycopg2.extras.execute_values",
+                                 side_effect=self.seen_db.insert),
+                           patch("seen_store.SEEN_STAGING_FILE",
+                                 os.path.join(state_dir.name, "seen.jsonl"))):
+            seen_patch.start()
+            self.addCleanup(seen_patch.stop)
+
+    @patch("extract_power_outage1.http_get")
     @patch("builtins.open", new_callable=mock_open, read_data="incident_id\n123")
     @patch("os.path.exists")
     def test_national_grid_data_fetch_success(self, mock_exists, mock_open_fn, mock_get):
         mock_exists.return_value = True
         mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {}
         mock_get.return_value.content = (
             b"Incident ID,Start Time,Planned,ETR,Region,Postcodes\n"
             b"456,2023-01-01,Yes,2023-01-02,Midlands,AB1\n"
@@ -23,20 +49,24 @@ class TestOutageScraper(unittest.TestCase):
 
         extract_power_outage1.national_gird_outage_data()
         self.assertTrue(mock_get.called)
-        self.assertIn("power_outages", mock_open_fn.call_args[0][0])
+        self.assertTrue(any("power_outages" in call[0][0]
+                            for call in mock_open_fn.call_args_list))
 
-    @patch("extract_power_outage1.requests.get")
+    @patch("extract_power_outage1.http_get")
     def test_national_grid_data_fetch_fail(self, mock_get):
         mock_get.side_effect = requests.exceptions.RequestException(
             "Connection failed")
         result = extract_power_outage1.national_gird_outage_data()
         self.assertIsNone(result)
 
-    @patch("extract_power_outage1.requests.get")
+    @patch("extract_power_outage1.http_get")
     @patch("os.path.exists")
     @patch("builtins.open", new_callable=mock_open)
     def test_uk_power_networks_outage_data(self, mock_open_fn, mock_exists, mock_get):
         mock_exists.return_value = False
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {}
+        mock_get.return_value.content = b"ukpn"
         mock_get.return_value.json.return_value = {
             "results": [{
                 "incidentreference": "abc123",
@@ -49,19 +79,23 @@ class TestOutageScraper(unittest.TestCase):
 
         extract_power_outage1.uk_power_networks_outage_data()
         mock_get.assert_called_once()
-        self.assertIn("ukpowernetworks", mock_open_fn.call_args[0][0])
+        self.assertTrue(any("ukpowernetworks" in call[0][0]
+                            for call in mock_open_fn.call_args_list))
 
-    @patch("extract_power_outage1.requests.get")
+    @patch("extract_power_outage1.http_get")
     def test_uk_power_networks_api_fail(self, mock_get):
         mock_get.side_effect = requests.exceptions.RequestException("API down")
         result = extract_power_outage1.uk_power_networks_outage_data()
         self.assertIsNone(result)
 
-    @patch("extract_power_outage1.requests.get")
+    @patch("extract_power_outage1.http_get")
     @patch("os.path.exists")
     @patch("builtins.open", new_callable=mock_open)
     def test_ssen_outage_data(self, mock_open_fn, mock_exists, mock_get):
         mock_exists.return_value = False
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {}
+        mock_get.return_value.content = b"ssen"
         mock_get.return_value.json.return_value = {
             "faults": [{
                 "reference": "ssen123",
@@ -74,20 +108,230 @@ class TestOutageScraper(unittest.TestCase):
 
         extract_power_outage1.ssen_outage_data()
         mock_get.assert_called_once()
-        self.assertIn("ssen_outage_data.csv", mock_open_fn.call_args[0][0])
-
-    @patch("extract_power_outage1.webdriver.Chrome")
-    @patch("extract_power_outage1.Service")
-    def test_setup_chrome_driver_success(self, mock_service, mock_chrome):
-        driver_mock = MagicMock()
-        mock_chrome.return_value = driver_mock
-        driver = extract_power_outage1.setup_chrome_driver()
-        self.assertEqual(driver, driver_mock)
-
-    @patch("extract_power_outage1.webdriver.Chrome", side_effect=Exception("Driver fail"))
-    def test_setup_chrome_driver_fail(self, mock_chrome):
-        result = extract_power_outage1.setup_chrome_driver()
-        self.assertIsNone(result)
+        self.assertTrue(any("ssen_outage_data.csv" in call[0][0]
+                            for call in mock_open_fn.call_args_list))
+
+    @patch("os.path.exists", return_value=True)
+    @patch("builtins.open", new_callable=mock_open,
+           read_data="incident_id,outage_end\n1,10:00\n1,12:00\n2,09:00\n")
+    def test_read_saved_hashes_keeps_latest_version(self, mock_open_fn, mock_exists):
+        fields = ['incident_id', 'outage_end']
+        hashes = extract_power_outage1.read_saved_hashes("saved.csv", fields)
+        self.assertEqual(hashes, {
+            '1': extract_power_outage1.record_hash({'incident_id': '1', 'outage_end': '12:00'},
+                                                   fields),
+            '2': extract_power_outage1.record_hash({'incident_id': '2', 'outage_end': '09:00'},
+                                                   fields)
+        })
+
+    @patch("extract_power_outage1.http_get")
+    @patch("extract_power_outage1.read_saved_hashes")
+    def test_ssen_outage_data_appends_only_changed_records(self, mock_hashes, mock_get):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(work_dir.name)
+        fault = {"reference": "ssen123", "loggedAtUtc": "2023-01-01", "type": "Unplanned",
+                 "estimatedRestorationTimeUtc": "2023-01-02", "affectedAreas": ["AB1"]}
+        fields = ['incident_id', 'outage_start', 'planned', 'outage_end', 'region', 'postcodes']
+        saved = {'incident_id': 'ssen123', 'outage_start': '2023-01-01', 'planned': 'Unplanned',
+                 'outage_end': '2023-01-02', 'region': 'SSEN', 'postcodes': 'AB1'}
+        mock_hashes.return_value = {
+            'ssen123': extract_power_outage1.record_hash(saved, fields)}
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {}
+        mock_get.return_value.content = b"ssen"
+        mock_get.return_value.json.return_value = {"faults": [fault]}
+
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 0)
+        self.seen_db.persist()
+
+        fault["estimatedRestorationTimeUtc"] = "2023-01-03"
+        mock_get.return_value.content = b"ssen changed"
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 1)
+        with open("ssen_outage_data.csv", encoding="utf-8") as f:
+            self.assertIn("ssen123,2023-01-01,Unplanned,2023-01-03", f.read())
+        mock_hashes.assert_called_once()
+
+    @patch("extract_power_outage1.http_get")
+    def test_records_appended_again_when_the_load_never_saved_them(self, mock_get):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(work_dir.name)
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {}
+        mock_get.return_value.content = b"ssen"
+        mock_get.return_value.json.return_value = {"faults": [{"reference": "ssen123"}]}
+
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 1)
+        # The load failed and the next task starts on a fresh disk
+        os.remove("ssen_outage_data.csv")
+        seen_store.clear_staged_records()
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 1)
+        self.seen_db.persist()
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 0)
+
+    @patch("extract_power_outage1.read_saved_hashes")
+    def test_open_seen_records_seeds_once_and_keeps_records_without_csv(self, mock_hashes):
+        mock_hashes.return_value = {"NG1": "h1"}
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("incident_id\nNG1\n")
+        self.addCleanup(os.remove, f.name)
+
+        for _ in range(2):
+            with extract_power_outage1.open_seen_records("ng", f.name, ["incident_id"]) as seen:
+                self.assertFalse(seen.is_new_or_changed("NG1", "h1"))
+            self.seen_db.persist()
+        mock_hashes.assert_called_once()
+
+        with extract_power_outage1.open_seen_records("ng", "missing.csv", ["incident_id"]) as seen:
+            self.assertFalse(seen.is_new_or_changed("NG1", "h1"))
+        mock_hashes.assert_called_once()
+
+    @patch("extract_power_outage1.http_get")
+    def test_fetch_if_changed_sends_validators_and_skips_not_modified(self, mock_get):
+        response = MagicMock(status_code=200, content=b"v1",
+                             headers={"ETag": '"abc"', "Last-Modified": "Mon, 01 Jan 2024"})
+        mock_get.return_value = response
+        self.assertIs(extract_power_outage1.fetch_if_changed("ssen", "https://ssen", 5),
+                      response)
+        extract_power_outage1.save_feed_state("ssen", response)
+        feed_state.persist_staged_feed_state(self.feed_db.cursor)
+
+        mock_get.return_value = MagicMock(status_code=304)
+        self.assertIsNone(extract_power_outage1.fetch_if_changed(
+            "ssen", "https://ssen", 5, headers={"User-Agent": "etl"}))
+        self.assertEqual(mock_get.call_args[1]["headers"],
+                         {"User-Agent": "etl", "If-None-Match": '"abc"',
+                          "If-Modified-Since": "Mon, 01 Jan 2024"})
+
+    @patch("extract_power_outage1.http_get")
+    def test_fetch_if_changed_skips_identical_payload(self, mock_get):
+        extract_power_outage1.save_feed_state(
+            "ukpn", MagicMock(status_code=200, content=b"same", headers={}))
+        feed_state.persist_staged_feed_state(self.feed_db.cursor)
+
+        mock_get.return_value = MagicMock(status_code=200, content=b"same", headers={})
+        self.assertIsNone(extract_power_outage1.fetch_if_changed("ukpn", "https://ukpn", 5))
+        self.assertNotIn("If-None-Match", mock_get.call_args[1]["headers"])
+
+        mock_get.return_value = MagicMock(status_code=200, content=b"changed", headers={})
+        self.assertIsNotNone(extract_power_outage1.fetch_if_changed("ukpn", "https://ukpn", 5))
+
+    @patch("extract_power_outage1.http_get")
+    def test_fetch_if_changed_without_feed_state_db(self, mock_get):
+        with patch("feed_state.connect_to_db",
+                   side_effect=psycopg2.OperationalError("down")):
+            mock_get.return_value = MagicMock(status_code=200, content=b"v1", headers={})
+            self.assertIsNotNone(extract_power_outage1.fetch_if_changed("ssen", "https://ssen", 5))
+
+    @patch("extract_power_outage1.save_feed_state")
+    @patch("extract_power_outage1.fetch_if_changed", return_value=None)
+    @patch("builtins.open", new_callable=mock_open)
+    def test_unchanged_feed_skips_parsing(self, mock_open_fn, mock_fetch, mock_save):
+        self.assertEqual(extract_power_outage1.uk_power_networks_outage_data(), 0)
+        self.assertEqual(extract_power_outage1.ssen_outage_data(), 0)
+        mock_open_fn.assert_not_called()
+        mock_save.assert_not_called()
+
+    def test_run_extractor_reports_success(self):
+        metric = extract_power_outage1.run_extractor("NG", lambda: 3)
+        self.assertTrue(metric['succeeded'])
+        self.assertEqual(metric['records'], 3)
+        self.assertEqual(metric['provider'], "NG")
+
+    def test_run_extractor_reports_failure(self):
+        def broken():
+            raise RuntimeError("browser crashed")
+
+        failed = extract_power_outage1.run_extractor("ENW", broken)
+        no_data = extract_power_outage1.run_extractor("SSEN", lambda: None)
+        self.assertFalse(failed['succeeded'])
+        self.assertEqual(failed['error'], "browser crashed")
+        self.assertFalse(no_data['succeeded'])
+
+    @patch("extract_power_outage1.BrowserPool")
+    @patch("extract_power_outage1.create_empty_csv_files")
+    def test_extract_all_runs_providers_concurrently(self, mock_create, mock_pool):
+        barrier = threading.Barrier(3, timeout=5)
+        browsers = mock_pool.return_value.__enter__.return_value
+        browsers.size = 1
+
+        def extractor(*args):
+            barrier.wait()
+            return 1
+
+        def browser_extractor(pool):
+            self.assertIs(pool, browsers)
+            return 0
+
+        metrics = extract_power_outage1.extract_all(
+            {"NG": extractor, "UKPN": extractor}, {"NPG": extractor, "ENW": browser_extractor})
+
+        self.assertEqual([metric['provider'] for metric in metrics],
+                         ["NG", "UKPN", "NPG", "ENW"])
+        self.assertTrue(all(metric['succeeded'] for metric in metrics))
+        mock_pool.return_value.__exit__.assert_called_once()
+        mock_create.assert_called_once()
+
+    @patch("extract_power_outage1.BrowserPool")
+    @patch("extract_power_outage1.create_empty_csv_files")
+    def test_extract_all_runs_browser_scrapers_on_their_own_browsers(self, mock_create,
+                                                                     mock_pool):
+        barrier = threading.Barrier(2, timeout=5)
+        mock_pool.return_value.__enter__.return_value.size = 2
+
+        def browser_extractor(pool):
+            barrier.wait()
+            return 1
+
+        metrics = extract_power_outage1.extract_all(
+            {}, {"NPG": browser_extractor, "ENW": browser_extractor})
+        self.assertTrue(all(metric['succeeded'] for metric in metrics))
+
+    def test_parse_enw_fault(self):
+        html = ('<ul class="c-fault-information__list"><li><h3>Reference</h3><p>ENW1</p></li>'
+                '<li><h3>Postcodes</h3><p>M1 1AA</p></li><li><h3>Empty</h3></li></ul>')
+        self.assertEqual(extract_power_outage1.parse_enw_fault(html),
+                         {'Reference': 'ENW1', 'Postcodes': 'M1 1AA'})
+
+    @patch("extract_power_outage1.http_get",
+           side_effect=requests.exceptions.ConnectionError("reset"))
+    def test_fetch_enw_fault_failure(self, mock_get):
+        self.assertEqual(extract_power_outage1.fetch_enw_fault("https://enwl/f/1"), {})
+
+    @patch("extract_power_outage1.open_enw_fault_in_browser",
+           return_value={'Reference': 'ENW3'})
+    @patch("extract_power_outage1.fetch_enw_fault",
+           side_effect=lambda url: {'Reference': url[-4:]} if url.endswith("ENW1") else {})
+    @patch("extract_power_outage1.find_enw_fault_links",
+           return_value=["https://enwl/f/ENW1", "https://enwl/f/ENW2", None])
+    @patch("extract_power_outage1.browser_tab")
+    @patch("builtins.open", new_callable=mock_open)
+    def test_electric_nw_fetches_details_over_http(self, mock_open_fn, mock_tab, _,
+                                                   mock_fetch, mock_browser):
+        browsers = MagicMock()
+        self.assertEqual(extract_power_outage1.electric_nw_outage_data(browsers), 3)
+
+        mock_tab.assert_called_once_with(browsers)
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual([call[0][2] for call in mock_browser.call_args_list], [1, 2])
+
+    @patch("extract_power_outage1.ENW_DETAIL_WORKERS", 1)
+    @patch("extract_power_outage1.fetch_enw_fault",
+           side_effect=lambda url: {} if url.endswith("ENW2") else {'Reference': url[-4:]})
+    def test_fetch_enw_faults_switches_to_browser_after_empty_result(self, mock_fetch):
+        fetched = extract_power_outage1.fetch_enw_faults(
+            ["https://enwl/f/ENW1", "https://enwl/f/ENW2", "https://enwl/f/ENW3", None])
+        self.assertEqual(fetched, [{'Reference': 'ENW1'}, {}, {}, {}])
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    @patch("extract_power_outage1.WebDriverWait")
+    @patch("extract_power_outage1.browser_tab")
+    def test_electric_nw_no_faults_listed(self, mock_tab, mock_wait):
+        mock_wait.return_value.until.side_effect = extract_power_outage1.TimeoutException()
+        self.assertEqual(extract_power_outage1.electric_nw_outage_data(), 0)
 
 
 if __name__ == '__main__':
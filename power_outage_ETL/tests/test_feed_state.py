@@ -0,0 +1,69 @@
+# pylint: skip-file
+
+from unittest.mock import patch, MagicMock
+import psycopg2
+import pytest
+import feed_state
+
+
+class FakeFeedStateDB:
+    """outage_feed_state rows kept in memory"""
+
+    def __init__(self):
+        self.rows = {}
+        self.cursor = MagicMock()
+        self.cursor.execute.side_effect = self.execute
+
+    def execute(self, query, params):
+        if "INSERT INTO outage_feed_state" in query:
+            self.rows[params[0]] = tuple(params[1:])
+        else:
+            self.cursor.fetchone.return_value = self.rows.get(params[0])
+
+    def connect(self):
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = self.cursor
+        return connection
+
+
+@pytest.fixture
+def feed_db(tmp_path):
+    db = FakeFeedStateDB()
+    with patch("feed_state.connect_to_db", side_effect=db.connect), \
+            patch("feed_state.FEED_STATE_STAGING_FILE", str(tmp_path / "staged.jsonl")):
+        yield db
+
+
+def response(content, etag=None):
+    return MagicMock(status_code=200, content=content,
+                     headers={"ETag": etag} if etag else {})
+
+
+def test_saved_state_is_only_staged_until_persisted(feed_db):
+    feed_state.save_feed_state("ssen", response(b"v1", '"abc"'))
+    assert feed_state.read_feed_state("ssen") == {}
+
+    assert feed_state.persist_staged_feed_state(feed_db.cursor) == 1
+    feed_state.clear_staged_feed_state()
+    assert feed_state.read_feed_state("ssen")["etag"] == '"abc"'
+    assert feed_state.read_staged_feed_state() == {}
+
+
+def test_latest_staged_state_of_each_feed_is_persisted(feed_db):
+    feed_state.save_feed_state("ssen", response(b"v1", '"a"'))
+    feed_state.save_feed_state("ukpn", response(b"u1"))
+    feed_state.save_feed_state("ssen", response(b"v2", '"b"'))
+
+    assert feed_state.persist_staged_feed_state(feed_db.cursor) == 2
+    assert feed_db.rows["ssen"][0] == '"b"'
+
+
+def test_clearing_discards_staged_state(feed_db):
+    feed_state.save_feed_state("ssen", response(b"v1"))
+    feed_state.clear_staged_feed_state()
+    assert feed_state.persist_staged_feed_state(feed_db.cursor) == 0
+
+
+def test_read_feed_state_without_database(feed_db):
+    with patch("feed_state.connect_to_db", side_effect=psycopg2.OperationalError("down")):
+        assert feed_state.read_feed_state("ssen") == {}
@@ -1,38 +1,251 @@
 # pylint: skip-file
 
+import json
+import os
 import pytest
+import pandas as pd
 from unittest.mock import patch, MagicMock
+import psycopg2
 import load_power_outage as lpo
 
 
+CSV_HEADER = "reference_id,outage_start,outage_end,Provider_name,planned,postcodes,content_hash\n"
+
+
+def write_csv(path, *rows):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(row + "\n" for row in rows))
+
+
+@pytest.fixture
+def clean_csv(tmp_path):
+    path = tmp_path / "clean.csv"
+    path.write_text(CSV_HEADER)
+    return str(path)
+
+
+def state_cursor():
+    """A cursor keeping etl_load_state rows in memory"""
+    cursor = MagicMock()
+    saved = {}
+
+    def execute(query, params=None):
+        if "INSERT INTO etl_load_state" in query:
+            saved[params[0]] = params[1:]
+        elif "FROM etl_load_state" in query:
+            cursor.fetchone.return_value = saved.get(params[0])
+
+    cursor.execute.side_effect = execute
+    return cursor
+
+
+@pytest.fixture(autouse=True)
+def staged_feed_state():
+    with patch("load_power_outage.persist_staged_feed_state", return_value=0) as persist, \
+            patch("load_power_outage.clear_staged_feed_state") as clear, \
+            patch("load_power_outage.persist_staged_records", return_value=0), \
+            patch("load_power_outage.clear_staged_records"):
+        yield persist, clear
+
+
+@patch("load_power_outage.notify_new_outages")
+@patch("load_power_outage.load_outages", return_value=(["ref123"], []))
+@patch("load_power_outage.get_provider_ids", return_value={"TestProvider": 1})
 @patch("load_power_outage.psycopg2.connect")
-@patch("load_power_outage.pd.read_csv")
-def test_upload_data_from_csv(mock_read_csv, mock_connect):
-    mock_df = MagicMock()
-
-    mock_df.iterrows.return_value = iter([
-        (0, {
-            'reference_id': 'ref123',
-            'outage_start': '2023-01-01 10:00',
-            'outage_end': '2023-01-01 11:00',
-            'Provider_name': 'TestProvider',
-            'planned': 'true'
-        })
-    ])
-    mock_read_csv.return_value = mock_df
+def test_upload_data_from_csv(mock_connect, _, mock_load, mock_notify, clean_csv):
+    write_csv(clean_csv, "ref123,2023-01-01 10:00,2023-01-01 11:00,TestProvider,true,E1 7DB,h1")
+    mock_conn = mock_connect.return_value
+    mock_conn.cursor.return_value = state_cursor()
 
-    mock_cursor = MagicMock()
+    lpo.upload_data_from_csv(clean_csv)
+
+    outages, postcodes = mock_load.call_args[0][2:]
+    assert outages == [("ref123", "2023-01-01 10:00", "2023-01-01 11:00", 1, True, "h1")]
+    assert postcodes == {"ref123": ["E1 7DB"]}
+    mock_conn.cursor.return_value.close.assert_called_once()
+    mock_conn.close.assert_called_once()
+    mock_notify.assert_called_once_with(["ref123"])
+
+
+@patch("load_power_outage.load_outages")
+@patch("load_power_outage.psycopg2.connect")
+def test_feed_state_saved_after_outages_load(mock_connect, mock_load, staged_feed_state,
+                                             clean_csv):
+    persist, clear = staged_feed_state
+    events = []
+    mock_load.side_effect = lambda *_: events.append("load") or ([], [])
+    persist.side_effect = lambda *_: events.append("persist") or 1
+    mock_connect.return_value.cursor.return_value = state_cursor()
+    write_csv(clean_csv, "ref123,,,TestProvider,true,,h1")
+
+    with patch("load_power_outage.get_provider_ids", return_value={}):
+        lpo.upload_data_from_csv(clean_csv)
+
+    assert events == ["load", "persist"]
+    clear.assert_called_once()
+
+
+@patch("load_power_outage.load_outages", side_effect=psycopg2.Error("load failed"))
+@patch("load_power_outage.psycopg2.connect")
+def test_feed_state_not_saved_when_load_fails(mock_connect, _, staged_feed_state, clean_csv):
+    persist, clear = staged_feed_state
+    mock_connect.return_value.cursor.return_value = state_cursor()
+    write_csv(clean_csv, "ref123,,,TestProvider,true,,h1")
+
+    with patch("load_power_outage.get_provider_ids", return_value={}), \
+            pytest.raises(psycopg2.Error):
+        lpo.upload_data_from_csv(clean_csv)
+
+    persist.assert_not_called()
+    clear.assert_not_called()
+
+
+@patch("load_power_outage.notify_new_outages")
+@patch("load_power_outage.load_outages", side_effect=lambda _, __, outages, ___: (
+    [outage[0] for outage in outages], []))
+@patch("load_power_outage.get_provider_ids", return_value={"TestProvider": 1})
+@patch("load_power_outage.psycopg2.connect")
+def test_upload_data_from_csv_only_loads_new_rows(mock_connect, _, mock_load, mock_notify,
+                                                  clean_csv):
+    mock_connect.return_value.cursor.return_value = state_cursor()
+    write_csv(clean_csv, "old1,,,TestProvider,true,,h1")
+    lpo.upload_data_from_csv(clean_csv)
+
+    write_csv(clean_csv, "new1,,,TestProvider,false,,h2", "new2,,,Unknown,,,h3")
+    lpo.upload_data_from_csv(clean_csv)
+
+    outages = mock_load.call_args[0][2]
+    assert outages == [("new1", None, None, 1, False, "h2"),
+                       ("new2", None, None, None, None, "h3")]
+    assert mock_notify.call_args[0][0] == ["new1", "new2"]
+
+    lpo.upload_data_from_csv(clean_csv)
+    assert mock_load.call_count == 2
+    mock_connect.return_value.close.assert_called()
+
+
+def test_read_load_offset_resumes_after_loaded_rows(clean_csv):
+    cursor = state_cursor()
+    write_csv(clean_csv, "old1,,,TestProvider,true,,h1")
+    offset = len(CSV_HEADER) + len("old1,,,TestProvider,true,,h1\n")
+    lpo.save_load_offset(MagicMock(), cursor, clean_csv, offset)
+    write_csv(clean_csv, "new1,,,TestProvider,false,,h2")
+    assert lpo.read_load_offset(cursor, clean_csv) == offset
+
+
+def test_read_load_offset_resets_when_csv_shrinks(clean_csv):
+    cursor = state_cursor()
+    cursor.fetchone.return_value = (10000, "hash")
+    cursor.execute.side_effect = None
+    assert lpo.read_load_offset(cursor, clean_csv) == 0
+
+
+def test_read_load_offset_resets_when_csv_recreated(clean_csv):
+    cursor = state_cursor()
+    write_csv(clean_csv, "old1,,,TestProvider,true,,h1")
+    offset = len(CSV_HEADER) + len("old1,,,TestProvider,true,,h1\n")
+    lpo.save_load_offset(MagicMock(), cursor, clean_csv, offset)
+    with open(clean_csv, "w", encoding="utf-8") as f:
+        f.write(CSV_HEADER + "new1,,,TestProvider,false,,h2\n" + "new2,,,TestProvider,,,h3\n")
+    assert lpo.read_load_offset(cursor, clean_csv) == 0
+
+
+def test_read_load_offset_resets_when_clean_csv_gains_content_hashes(tmp_path):
+    cursor = state_cursor()
+    clean_csv = str(tmp_path / "clean.csv")
+    rows = "old1,2023-01-01 10:00,,TestProvider,true,\n"
+    with open(clean_csv, "w", encoding="utf-8") as f:
+        f.write("reference_id,outage_start,outage_end,Provider_name,planned,postcodes\n" + rows)
+    lpo.save_load_offset(MagicMock(), cursor, clean_csv, os.path.getsize(clean_csv))
+
+    pd.read_csv(clean_csv).reindex(columns=CSV_HEADER.strip().split(",")).to_csv(
+        clean_csv, index=False)
+    assert lpo.read_load_offset(cursor, clean_csv) == 0
+
+
+def test_read_load_offset_without_state(clean_csv):
+    cursor = state_cursor()
+    assert lpo.read_load_offset(cursor, clean_csv) == 0
+
+
+@patch("load_power_outage.psycopg2.extras.execute_values")
+def test_load_outages_commits_once_per_batch(mock_execute_values):
+    mock_execute_values.side_effect = [[("a", 1, True), ("b", 2, False)], None, []]
     mock_conn = MagicMock()
-    mock_connect.return_value = mock_conn
-    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor = MagicMock()
+    outages = [("a", None, None, 1, True, "h1"), ("b", None, None, 1, True, "h2"),
+               ("c", None, None, 1, True, "h3")]
+
+    inserted, updated = lpo.load_outages(mock_conn, mock_cursor, outages,
+                                         {"a": ["E1 7DB"], "b": ["N1"], "c": ["CV1"]},
+                                         batch_size=2)
+
+    assert inserted == ["a"]
+    assert updated == ["b"]
+    assert mock_conn.commit.call_count == 2
+    assert mock_cursor.execute.call_args[0][1] == ([2],)
+    assert mock_execute_values.call_args_list[1][0][2] == [(1, "E1 7DB"), (2, "N1")]
+    upsert = mock_execute_values.call_args_list[0][0][1]
+    assert "ON CONFLICT (reference_id) DO UPDATE" in upsert
+    assert "IS DISTINCT FROM EXCLUDED.content_hash" in upsert
+
+
+def test_build_outage_rows_keeps_latest_version():
+    df = pd.DataFrame({"reference_id": ["a", "b", "a"],
+                       "outage_start": ["2023-01-01 08:00"] * 3,
+                       "outage_end": ["2023-01-01 12:00", None, "2023-01-01 15:00"],
+                       "Provider_name": ["TestProvider"] * 3,
+                       "planned": ["true"] * 3,
+                       "postcodes": ["E1 7DB", None, "E1 7DB;E1 6AN"],
+                       "content_hash": ["h1", "h2", "h3"]})
+
+    outages, postcodes = lpo.build_outage_rows(df, {"TestProvider": 1})
+
+    assert outages == [("b", "2023-01-01 08:00", None, 1, True, "h2"),
+                       ("a", "2023-01-01 08:00", "2023-01-01 15:00", 1, True, "h3")]
+    assert postcodes == {"b": [], "a": ["E1 7DB", "E1 6AN"]}
+
+
+def test_get_provider_ids():
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [("TestProvider", 1), ("Other", 2)]
+    assert lpo.get_provider_ids(mock_cursor) == {"TestProvider": 1, "Other": 2}
+
+
+@patch("load_power_outage.boto3.client")
+def test_notify_new_outages(mock_client):
+    with patch("load_power_outage.ALERTS_FUNCTION_NAME", "alerts-lambda"):
+        lpo.notify_new_outages(['new1'])
+
+    kwargs = mock_client.return_value.invoke.call_args[1]
+    assert kwargs['FunctionName'] == 'alerts-lambda'
+    assert kwargs['InvocationType'] == 'Event'
+    assert json.loads(kwargs['Payload']) == {"source": "outage_load", "new_outages": 1}
+
+
+@patch("load_power_outage.boto3.client")
+def test_notify_new_outages_payload_does_not_grow_with_outages(mock_client):
+    with patch("load_power_outage.ALERTS_FUNCTION_NAME", "alerts-lambda"):
+        lpo.notify_new_outages([f"INC{i:010d}" for i in range(100000)])
+
+    payload = mock_client.return_value.invoke.call_args[1]['Payload']
+    assert json.loads(payload)['new_outages'] == 100000
+    assert len(payload) < 100
+
+
+@patch("load_power_outage.boto3.client")
+def test_notify_new_outages_nothing_new(mock_client):
+    with patch("load_power_outage.ALERTS_FUNCTION_NAME", "alerts-lambda"):
+        lpo.notify_new_outages([])
+    mock_client.assert_not_called()
+
 
-    with patch("load_power_outage.get_provider_id", return_value=1), \
-            patch("load_power_outage.check_if_outage_exists", return_value=False), \
-            patch("load_power_outage.insert_outage_data") as mock_insert:
+def test_split_postcodes():
+    assert lpo.split_postcodes('E1 7DB;E1 7;CV1') == ['E1 7DB', 'E1 7', 'CV1']
+    assert lpo.split_postcodes(float('nan')) == []
 
-        lpo.upload_data_from_csv("fakefile.csv")
 
-        mock_connect.assert_called_once()
-        mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
-        mock_insert.assert_called_once()
+@patch("load_power_outage.psycopg2.extras.execute_values")
+def test_insert_outage_postcodes_nothing_to_insert(mock_execute_values):
+    lpo.insert_outage_postcodes(MagicMock(), [])
+    mock_execute_values.assert_not_called()
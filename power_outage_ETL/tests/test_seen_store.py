@@ -0,0 +1,154 @@
+# pylint: skip-file
+
+from unittest.mock import patch, MagicMock
+import pytest
+import seen_store
+from seen_store import SeenRecords
+
+
+class FakeSeenDB:
+    """outage_seen_records kept in memory, with the clock set by `now` in days"""
+
+    def __init__(self):
+        self.rows = {}
+        self.now = 0
+
+    def execute(self, cursor, query, params):
+        if "DELETE" in query:
+            provider, ttl_days = params
+            expired = [key for key, (_, seen_at) in self.rows.items()
+                       if key[0] == provider and seen_at < self.now - ttl_days]
+            for key in expired:
+                del self.rows[key]
+            cursor.rowcount = len(expired)
+        elif "LIMIT 1" in query:
+            cursor.fetchone.return_value = (1, ) if any(
+                key[0] == params[0] for key in self.rows) else None
+        else:
+            row = self.rows.get(params)
+            cursor.fetchone.return_value = (row[0], ) if row else None
+
+    def insert(self, _, __, rows):
+        for provider, record_id, content_hash in rows:
+            self.rows[(provider, record_id)] = (content_hash, self.now)
+
+    def connect(self):
+        cursor = MagicMock()
+        cursor.execute.side_effect = lambda query, params: self.execute(cursor, query, params)
+        connection = MagicMock()
+        connection.cursor.return_value = cursor
+        return connection
+
+    def persist(self, ttl_days=0):
+        """Save the staged records as the load does once the outages are loaded"""
+        saved = seen_store.persist_staged_records(self.connect().cursor(), ttl_days)
+        seen_store.clear_staged_records()
+        return saved
+
+
+@pytest.fixture
+def seen_db(tmp_path):
+    db = FakeSeenDB()
+    with patch("seen_store.connect_to_db", side_effect=db.connect), \
+            patch("seen_store.psycopg2.extras.execute_values", side_effect=db.insert), \
+            patch("seen_store.SEEN_STAGING_FILE", str(tmp_path / "seen.jsonl")):
+        yield db
+
+
+def test_is_new_or_changed_compares_with_saved_hash(seen_db):
+    with SeenRecords("ssen") as seen:
+        assert seen.is_new_or_changed("S1", "a")
+        assert not seen.is_new_or_changed("S1", "a")
+        seen.save()
+    seen_db.persist()
+
+    with SeenRecords("ssen") as seen:
+        assert not seen.is_new_or_changed("S1", "a")
+        assert seen.is_new_or_changed("S1", "b")
+        assert seen.is_new_or_changed("S2", "a")
+
+
+def test_saved_records_are_only_staged_until_persisted(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("S1", "a")
+        seen.save()
+        assert not seen.is_new_or_changed("S1", "a")
+    assert seen_db.rows == {}
+
+    with SeenRecords("ssen") as seen:
+        assert seen.is_new_or_changed("S1", "a")
+
+    assert seen_db.persist() == 1
+    assert seen_db.rows[("ssen", "S1")][0] == "a"
+
+
+def test_clearing_discards_staged_records(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("S1", "a")
+        seen.save()
+    seen_store.clear_staged_records()
+    assert seen_db.persist() == 0
+
+
+def test_close_closes_connection(seen_db):
+    seen = SeenRecords("ssen")
+    seen.close()
+    seen.conn.close.assert_called_once()
+
+
+def test_unsaved_records_are_discarded(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("S1", "a")
+    seen_db.persist()
+
+    with SeenRecords("ssen") as seen:
+        assert seen.is_new_or_changed("S1", "a")
+
+
+def test_providers_are_kept_apart(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("1", "a")
+        seen.save()
+    seen_db.persist()
+
+    with SeenRecords("ukpn") as seen:
+        assert seen.is_new_or_changed("1", "a")
+
+
+def test_seed_only_loads_hashes_once(seen_db):
+    calls = []
+
+    def load_hashes():
+        calls.append(1)
+        return {"S1": "a"}
+
+    for _ in range(2):
+        with SeenRecords("ssen") as seen:
+            seen.seed(load_hashes)
+            assert not seen.is_new_or_changed("S1", "a")
+        seen_db.persist()
+    assert len(calls) == 1
+
+
+def test_seed_without_hashes_saves_nothing(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.seed(dict)
+    assert seen_db.persist() == 0
+
+
+def test_persist_expires_records_older_than_ttl(seen_db):
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("old", "a")
+        seen.is_new_or_changed("current", "a")
+        seen.save()
+    seen_db.persist(ttl_days=1)
+
+    seen_db.now = 2
+    with SeenRecords("ssen") as seen:
+        seen.is_new_or_changed("current", "a")
+        seen.save()
+    seen_db.persist(ttl_days=1)
+
+    with SeenRecords("ssen") as seen:
+        assert seen.is_new_or_changed("old", "a")
+        assert not seen.is_new_or_changed("current", "a")
@@ -6,8 +6,14 @@ import os
 import logging
 from dotenv import load_dotenv
 import psycopg2
+import requests
 import boto3
 from botocore.exceptions import ClientError
+from postcode_lookup import get_region_from_postcode
+
+# Channels an alert can be sent through, matching the check on alerts.alert_channel
+ALERT_CHANNELS = ("email", "sms", "both")
+DEFAULT_ALERT_CHANNEL = "email"
 
 
 def enable_logging() -> None:
@@ -40,7 +46,8 @@ def define_user_info(response: dict) -> dict:
             "postcode": body.get("postcode"),
             "region": body.get("region"),
             "email": body.get("email"),
-            "type": body.get("type")
+            "type": body.get("type"),
+            "alert_channel": body.get("alert_channel")
         }
         return user_info
     except Exception as e:
@@ -145,19 +152,48 @@ def check_if_user_has_alert(cursor: 'Cursor', user: dict, user_id: int) -> bool:
     return False
 
 
-def subscribe_user_to_alert(cursor: 'Cursor', user_id: int, user: dict):
-    """Subscribing user to alert based on chosen region, updating alerts table"""
+def resolve_alert_region(cursor: 'Cursor', user: dict) -> tuple:
+    """Finding the region and provider ids for an alert from the chosen region, or by
+    geocoding the postcode. Returns (None, None) if it can't be resolved yet, leaving it
+    for the alerts backfill job"""
     region = user.get("region")
     postcode = user.get("postcode")
+
+    if not region and postcode:
+        try:
+            region = get_region_from_postcode(postcode, cursor)
+        except (ValueError, requests.RequestException) as e:
+            logging.warning("Could not resolve region for postcode %s: %s", postcode, e)
+            return None, None
+
+    query = """SELECT region_id, provider_id FROM regions WHERE region_name = %s"""
+    cursor.execute(query, (region, ))
+    result = cursor.fetchone()
+    return tuple(result) if result else (None, None)
+
+
+def get_alert_channel(user: dict) -> str:
+    """Finding how the user wants to be alerted, falling back to email"""
+    channel = user.get("alert_channel")
+    if channel not in ALERT_CHANNELS:
+        if channel:
+            logging.warning("Unknown alert channel %s, using %s", channel,
+                            DEFAULT_ALERT_CHANNEL)
+        return DEFAULT_ALERT_CHANNEL
+    return channel
+
+
+def subscribe_user_to_alert(cursor: 'Cursor', user_id: int, user: dict):
+    """Subscribing user to alert based on chosen region or postcode, updating alerts table
+    with the region and provider resolved now so alert runs don't have to"""
+    postcode = user.get("postcode")
     logging.info("Subscribing user to alert...")
+    region_id, provider_id = resolve_alert_region(cursor, user)
 
-    query = """INSERT INTO alerts (user_id, region_id, postcode)
-                    VALUES (
-                        %s,
-                        (SELECT region_id FROM regions WHERE region_name = %s),
-                        %s
-                    )"""
-    cursor.execute(query, (user_id, region, postcode))
+    query = """INSERT INTO alerts (user_id, region_id, provider_id, postcode, alert_channel)
+                    VALUES (%s, %s, %s, %s, %s)"""
+    cursor.execute(query, (user_id, region_id, provider_id, postcode,
+                           get_alert_channel(user)))
 
 
 def handle_alerts(cursor: 'Cursor', user_id: int, user: dict):
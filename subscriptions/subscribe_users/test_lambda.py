@@ -1,7 +1,10 @@
 # pylint: skip-file
-from subscribe_lambda import user_details, define_user_info
+from subscribe_lambda import (user_details, define_user_info, resolve_alert_region,
+                              subscribe_user_to_alert, get_alert_channel)
 import json
 import pytest
+import requests
+from unittest.mock import MagicMock, patch
 
 
 def test_define_user_info():
@@ -27,7 +30,8 @@ def test_define_user_info():
                                           "postcode": "area",
                                           "region": "areas",
                                           "email": "fakeemail",
-                                          "type": "newsletter"}
+                                          "type": "newsletter",
+                                          "alert_channel": None}
 
 
 def test_define_user_info_edge_case():
@@ -52,3 +56,59 @@ def test_user_details_edge_case():
     user = {}
     with pytest.raises(ValueError):
         user_details(user)
+
+
+def test_resolve_alert_region_from_region():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (13, 6)
+    assert resolve_alert_region(cursor, {"region": "London", "postcode": None}) == (13, 6)
+    assert cursor.execute.call_args[0][1] == ("London", )
+
+
+@patch("subscribe_lambda.get_region_from_postcode", return_value="Wales")
+def test_resolve_alert_region_from_postcode(mock_lookup):
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (17, 2)
+    assert resolve_alert_region(cursor, {"region": None, "postcode": "LL57 2DG"}) == (17, 2)
+    mock_lookup.assert_called_once_with("LL57 2DG", cursor)
+
+
+@patch("subscribe_lambda.get_region_from_postcode", side_effect=ValueError)
+def test_resolve_alert_region_unresolved(_):
+    cursor = MagicMock()
+    assert resolve_alert_region(cursor, {"region": None, "postcode": "CH4 0AA"}) == (None, None)
+    cursor.execute.assert_not_called()
+
+
+@patch("postcode_lookup.http_get")
+def test_resolve_alert_region_leaves_commit_to_signup(mock_get):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {
+        "result": {"european_electoral_region": "North West"}}
+    cursor = MagicMock()
+    cursor.fetchone.side_effect = [None, (7, 3)]
+    assert resolve_alert_region(cursor, {"region": None, "postcode": "CH4 0AA"}) == (7, 3)
+    cursor.connection.commit.assert_not_called()
+
+
+@patch("postcode_lookup.http_get")
+def test_resolve_alert_region_postcodes_io_unavailable(mock_get):
+    mock_get.return_value.status_code = 503
+    mock_get.return_value.raise_for_status.side_effect = requests.HTTPError("503")
+    cursor = MagicMock()
+    cursor.fetchone.return_value = None
+    assert resolve_alert_region(cursor, {"region": None, "postcode": "CH4 0AA"}) == (None, None)
+
+
+@patch("subscribe_lambda.resolve_alert_region", return_value=(17, 2))
+def test_subscribe_user_to_alert_stores_provider(_):
+    cursor = MagicMock()
+    subscribe_user_to_alert(cursor, 5, {"region": None, "postcode": "LL57 2DG"})
+    assert cursor.execute.call_args[0][1] == (5, 17, 2, "LL57 2DG", "email")
+
+
+@pytest.mark.parametrize("channel, expected", [
+    ("sms", "sms"), ("both", "both"), (None, "email"), ("pigeon", "email")
+])
+def test_get_alert_channel(channel, expected):
+    assert get_alert_channel({"alert_channel": channel}) == expected